@@ -21,6 +21,8 @@ DATA_DIR = BASE_DIR / "/".join(config['data']['s3_reference_path'].split("/")[:-
 BUCKET_NAME = config['data']['s3_bucket']
 S3_KEY_REF = config['data']['s3_reference_path']
 S3_KEY_TEST = config['data']['s3_test_path']
+S3_KEY_SCHEMA = config['data']['s3_category_schema_path']
+CATEGORY_SCHEMA_FILE = DATA_DIR / "category_schema.json"
 
 # Time interval
 START_DATE_FORCASTING = config["forecasting_period"]["start_forecasting_date"]
@@ -31,6 +33,12 @@ EXPERIMENT_ID = config["mlflow"]["experiment_id"]
 RUN_ID = config["mlflow"]["run_id"]
 MODEL_DIR = config["mlflow"]["model_dir"]
 CREDINCIAL_ON = config["mlflow"]["creds_on"]
+SHARDED_MODEL_URI = config["mlflow"]["sharded_model_uri"]
+
+# Profiling
+PROFILING_ENABLED = config["profiling"]["enabled"]
+PROFILING_DIR = BASE_DIR / config["profiling"]["report_dir"]
+PROFILING_TO_MLFLOW = config["profiling"]["log_to_mlflow"]
 
 # Dashboards
 DASH_DIR = BASE_DIR / config["dashboards"]["dash_dir"]
@@ -1,6 +1,8 @@
+import json
 import mlflow
+import lightgbm as lgb
 from pathlib import Path
-from codes.config import MODEL_DIR, EXPERIMENT_ID, RUN_ID, CREDINCIAL_ON
+from codes.config import MODEL_DIR, EXPERIMENT_ID, RUN_ID, CREDINCIAL_ON, SHARDED_MODEL_URI
 from dotenv import load_dotenv
 import boto3
 
@@ -14,3 +16,15 @@ if CREDINCIAL_ON:
 def load_model():
     model_uri = f"s3://mlflow-artifacts-bucket-m5/{EXPERIMENT_ID}/{MODEL_DIR}/{RUN_ID}/artifacts"
     return mlflow.pyfunc.load_model(model_uri)
+
+
+def load_shard_models(model_uri=SHARDED_MODEL_URI):
+    """Shard key and LightGBM model of every shard of a sharded model bundle."""
+    bundle = Path(mlflow.artifacts.download_artifacts(artifact_uri=model_uri))
+    with open(bundle / "shards.json") as f:
+        manifest = json.load(f)
+    models = {
+        value: lgb.Booster(model_file=str(bundle / name))
+        for value, name in manifest["shards"].items()
+    }
+    return manifest["key"], models
@@ -1,17 +1,77 @@
+import json
+import logging
+import numpy as np
 import pandas as pd
-from codes.model import load_model
-from codes.config import CATEGORICAL_FEATURES, NUMERICAL_FEATURES
+from codes.model import load_model, load_shard_models
+from codes.config import (
+    CATEGORICAL_FEATURES,
+    NUMERICAL_FEATURES,
+    CATEGORY_SCHEMA_FILE,
+    SHARDED_MODEL_URI,
+)
+from codes.profiling import profiled
 
 
+logger = logging.getLogger(__name__)
+
 _model = None  # lazy load
+_schema = None
+
+
+def load_category_schema(path=CATEGORY_SCHEMA_FILE) -> dict:
+    """Categories of the id columns used at training time ({} if unavailable)."""
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def encode_categorical(values: pd.Series, categories=None) -> pd.Categorical:
+    """Categorical with the training categories; unseen values become NaN."""
+    if categories is None:
+        return values.astype("category")
+    categories = pd.Index(categories)
+    return pd.Categorical.from_codes(categories.get_indexer(values), categories=categories)
+
+
+class ShardRouter:
+    """
+    Sends every row of a batch to the model of its shard.
+
+    The predictions are reassembled in the row order of the batch; rows of
+    shards without a model (e.g. unseen stores) are predicted as NaN.
+
+    Args:
+        key (str): Column the models are sharded by (a feature column)
+        models (dict): LightGBM model of every shard value
+    """
+
+    def __init__(self, key: str, models: dict):
+        self.key = key
+        self.models = models
+
+    def predict(self, data: pd.DataFrame) -> np.ndarray:
+        predictions = np.full(len(data), np.nan)
+        shards = data.groupby(self.key, observed=True, sort=False).indices
+        for value, rows in shards.items():
+            model = self.models.get(str(value))
+            if model is not None:
+                predictions[rows] = model.predict(data.iloc[rows])
+        missing = int(np.isnan(predictions).sum())
+        if missing:
+            logger.warning(f"{missing} rows have no shard model; predicted as NaN")
+        return predictions
 
 
+@profiled()
 def predict(data: pd.DataFrame) -> pd.Series:
-    global _model
+    global _model, _schema
     if _model is None:
-        _model = load_model()
+        _model = ShardRouter(*load_shard_models()) if SHARDED_MODEL_URI else load_model()
+    if _schema is None:
+        _schema = load_category_schema()
 
     for col in CATEGORICAL_FEATURES:
-        data[col] = data[col].astype("category")
+        data[col] = encode_categorical(data[col], _schema.get(col))
 
     return _model.predict(data[CATEGORICAL_FEATURES + NUMERICAL_FEATURES])
@@ -0,0 +1,267 @@
+import functools
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import mlflow
+import numpy as np
+import pandas as pd
+
+from codes.config import PROFILING_ENABLED, PROFILING_DIR, PROFILING_TO_MLFLOW
+
+logger = logging.getLogger(__name__)
+
+_records: List[Dict[str, Any]] = []
+_lock = threading.Lock()
+_local = threading.local()
+
+# Stages are also appended here as they finish, so a run killed by the
+# OOM killer still leaves the measurements of the stages before it.
+LIVE_LOG_FILE = "stages.jsonl"
+
+_STATUS_FILE = Path("/proc/self/status")
+_CLEAR_REFS_FILE = Path("/proc/self/clear_refs")
+
+
+def _read_status_kb(field: str) -> Optional[int]:
+    """Value of a memory field (in kB) of /proc/self/status, if available."""
+    try:
+        for line in _STATUS_FILE.read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _current_rss_mb() -> float:
+    rss = _read_status_kb("VmRSS")
+    return rss / 1024 if rss is not None else float("nan")
+
+
+def _peak_rss_mb() -> float:
+    """Peak RSS since the last reset (Linux), else since the process started."""
+    peak = _read_status_kb("VmHWM")
+    if peak is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024
+
+
+def _reset_peak_rss() -> None:
+    """Reset the kernel's peak-RSS counter so a stage measures its own peak."""
+    try:
+        _CLEAR_REFS_FILE.write_text("5")
+    except OSError:
+        pass
+
+
+def output_size(obj: Any) -> Dict[str, float]:
+    """
+    In-memory size of the DataFrames/Series/arrays returned by a stage.
+
+    Args:
+        obj (Any): Stage result; tuples, lists and dicts are traversed.
+
+    Returns:
+        Dict[str, float]: Shallow size in MB and number of rows.
+    """
+    if isinstance(obj, pd.DataFrame):
+        nbytes = obj.memory_usage(index=True).sum()
+        return {"output_mb": nbytes / 2**20, "output_rows": len(obj)}
+    if isinstance(obj, pd.Series):
+        nbytes = obj.memory_usage(index=True)
+        return {"output_mb": nbytes / 2**20, "output_rows": len(obj)}
+    if isinstance(obj, np.ndarray):
+        return {"output_mb": obj.nbytes / 2**20, "output_rows": len(obj)}
+    if isinstance(obj, (tuple, list, dict)):
+        values = obj.values() if isinstance(obj, dict) else obj
+        sizes = [output_size(value) for value in values]
+        return {
+            "output_mb": sum(s["output_mb"] for s in sizes),
+            "output_rows": sum(s["output_rows"] for s in sizes),
+        }
+    return {"output_mb": 0.0, "output_rows": 0}
+
+
+class _Stage:
+    """Measurements of one running stage; `result` may be set inside the block."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.result = None
+        self.child_peak_mb = 0.0
+
+
+@contextmanager
+def profile_stage(name: str, enabled: bool = PROFILING_ENABLED) -> Iterator[_Stage]:
+    """
+    Record wall time, CPU time, peak RSS and output size of a block of code.
+
+    Stages may be nested; a parent's peak includes the peaks of its children.
+    Assign the block's output to `stage.result` to record its size.
+
+    Args:
+        name (str): Stage name in the report
+        enabled (bool): Record nothing when False
+
+    Yields:
+        _Stage: Handle whose `result` attribute is measured on exit
+    """
+    stage = _Stage(name)
+    if not enabled:
+        yield stage
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    if stack:
+        # Keep the parent's peak before resetting the counter for this stage
+        stack[-1].child_peak_mb = max(stack[-1].child_peak_mb, _peak_rss_mb())
+    stack.append(stage)
+
+    _reset_peak_rss()
+    started_at = datetime.now(timezone.utc).isoformat()
+    rss_before = _current_rss_mb()
+    wall, cpu = time.perf_counter(), time.process_time()
+    children_cpu = resource.getrusage(resource.RUSAGE_CHILDREN)
+    try:
+        yield stage
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        peak = max(_peak_rss_mb(), stage.child_peak_mb)
+        stack.pop()
+        if stack:
+            stack[-1].child_peak_mb = max(stack[-1].child_peak_mb, peak)
+
+        record = {
+            "stage": name,
+            "pid": os.getpid(),
+            "started_at": started_at,
+            "wall_s": wall,
+            "cpu_s": cpu,
+            "children_cpu_s": (children.ru_utime + children.ru_stime)
+            - (children_cpu.ru_utime + children_cpu.ru_stime),
+            "rss_before_mb": rss_before,
+            "rss_after_mb": _current_rss_mb(),
+            "peak_rss_mb": peak,
+            **output_size(stage.result),
+        }
+        with _lock:
+            _records.append(record)
+            _append_live(record)
+        logger.info(
+            f"[profile] {name}: {wall:.2f}s wall, {cpu:.2f}s cpu, "
+            f"peak {peak:.0f} MB, output {record['output_mb']:.1f} MB"
+        )
+
+
+def _append_live(record: Dict[str, Any]) -> None:
+    report_dir = PROFILING_DIR
+    try:
+        report_dir.mkdir(parents=True, exist_ok=True)
+        with open(report_dir / LIVE_LOG_FILE, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        logger.warning(f"Could not append profile record: {e}")
+
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """
+    Decorator form of `profile_stage`; the return value is measured.
+
+    Args:
+        name (Optional[str]): Stage name (defaults to the function name)
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_stage(name or func.__name__) as stage:
+                stage.result = func(*args, **kwargs)
+            return stage.result
+
+        return wrapper
+
+    return decorator
+
+
+def get_profile_records() -> List[Dict[str, Any]]:
+    """Copy of the stage measurements recorded so far."""
+    with _lock:
+        return list(_records)
+
+
+def reset_profile() -> None:
+    """Forget all recorded stages."""
+    with _lock:
+        _records.clear()
+
+
+def write_profile_report(
+    report_dir: Path = PROFILING_DIR, name: str = "pipeline"
+) -> Optional[Path]:
+    """
+    Save the recorded stages as JSON and CSV files.
+
+    Args:
+        report_dir (Path): Directory of the reports
+        name (str): Prefix of the report files
+
+    Returns:
+        Optional[Path]: Path of the JSON report, None if nothing was recorded
+    """
+    records = get_profile_records()
+    if not records:
+        return None
+
+    report_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    json_path = report_dir / f"{name}_{stamp}.json"
+    with open(json_path, "w") as f:
+        json.dump(records, f, indent=2)
+    pd.DataFrame(records).to_csv(json_path.with_suffix(".csv"), index=False)
+    logger.info(f"Profile report written to {json_path}")
+    return json_path
+
+
+def log_profile_to_mlflow(
+    enabled: bool = PROFILING_TO_MLFLOW, run_name: str = "pipeline_profile"
+) -> None:
+    """
+    Log the recorded stages as MLflow metrics.
+
+    Metrics go to a run named `run_name`, nested under the active run if
+    there is one. Repeated stages (e.g. hyperopt trials) are logged as
+    successive steps.
+
+    Args:
+        enabled (bool): Log nothing when False
+        run_name (str): Name of the run holding the metrics
+    """
+    records = get_profile_records()
+    if not enabled or not records:
+        return
+
+    steps: Dict[str, int] = {}
+    with mlflow.start_run(run_name=run_name, nested=mlflow.active_run() is not None):
+        for record in records:
+            stage = record["stage"]
+            step = steps.get(stage, 0)
+            steps[stage] = step + 1
+            # One request per stage record
+            mlflow.log_metrics(
+                {
+                    f"profile.{stage}.{key}": record[key]
+                    for key in ["wall_s", "cpu_s", "peak_rss_mb", "output_mb"]
+                },
+                step=step,
+            )
@@ -5,6 +5,7 @@ from evidently.presets import DataDriftPreset, RegressionPreset
 from evidently import Report
 from codes.prediction import predict
 from codes.config import DRIFT_FEATURES, TARGET, PREDICTION, START_DATE
+from codes.profiling import profiled
 
 import warnings
 
@@ -24,6 +25,7 @@ def prepare_reference_data(reference_data: pd.DataFrame):
     return Dataset.from_pandas(reference_data[DRIFT_FEATURES], data_definition=SCHEMA)
 
 
+@profiled("report")
 def calculate_metrics(
     reference_dataset, current_batch: pd.DataFrame, day_index: int
 ) -> dict:
@@ -12,10 +12,11 @@ from botocore.exceptions import NoCredentialsError, ClientError
 from codes.config import (
     START_DATE_FORCASTING, 
     HOW_MANY_DAYS, SEND_TIMEOUT, 
-    DATA_DIR, BUCKET_NAME, S3_KEY_REF, S3_KEY_TEST, 
+    DATA_DIR, BUCKET_NAME, S3_KEY_REF, S3_KEY_TEST, S3_KEY_SCHEMA,
     DB_CONFIG)
 from codes.db import create_database_if_missing, setup_metrics_table
 from codes.reporting import prepare_reference_data, calculate_metrics
+from codes.profiling import profiled, write_profile_report, log_profile_to_mlflow
 
 
 # Configure logging
@@ -24,6 +25,7 @@ logger = logging.getLogger(__name__)
 
 
 @task(name="Download_data_from_S3", log_prints=True)
+@profiled("download")
 def download_file_from_s3(bucket_name=BUCKET_NAME, s3_key_ref=S3_KEY_REF, s3_key_test=S3_KEY_TEST, local_path=DATA_DIR) -> Tuple[str, str]:
 
     ref_local_path = str(local_path / 'reference_data.csv')
@@ -41,6 +43,11 @@ def download_file_from_s3(bucket_name=BUCKET_NAME, s3_key_ref=S3_KEY_REF, s3_key
         logger.info(f"Downloaded s3://{bucket_name}/{s3_key_test} to {test_local_path}")
         print(s3_key_test)
 
+        # Category encoding of the training data, applied before predicting
+        schema_local_path = str(local_path / 'category_schema.json')
+        s3.download_file(bucket_name, S3_KEY_SCHEMA, schema_local_path)
+        logger.info(f"Downloaded s3://{bucket_name}/{S3_KEY_SCHEMA} to {schema_local_path}")
+
     except NoCredentialsError:
         logger.error("AWS credentials not found. Make sure they are configured properly.")
     except ClientError as e:
@@ -50,6 +57,7 @@ def download_file_from_s3(bucket_name=BUCKET_NAME, s3_key_ref=S3_KEY_REF, s3_key
 
 
 @task
+@profiled()
 def load_data(ref_local_path, test_local_path):
     
     reference_data = pd.read_csv(ref_local_path)
@@ -88,11 +96,15 @@ def monitor_model():
     # loading the data
     reference_dataset, test_data = load_data(ref_path, test_path)
     
-    with psycopg.connect(**DB_CONFIG, autocommit=True) as conn:
-        for i in range(START_DATE_FORCASTING, START_DATE_FORCASTING + HOW_MANY_DAYS):
-            batch = test_data.loc[test_data.d == f"d_{i}"]
-            with conn.cursor() as cursor:
-                metrics = calculate_metrics(reference_dataset, batch, i)
-                insert_metrics(cursor, metrics)
-                logging.info(f"Metrics for day d_{i} inserted.")
-            time.sleep(SEND_TIMEOUT)
+    try:
+        with psycopg.connect(**DB_CONFIG, autocommit=True) as conn:
+            for i in range(START_DATE_FORCASTING, START_DATE_FORCASTING + HOW_MANY_DAYS):
+                batch = test_data.loc[test_data.d == f"d_{i}"]
+                with conn.cursor() as cursor:
+                    metrics = calculate_metrics(reference_dataset, batch, i)
+                    insert_metrics(cursor, metrics)
+                    logging.info(f"Metrics for day d_{i} inserted.")
+                time.sleep(SEND_TIMEOUT)
+    finally:
+        write_profile_report(name="monitoring")
+        log_profile_to_mlflow(run_name="monitoring_profile")
@@ -1,5 +1,7 @@
-from codes.prediction import predict
+from codes.prediction import predict, ShardRouter
+import lightgbm as lgb
 import numpy as np
+import pandas as pd
 
 
 def test_predict_returns_series(sample_input_df):
@@ -17,3 +19,28 @@ def test_predict_missing_feature(sample_input_df):
         assert False, "Should raise an error if input is missing required features"
     except Exception as e:
         assert "lag_7" in str(e)
+
+
+def test_shard_router_keeps_row_order():
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        {
+            "store_id": pd.Categorical(rng.choice(["CA_1", "TX_1", "WI_1"], 60)),
+            "lag_7": rng.normal(size=60),
+        }
+    )
+    models = {}
+    for store in ["CA_1", "TX_1"]:
+        rows = data[data["store_id"] == store]
+        models[store] = lgb.train(
+            {"objective": "regression", "verbose": -1, "min_data_in_leaf": 2},
+            lgb.Dataset(rows, label=rows["lag_7"] * 2),
+            num_boost_round=3,
+        )
+
+    result = ShardRouter("store_id", models).predict(data)
+
+    for store, model in models.items():
+        rows = (data["store_id"] == store).to_numpy()
+        np.testing.assert_allclose(result[rows], model.predict(data[rows]))
+    assert np.isnan(result[(data["store_id"] == "WI_1").to_numpy()]).all()
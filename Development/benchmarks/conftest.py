@@ -0,0 +1,100 @@
+# benchmarks/conftest.py
+"""
+Shared inputs of the benchmarks, built once per session from synthetic data.
+
+The scale is set with M5_BENCH_SERIES and M5_BENCH_DAYS (default 300
+series x 1913 days; the days from the training start are used, and the
+splits of params.yaml need at least END_DATE_VAL days). Nothing here needs
+Kaggle, S3 or MLflow.
+"""
+import os
+
+import pytest
+
+import codes.models.dataset_cache
+import codes.profiling
+from codes.data_handling.category_schema import (
+    build_category_schema,
+    load_category_schema,
+    save_category_schema,
+)
+from codes.data_handling.data_loader import (
+    load_calendar_data,
+    load_sales_data,
+    load_sales_ids,
+    load_sell_prices,
+)
+from codes.data_handling.feature_store import write_manifest, write_partition
+from codes.data_handling.synthetic import generate_m5_data
+from codes.feature_engineering import build_features
+
+N_SERIES = int(os.environ.get("M5_BENCH_SERIES", 300))
+N_DAYS = int(os.environ.get("M5_BENCH_DAYS", 1913))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def bench_dirs(tmp_path_factory):
+    """Keep profiles and cached Datasets out of the data directory."""
+    root = tmp_path_factory.mktemp("bench")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(codes.profiling, "PROFILING_DIR", root / "profiling")
+        mp.setattr(
+            codes.models.dataset_cache, "DATASET_CACHE_DIR", root / "lgb_datasets"
+        )
+        yield root
+
+
+@pytest.fixture(scope="session")
+def raw_data_dir(tmp_path_factory):
+    return generate_m5_data(tmp_path_factory.mktemp("raw"), N_SERIES, N_DAYS)
+
+
+@pytest.fixture(scope="session")
+def schema(raw_data_dir):
+    return build_category_schema(load_sales_ids(raw_data_dir, use_cache=False))
+
+
+@pytest.fixture(scope="session")
+def raw_data(raw_data_dir):
+    """(sales, calendar, prices) as loaded by prepare_data."""
+    return (
+        load_sales_data(raw_data_dir, use_cache=False),
+        load_calendar_data(raw_data_dir, use_cache=False),
+        load_sell_prices(raw_data_dir, use_cache=False),
+    )
+
+
+@pytest.fixture(scope="session")
+def features(raw_data, schema):
+    return build_features(*raw_data, schema)
+
+
+@pytest.fixture(scope="session")
+def feature_store(tmp_path_factory, features, schema):
+    """Feature store and category schema files, as written by prepare_data."""
+    root = tmp_path_factory.mktemp("processed")
+    write_partition(features, root / "feature_store")
+    write_manifest(root / "feature_store")
+    save_category_schema(schema, root / "category_schema.json")
+    return root
+
+
+@pytest.fixture(scope="session")
+def split_data(feature_store):
+    """split_data of the pipeline on the benchmark feature store, offline."""
+    import pipeline_training
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(
+            pipeline_training,
+            "load_category_schema",
+            lambda: load_category_schema(feature_store / "category_schema.json"),
+        )
+        mp.setattr(pipeline_training, "save_and_upload_to_s3", lambda **kwargs: None)
+        yield lambda: pipeline_training.split_data.fn(feature_store / "feature_store")
+
+
+@pytest.fixture(scope="session")
+def splits(split_data):
+    """X_train, y_train, X_valid, y_valid."""
+    return split_data()
@@ -0,0 +1,79 @@
+import pytest
+
+from codes.data_handling.data_loader import build_data_cache, load_sales_data
+from codes.feature_engineering import (
+    add_calendar_features,
+    add_date_features,
+    add_lag_features,
+    add_rolling_features,
+    add_window_features,
+    melt_sales_data,
+    merge_calendar,
+    merge_prices,
+)
+
+pytest.importorskip("pytest_benchmark")
+
+
+def copied(frame):
+    """pedantic setup passing a fresh copy of `frame` (for in-place functions)."""
+    return lambda: ((frame.copy(),), {})
+
+
+def test_load_sales_data_csv(benchmark, raw_data_dir):
+    benchmark(load_sales_data, raw_data_dir, use_cache=False)
+
+
+def test_load_sales_data_parquet_cache(benchmark, raw_data_dir):
+    build_data_cache(raw_data_dir)
+    benchmark(load_sales_data, raw_data_dir, use_cache=True)
+
+
+def test_melt_sales_data(benchmark, raw_data, schema):
+    benchmark(melt_sales_data, raw_data[0], schema)
+
+
+def test_add_calendar_features(benchmark, raw_data):
+    benchmark(add_calendar_features, raw_data[1])
+
+
+def test_merge_calendar(benchmark, raw_data, schema):
+    sales, calendar, _ = raw_data
+    calendar = add_calendar_features(calendar)
+    benchmark.pedantic(
+        merge_calendar,
+        setup=lambda: ((melt_sales_data(sales, schema), calendar), {}),
+        rounds=3,
+    )
+
+
+def test_merge_prices(benchmark, raw_data, schema):
+    sales, calendar, prices = raw_data
+    df = merge_calendar(melt_sales_data(sales, schema), add_calendar_features(calendar))
+    benchmark.pedantic(
+        merge_prices, setup=lambda: ((df.copy(), prices), {}), rounds=3
+    )
+
+
+def test_add_date_features(benchmark, features):
+    df = features[["date"]]
+    benchmark.pedantic(add_date_features, setup=copied(df), rounds=3)
+
+
+def test_add_lag_features(benchmark, features):
+    df = features[["id", "sales"]]
+    benchmark.pedantic(add_lag_features, setup=copied(df), rounds=3)
+
+
+def test_add_rolling_features(benchmark, features):
+    df = features[["id", "sales", "lag_28"]]
+    benchmark.pedantic(add_rolling_features, setup=copied(df), rounds=3)
+
+
+def test_add_window_features(benchmark, features):
+    df = features[["id", "sales"]]
+    benchmark.pedantic(add_window_features, setup=copied(df), rounds=3)
+
+
+def test_split_data(benchmark, split_data):
+    benchmark.pedantic(split_data, rounds=3)
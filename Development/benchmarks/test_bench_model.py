@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from codes.metrics.error_metrics import regression_metrics, series_metric_inputs
+from codes.metrics.hierarchy import build_wrmsse_evaluator
+from codes.metrics.lgb_metrics import validation_feval
+from codes.models.dataset_cache import clear_dataset_cache, get_datasets
+from codes.models.train import train_lightgbm_model
+from codes.tuning.hyperopt_objective import model_params_from, objective
+
+pytest.importorskip("pytest_benchmark")
+
+PARAMS = {
+    "learning_rate": 0.1,
+    "num_leaves": 31,
+    "min_data_in_leaf": 20,
+    "feature_fraction": 0.8,
+    "bagging_fraction": 0.8,
+    "lambda_l1": 0.0,
+    "lambda_l2": 0.0,
+}
+
+
+def cold(*args, **kwargs):
+    """pedantic setup without cached Datasets, so every round bins the data."""
+    def setup():
+        clear_dataset_cache()
+        return args, kwargs
+    return setup
+
+
+@pytest.fixture(scope="module")
+def predictions(splits):
+    _, _, X_valid, y_valid = splits
+    rng = np.random.default_rng(0)
+    return y_valid.to_numpy() + rng.normal(0, 1, len(y_valid))
+
+
+def test_train_lightgbm_model(benchmark, splits, tmp_path):
+    benchmark.pedantic(
+        train_lightgbm_model,
+        setup=cold(*splits, {**PARAMS, "best_iteration": 100}, cache_dir=tmp_path),
+        rounds=3,
+    )
+
+
+def test_hyperopt_trial(benchmark, splits):
+    # Datasets come from the cache, as for every trial after the first
+    get_datasets(*splits, model_params_from(PARAMS))
+    benchmark.pedantic(objective, args=(PARAMS, *splits), rounds=3)
+
+
+def test_regression_metrics(benchmark, splits, predictions):
+    X_train, y_train, X_valid, y_valid = splits
+    series = series_metric_inputs(X_train, y_train, X_valid)
+    benchmark(regression_metrics, y_valid.to_numpy(), predictions, series)
+
+
+def test_series_metric_inputs(benchmark, splits):
+    X_train, y_train, X_valid, _ = splits
+    benchmark(series_metric_inputs, X_train, y_train, X_valid)
+
+
+def test_build_wrmsse_evaluator(benchmark, splits):
+    benchmark.pedantic(build_wrmsse_evaluator, args=splits, rounds=3)
+
+
+def test_wrmsse(benchmark, splits, predictions):
+    evaluator = build_wrmsse_evaluator(*splits)
+    benchmark(evaluator, predictions)
+
+
+def test_validation_feval(benchmark, splits, predictions):
+    X_train, y_train, X_valid, y_valid = splits
+    _, valid_data = get_datasets(*splits, model_params_from(PARAMS))
+    feval = validation_feval(series_metric_inputs(X_train, y_train, X_valid))
+    benchmark(feval, predictions, valid_data)
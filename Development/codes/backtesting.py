@@ -0,0 +1,235 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import lightgbm as lgb
+import numpy as np
+
+from codes.data_handling.category_schema import apply_category_schema, load_category_schema
+from codes.data_handling.data_splitter import day_slices, sort_by_day
+from codes.data_handling.feature_store import read_feature_store
+from codes.metrics.error_metrics import series_metric_inputs
+from codes.metrics.hierarchy import build_wrmsse_evaluator
+from codes.models.dataset_cache import dataset_params
+from codes.models.matrix import build_matrix, matrix_schema
+from codes.models.mlflow_logging import get_mlflow_logger
+from codes.profiling import profile_stage
+from codes.tuning.hyperopt_objective import evaluate_params, model_params_from
+from codes.tuning.parallel_trials import threads_per_trial
+from codes.config import (
+    BACKTEST_DIR,
+    BACKTEST_FOLDS,
+    BACKTEST_HORIZON,
+    BACKTEST_JOBS,
+    BACKTEST_STEP,
+    BACKTEST_TRAIN_DAYS,
+    CATEGORICAL_FEATURES,
+    EARLY_STOPPING_ROUNDS,
+    END_DATE_TRAIN,
+    NUMERICAL_FEATURES,
+    START_DATE_TRAIN,
+    TARGET,
+    USE_WRMSSE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def fold_bounds(
+    n_folds: int = BACKTEST_FOLDS,
+    horizon: int = BACKTEST_HORIZON,
+    step: int = BACKTEST_STEP,
+    train_days: Optional[int] = BACKTEST_TRAIN_DAYS,
+    first_day: int = START_DATE_TRAIN,
+    last_day: int = END_DATE_TRAIN,
+) -> List[Tuple[int, int, int]]:
+    """
+    Day boundaries of rolling-origin folds, oldest first.
+
+    Fold k trains on the days before its origin and is validated on the
+    `horizon` days from it; origins are `step` days apart and the last
+    validation window ends at `last_day` (exclusive). By default that is
+    the end of the training split, so no fold is validated on the window
+    the parameters (and their 'best_iteration') were tuned on.
+
+    Args:
+        n_folds (int): Number of folds
+        horizon (int): Validation days per fold
+        step (int): Days between consecutive origins
+        train_days (Optional[int]): Training days per fold (all days from
+            `first_day` if None, i.e. an expanding window)
+        first_day (int): First day with features
+        last_day (int): End of the last validation window (exclusive)
+
+    Returns:
+        List[Tuple[int, int, int]]: (train start, origin, validation end) per fold
+    """
+    folds = []
+    for k in reversed(range(n_folds)):
+        origin = last_day - horizon - k * step
+        start = first_day if train_days is None else max(first_day, origin - train_days)
+        if origin <= start:
+            raise ValueError(f"Fold with origin {origin} has no training days")
+        folds.append((start, origin, origin + horizon))
+    return folds
+
+
+def _run_fold(
+    fold: Dict[str, Any],
+    matrix_file: Path,
+    label_file: Path,
+    schema: Dict[str, Any],
+    params: Dict[str, Any],
+    num_threads: int,
+) -> Dict[str, Any]:
+    """Train and score one fold on slices of the memory-mapped matrix."""
+    matrix = np.load(matrix_file, mmap_mode="r")
+    label = np.load(label_file, mmap_mode="r")
+    train, valid = fold["train"], fold["valid"]
+
+    ds_params = dataset_params(model_params_from(params))
+    train_data = lgb.Dataset(
+        matrix[train],
+        label=label[train],
+        params=ds_params,
+        feature_name=schema["features"],
+        categorical_feature=schema["categorical"],
+    )
+    valid_data = lgb.Dataset(
+        matrix[valid], label=label[valid], params=ds_params, reference=train_data
+    )
+    rounds = params.get("best_iteration")
+    with profile_stage("backtest_fold"):
+        result = evaluate_params(
+            {k: v for k, v in params.items() if k != "best_iteration"},
+            train_data,
+            valid_data,
+            matrix[valid],
+            np.asarray(label[valid]),
+            num_threads=num_threads,
+            num_boost_round=int(rounds) if rounds else 500,
+            early_stopping_rounds=None if rounds else EARLY_STOPPING_ROUNDS,
+            series=fold["series"],
+            evaluator=fold["evaluator"],
+        )
+    return result["metrics"]
+
+
+def aggregate_metrics(fold_metrics: List[Dict[str, float]]) -> Dict[str, float]:
+    """Mean and standard deviation over the folds of every metric."""
+    aggregate = {}
+    for name in fold_metrics[0]:
+        values = np.array([m[name] for m in fold_metrics], dtype=np.float64)
+        aggregate[f"{name}_mean"] = float(np.nanmean(values))
+        aggregate[f"{name}_std"] = float(np.nanstd(values))
+    return aggregate
+
+
+def run_backtest(
+    feature_store: Path,
+    params: Dict[str, Any],
+    folds: Optional[List[Tuple[int, int, int]]] = None,
+    n_jobs: int = BACKTEST_JOBS,
+    data_dir: Path = BACKTEST_DIR,
+    schema: Optional[Dict[str, List[str]]] = None,
+) -> Tuple[List[Dict[str, float]], Dict[str, float]]:
+    """
+    Score parameters on rolling-origin folds of one precomputed feature table.
+
+    The days of all folds are read from the feature store once, and one
+    float32 matrix of their features is built and saved for memory-mapping.
+    Every fold is a pair of contiguous row slices of that matrix (the frame
+    is sorted by day), so no fold copies the data. Up to `n_jobs` folds are
+    trained at once in worker processes, each with an equal share of the
+    cores. With a tuned 'best_iteration', every fold trains that many
+    rounds; otherwise it stops early on its validation window.
+
+    With the default folds (see fold_bounds), the validation windows
+    precede the tuning window, so the scores are out of sample.
+
+    The metrics of every fold are logged to a nested MLflow run of a
+    'backtest' run, which gets their mean and standard deviation.
+
+    Args:
+        feature_store (Path): Feature store written by prepare_data
+        params (Dict[str, Any]): Parameters to score (e.g. from run_hyperopt)
+        folds (Optional[List[Tuple[int, int, int]]]): Fold boundaries
+            (see fold_bounds; from params.yaml if None)
+        n_jobs (int): Number of folds trained at the same time
+        data_dir (Path): Directory of the memory-mapped matrix
+        schema (Optional[Dict[str, List[str]]]): Categories of the id
+            columns (the saved category schema if None)
+
+    Returns:
+        Tuple: metrics of every fold and their aggregate
+    """
+    folds = folds or fold_bounds()
+    features = CATEGORICAL_FEATURES + NUMERICAL_FEATURES
+    df = read_feature_store(
+        feature_store,
+        columns=features + [TARGET, "d_idx"],
+        start_day=folds[0][0],
+        end_day=folds[-1][2],
+    )
+    df = sort_by_day(df)
+    df = apply_category_schema(df, schema or load_category_schema())
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    matrix_file, label_file = data_dir / "X.npy", data_dir / "y.npy"
+    with profile_stage("backtest_matrix"):
+        matrix = build_matrix(df, features)
+        np.save(matrix_file, matrix)
+        np.save(label_file, df[TARGET].to_numpy(dtype=np.float32))
+
+    days = df["d_idx"].to_numpy()
+    X, y = df[features], df[TARGET]
+    jobs = []
+    for start, origin, end in folds:
+        train, valid = day_slices(days, [start, origin, end])
+        X_train, y_train = X.iloc[train], y.iloc[train]
+        X_valid, y_valid = X.iloc[valid], y.iloc[valid]
+        jobs.append({
+            "train": train,
+            "valid": valid,
+            "series": series_metric_inputs(X_train, y_train, X_valid),
+            "evaluator": (
+                build_wrmsse_evaluator(X_train, y_train, X_valid, y_valid)
+                if USE_WRMSSE else None
+            ),
+        })
+
+    n_jobs = min(n_jobs, len(folds))
+    logger.info(f"Backtesting {len(folds)} folds {folds}, {n_jobs} at a time")
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = [
+            executor.submit(
+                _run_fold, job, matrix_file, label_file, matrix_schema(X), params,
+                threads_per_trial(n_jobs),
+            )
+            for job in jobs
+        ]
+        fold_metrics = [future.result() for future in futures]
+    aggregate = aggregate_metrics(fold_metrics)
+
+    tracker = get_mlflow_logger()
+    run = tracker.start_run(run_name="backtest")
+    tracker.log_params(run, {
+        **{k: v for k, v in params.items() if k != "best_iteration"},
+        "folds": len(folds),
+        "first_origin": folds[0][1],
+        "last_origin": folds[-1][1],
+    })
+    for k, ((start, origin, end), metrics) in enumerate(zip(folds, fold_metrics)):
+        fold_run = tracker.start_run(run_name=f"fold_{k}", parent=run)
+        tracker.log_params(fold_run, {"train_start": start, "origin": origin, "valid_end": end})
+        tracker.log_metrics(fold_run, metrics)
+        tracker.end_run(fold_run)
+    tracker.log_metrics(run, aggregate)
+    tracker.end_run(run)
+
+    logger.info(f"Backtest: {aggregate}")
+    return fold_metrics, aggregate
@@ -2,19 +2,37 @@ from prefect import task
 import mlflow
 
 from codes.models.train import train_lightgbm_model
+from codes.models.sharded import train_sharded_models
+from codes.models.distributed import train_distributed
 from codes.models.mlflow_logging import log_model_and_metrics
-from codes.config import MLFLOW_TRACKING_URI, MLFLOW_EXPERIMENT_NAME, PROCESSED_DATA_DIR, PROCESSED_DATA_BUCKET
+from codes.retraining import new_days_split, save_production_model
+from codes.config import MLFLOW_TRACKING_URI, MLFLOW_EXPERIMENT_NAME, PROCESSED_DATA_DIR, PROCESSED_DATA_BUCKET, SHARDED_TRAINING, DISTRIBUTED_TRAINING, END_DATE_TRAIN, RETRAIN_ROUNDS, RETRAIN_VALID_DAYS
 
+import lightgbm as lgb
+import mlflow.lightgbm
 import pandas as pd
 import boto3
 
 
 @task(name="Train_model", log_prints=True)
-def train_model(X_train, y_train, X_valid, y_valid, params):
+def train_model(
+    X_train, y_train, X_valid, y_valid, params,
+    sharded=SHARDED_TRAINING, distributed=DISTRIBUTED_TRAINING,
+    train_end=END_DATE_TRAIN
+):
     """
     Prefect task to train and log a LightGBM model using MLflow.
+
+    With `sharded`, one model per shard (see sharding in params.yaml) is
+    trained in parallel and logged as one model bundle. With `distributed`,
+    the training rows are spread over the LightGBM machines of
+    distributed in params.yaml. A single LightGBM model is recorded as
+    the model incremental retrains continue from (see retrain_model);
+    `train_end` is the first day after its training rows.
     """
-    
+    if sharded and distributed:
+        raise ValueError("Sharded and distributed training cannot be combined")
+
     s3 = boto3.client("s3")
 
     mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
@@ -23,7 +41,13 @@ def train_model(X_train, y_train, X_valid, y_valid, params):
     val_path = PROCESSED_DATA_DIR / "reference_data.csv"
 
     with mlflow.start_run():
-        model, metrics, predictions = train_lightgbm_model(
+        if sharded:
+            train = train_sharded_models
+        elif distributed:
+            train = train_distributed
+        else:
+            train = train_lightgbm_model
+        model, metrics, predictions = train(
             X_train, y_train, X_valid, y_valid, params
         )
 
@@ -37,8 +61,51 @@ def train_model(X_train, y_train, X_valid, y_valid, params):
         )
 
     
-        log_model_and_metrics(
+        model_uri = log_model_and_metrics(
             model, metrics, params, predictions=predictions, reference_df=reference_df
         )
+        if isinstance(model, lgb.Booster):
+            save_production_model(
+                model_uri, params, train_end, run_id=mlflow.active_run().info.run_id
+            )
+
+        return model
+
+
+@task(name="Retrain_model", log_prints=True)
+def retrain_model(
+    feature_store, state, num_boost_round=RETRAIN_ROUNDS, valid_days=RETRAIN_VALID_DAYS
+):
+    """
+    Prefect task to continue boosting the production model on the new days.
+
+    The recorded model (see save_production_model) is loaded from MLflow,
+    and up to `num_boost_round` rounds are added with its tuned parameters,
+    trained only on the days stored since it was fitted; the newest
+    `valid_days` days are held out for early stopping and the metrics. The
+    new model is logged to a run tagged with the model it continues, and
+    recorded as the production model.
+    """
+    X_train, y_train, X_valid, y_valid, train_end = new_days_split(
+        state["train_end"], feature_store, valid_days
+    )
+
+    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+    mlflow.set_experiment(MLFLOW_EXPERIMENT_NAME)
+    init_model = mlflow.lightgbm.load_model(state["model_uri"])
+
+    with mlflow.start_run(tags={"retrain": "incremental", "init_model": state["model_uri"]}):
+        model, metrics, _ = train_lightgbm_model(
+            X_train, y_train, X_valid, y_valid, state["params"],
+            num_boost_round=num_boost_round, init_model=init_model
+        )
+        metrics["added_rounds"] = metrics["num_boost_round"] - init_model.current_iteration()
+        model_uri = log_model_and_metrics(
+            model, metrics,
+            {**state["params"], "train_start": state["train_end"], "train_end": train_end}
+        )
+        save_production_model(
+            model_uri, state["params"], train_end, run_id=mlflow.active_run().info.run_id
+        )
 
         return model
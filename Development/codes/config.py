@@ -21,6 +21,45 @@ DATA_DIR = BASE_DIR / "data"
 RAW_DATA_DIR = DATA_DIR / "raw"
 PROCESSED_DATA_DIR = DATA_DIR / "processed"
 PROCESSED_DATA_BUCKET = config["output_data"]["s3_bucket"]
+USE_DATA_CACHE = config["raw_data"]["use_cache"]
+CATEGORY_SCHEMA_FILE = PROCESSED_DATA_DIR / "category_schema.json"
+
+# Partitioned feature preparation
+PARTITIONED = config["processing"]["partitioned"]
+PARTITION_KEY = config["processing"]["partition_key"]
+MAX_WORKERS = config["processing"]["max_workers"]
+
+# Feature store
+FEATURE_STORE_DIR = PROCESSED_DATA_DIR / "feature_store"
+DAY_BUCKET_SIZE = config["feature_store"]["day_bucket_size"]
+REUSE_FEATURE_STORE = config["feature_store"]["reuse"]
+INCREMENTAL_FEATURES = config["feature_store"]["incremental"]
+
+# Binned LightGBM Datasets shared by the tuning trials and the final fit
+USE_DATASET_CACHE = config["dataset_cache"]["enabled"]
+DATASET_CACHE_DIR = PROCESSED_DATA_DIR / config["dataset_cache"]["dir"]
+DATASET_CACHE_KEYS = config["dataset_cache"]["max_keys"]
+
+# Per-shard (e.g. per-store) models
+SHARDED_TRAINING = config["sharding"]["enabled"]
+SHARD_KEY = config["sharding"]["key"]
+SHARD_WORKERS = config["sharding"]["max_workers"]
+
+# Distributed (data/voting parallel) LightGBM training
+DISTRIBUTED_TRAINING = config["distributed"]["enabled"]
+DIST_TREE_LEARNER = config["distributed"]["tree_learner"]
+DIST_MACHINES = config["distributed"]["machines"]
+DIST_DATA_DIR = PROCESSED_DATA_DIR / config["distributed"]["dir"]
+DIST_TIMEOUT = config["distributed"]["time_out"]
+
+# Model features and target
+CATEGORICAL_FEATURES = ["item_id", "dept_id", "cat_id", "store_id", "state_id"]
+NUMERICAL_FEATURES = [
+    "sell_price", "lag_7", "lag_28",
+    "rolling_mean_7", "rolling_mean_28",
+    "weekday", "week", "month", "year",
+]
+TARGET = "sales"
 
 # Time splits
 START_DATE_TRAIN = config["split"]["starting_date_idx_training"]
@@ -31,9 +70,60 @@ END_DATE_VAL = config["split"]["end_date_idx_validation"]
 MLFLOW_EXPERIMENT_NAME = config["mlflow"]["experiment_name"]
 MLFLOW_TRACKING_URI = config["mlflow"]["tracking_uri"]
 MLFLOW_MODEL_DIR = config["mlflow"]["model_dir"]
+MLFLOW_ASYNC = config["mlflow"]["async_logging"]
+MLFLOW_SPOOL_FILE = DATA_DIR / config["mlflow"]["spool_file"]
+
+# Profiling
+PROFILING_ENABLED = config["profiling"]["enabled"]
+PROFILING_DIR = DATA_DIR / config["profiling"]["report_dir"]
+PROFILING_TO_MLFLOW = config["profiling"]["log_to_mlflow"]
+
+# Evaluation
+USE_WRMSSE = config["evaluation"]["wrmsse"]
+LOSS_METRIC = config["evaluation"]["loss"]
+
+# Rolling-origin backtesting
+BACKTESTING = config["backtesting"]["enabled"]
+BACKTEST_FOLDS = config["backtesting"]["folds"]
+BACKTEST_HORIZON = config["backtesting"]["horizon"]
+BACKTEST_STEP = config["backtesting"]["step"]
+BACKTEST_TRAIN_DAYS = config["backtesting"]["train_days"]
+BACKTEST_JOBS = config["backtesting"]["n_jobs"]
+BACKTEST_DIR = PROCESSED_DATA_DIR / config["backtesting"]["dir"]
+
+# Drift-triggered incremental retraining
+DRIFT_METRICS = config["retraining"]["drift_metrics"]
+DRIFT_THRESHOLD = config["retraining"]["drift_threshold"]
+DRIFT_WINDOW_DAYS = config["retraining"]["window_days"]
+RETRAIN_ROUNDS = config["retraining"]["num_boost_round"]
+RETRAIN_VALID_DAYS = config["retraining"]["valid_days"]
+PRODUCTION_MODEL_FILE = PROCESSED_DATA_DIR / config["retraining"]["state_file"]
+DRIFT_TABLE = config["retraining"]["db"]["table"]
+DRIFT_DB_CONFIG = {
+    "host": config["retraining"]["db"]["host"],
+    "port": config["retraining"]["db"]["port"],
+    "user": config["retraining"]["db"]["user"],
+    "password": os.environ.get("POSTGRES_PASSWORD", ""),
+    "dbname": config["retraining"]["db"]["dbname"],
+}
 
 # Hyperparameter tuning config
 NUM_TRIALS = config["hyperparams"]["number_of_trials"]
+TRIAL_JOBS = config["hyperparams"]["n_jobs"]
+USE_TRIAL_STORE = config["hyperparams"]["trial_store"]["enabled"]
+TRIAL_STORE_DIR = PROCESSED_DATA_DIR / config["hyperparams"]["trial_store"]["dir"]
+EVAL_EVERY = config["hyperparams"]["eval_every"]
+EARLY_STOPPING_ROUNDS = config["hyperparams"]["early_stopping_rounds"]
+SUCCESSIVE_HALVING = config["hyperparams"]["successive_halving"]["enabled"]
+SH_CANDIDATES = config["hyperparams"]["successive_halving"]["n_candidates"]
+SH_MIN_ROUNDS = config["hyperparams"]["successive_halving"]["min_rounds"]
+SH_MAX_ROUNDS = config["hyperparams"]["successive_halving"]["max_rounds"]
+SH_REDUCTION_FACTOR = config["hyperparams"]["successive_halving"]["reduction_factor"]
+PROXY_TUNING = config["hyperparams"]["proxy"]["enabled"]
+PROXY_FRACTION = config["hyperparams"]["proxy"]["fraction"]
+PROXY_VOLUME_BINS = config["hyperparams"]["proxy"]["volume_bins"]
+PROXY_CHECKS = config["hyperparams"]["proxy"]["n_check"]
+PROXY_SEED = config["hyperparams"]["proxy"]["seed"]
 
 # Create required directories if missing
 for path in [DATA_DIR, RAW_DATA_DIR, PROCESSED_DATA_DIR]:
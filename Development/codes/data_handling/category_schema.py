@@ -0,0 +1,108 @@
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from codes.config import CATEGORY_SCHEMA_FILE
+
+logger = logging.getLogger(__name__)
+
+ID_COLUMNS = ["id", "item_id", "dept_id", "cat_id", "store_id", "state_id"]
+
+
+def build_category_schema(
+    ids: pd.DataFrame,
+    columns: List[str] = ID_COLUMNS,
+    base: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, List[str]]:
+    """
+    Categories of the id columns, shared by every stage that encodes them.
+
+    Values are sorted, except that the categories of `base` keep their
+    position and unseen values are appended, so existing codes never change.
+
+    Args:
+        ids (pd.DataFrame): Frame with the id columns (e.g. load_sales_ids()).
+        columns (List[str]): Id columns to include.
+        base (Optional[Dict[str, List[str]]]): Schema to extend.
+
+    Returns:
+        Dict[str, List[str]]: Ordered categories per column.
+    """
+    schema = {}
+    for col in columns:
+        known = list((base or {}).get(col, []))
+        values = ids[col].dropna().astype(str).unique().tolist()
+        schema[col] = known + sorted(set(values) - set(known))
+    return schema
+
+
+def save_category_schema(
+    schema: Dict[str, List[str]], path: Path = CATEGORY_SCHEMA_FILE
+) -> Path:
+    """Write the schema as JSON."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(schema, f)
+    logger.info(f"Category schema saved to {path}")
+    return path
+
+
+def load_category_schema(
+    path: Path = CATEGORY_SCHEMA_FILE,
+) -> Optional[Dict[str, List[str]]]:
+    """Schema saved with the features, or None if there is none."""
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def encode_categories(
+    values: pd.Series, categories: Optional[List[str]] = None
+) -> pd.Categorical:
+    """
+    Categorical with the given categories (sorted distinct values if None).
+
+    Values missing from `categories` become NaN. Categorical input is
+    re-encoded through its categories, without touching every row's value.
+    """
+    if categories is None:
+        return pd.Categorical(values)
+    categories = pd.Index(categories)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        lookup = np.append(categories.get_indexer(values.cat.categories.astype(str)), -1)
+        codes = lookup[values.cat.codes.to_numpy()]
+    else:
+        codes = categories.get_indexer(values)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def apply_category_schema(
+    df: pd.DataFrame, schema: Dict[str, List[str]]
+) -> pd.DataFrame:
+    """
+    Cast the schema's columns of `df` to categoricals with the schema's categories.
+
+    Args:
+        df (pd.DataFrame): Frame with some of the schema's columns.
+        schema (Dict[str, List[str]]): Categories per column.
+
+    Returns:
+        pd.DataFrame: `df` with the columns re-encoded in place.
+    """
+    for col, categories in schema.items():
+        if col not in df.columns:
+            continue
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype) and list(dtype.categories) == categories:
+            continue
+        encoded = encode_categories(df[col], categories)
+        unknown = int(encoded.isna().sum() - df[col].isna().sum())
+        if unknown:
+            logger.warning(f"{unknown} values of '{col}' are not in the schema")
+        df[col] = encoded
+    return df
@@ -1,5 +1,4 @@
 import os
-from kaggle.api.kaggle_api_extended import KaggleApi
 import logging
 import zipfile
 
@@ -9,6 +8,10 @@ logger = logging.getLogger(__name__)
 
 
 def download_m5_data(destination_dir: str = RAW_DATA_DIR):
+    # Imported here: the kaggle package authenticates on import, which
+    # would make every module of the pipeline require Kaggle credentials
+    from kaggle.api.kaggle_api_extended import KaggleApi
+
     os.makedirs(destination_dir, exist_ok=True)
 
     api = KaggleApi()
@@ -1,72 +1,244 @@
 import pandas as pd
+import pyarrow.parquet as pq
 import logging
 from pathlib import Path
-from codes.config import RAW_DATA_DIR, START_DATE_TRAIN
+from typing import Any, Dict, List, Optional, Tuple
+from codes.config import RAW_DATA_DIR, START_DATE_TRAIN, USE_DATA_CACHE
 
 logger = logging.getLogger(__name__)
 
+CALENDAR_DTYPES = {
+    "wm_yr_wk": "int32",
+    "wday": "int8",
+    "month": "int8",
+    "year": "int16",
+    "snap_CA": "int8",
+    "snap_TX": "int8",
+    "snap_WI": "int8",
+    "weekday": "category",
+    "event_name_1": "category",
+    "event_type_1": "category",
+    "event_name_2": "category",
+    "event_type_2": "category",
+}
+
+PRICES_DTYPES = {
+    "store_id": "category",
+    "item_id": "category",
+    "wm_yr_wk": "int32",
+    "sell_price": "float32",
+}
+
+
+def _cache_path(csv_path: Path) -> Path:
+    """Location of the Parquet cache that shadows a raw CSV file."""
+    return csv_path.with_suffix(".parquet")
+
+
+def _has_fresh_cache(csv_path: Path) -> bool:
+    """True if the Parquet cache exists and is not older than the CSV."""
+    cache_path = _cache_path(csv_path)
+    if not cache_path.exists():
+        return False
+    return not csv_path.exists() or (
+        cache_path.stat().st_mtime >= csv_path.stat().st_mtime
+    )
+
+
+def _read_header(csv_path: Path, use_cache: bool = USE_DATA_CACHE) -> List[str]:
+    """Column names of a raw file, without parsing its rows."""
+    if use_cache and _has_fresh_cache(csv_path):
+        return pq.read_schema(_cache_path(csv_path)).names
+
+    if not csv_path.exists():
+        logger.error(f"Data file not found at {csv_path}")
+        raise FileNotFoundError(csv_path)
+    return list(pd.read_csv(csv_path, nrows=0).columns)
+
+
+def _apply_filters(
+    df: pd.DataFrame, filters: Optional[List[Tuple[str, str, Any]]]
+) -> pd.DataFrame:
+    """Keep the rows matching all ('column', '==' | 'in' | '>=', value) filters."""
+    if not filters:
+        return df
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        if op == "==":
+            mask &= df[col] == value
+        elif op == "in":
+            mask &= df[col].isin(value)
+        elif op == ">=":
+            mask &= df[col] >= value
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+    return df[mask].reset_index(drop=True)
+
+
+def _read_with_cache(
+    csv_path: Path,
+    dtypes: Dict[str, str],
+    columns: Optional[List[str]] = None,
+    use_cache: bool = USE_DATA_CACHE,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+) -> pd.DataFrame:
+    """
+    Read a raw CSV with compact dtypes, going through a Parquet cache if enabled.
+
+    The cache is (re)built from the full CSV whenever it is missing or older
+    than the CSV, so later reads only pay for the requested columns.
+
+    Args:
+        csv_path (Path): Path to the raw CSV file
+        dtypes (Dict[str, str]): Column dtypes to apply (unknown columns are ignored)
+        columns (Optional[List[str]]): Columns to return (all columns if None)
+        use_cache (bool): Whether to read/write the Parquet cache
+        filters (Optional[List[Tuple]]): Row filters such as
+            [("store_id", "==", "CA_1")], pushed down to the Parquet reader
+
+    Returns:
+        pd.DataFrame: Requested columns of the file
+    """
+    cache_path = _cache_path(csv_path)
+    if use_cache and _has_fresh_cache(csv_path):
+        logger.info(f"Loading cached data from {cache_path}")
+        return pd.read_parquet(cache_path, columns=columns, filters=filters or None)
+
+    header = _read_header(csv_path, use_cache=False)
+    dtype = {col: dtypes[col] for col in header if col in dtypes}
+
+    if not use_cache:
+        df = pd.read_csv(csv_path, usecols=columns, dtype=dtype)
+        return _apply_filters(df, filters)
+
+    logger.info(f"Building cache {cache_path} from {csv_path}")
+    df = pd.read_csv(csv_path, dtype=dtype)
+    df.to_parquet(cache_path, index=False)
+    df = _apply_filters(df, filters)
+    return df[columns] if columns is not None else df
+
+
+def _sales_dtypes(header: List[str]) -> Dict[str, str]:
+    """Categorical id columns and int16 day columns of the sales file."""
+    return {col: "int16" if col.startswith("d_") else "category" for col in header}
+
+
+def build_data_cache(raw_data_dir: Path = RAW_DATA_DIR) -> None:
+    """
+    Create or refresh the Parquet cache of the three raw files.
+
+    Useful before several processes read the raw data concurrently, so that
+    they do not all rebuild the same cache files.
+
+    Args:
+        raw_data_dir (Path): Path to the raw data directory
+    """
+    sales_path = raw_data_dir / "sales_train_validation.csv"
+    for path, dtypes in [
+        (sales_path, _sales_dtypes(_read_header(sales_path))),
+        (raw_data_dir / "calendar.csv", CALENDAR_DTYPES),
+        (raw_data_dir / "sell_prices.csv", PRICES_DTYPES),
+    ]:
+        if not _has_fresh_cache(path):
+            _read_with_cache(path, dtypes, columns=[], use_cache=True)
+
+
+def load_sales_ids(
+    raw_data_dir: Path = RAW_DATA_DIR, use_cache: bool = USE_DATA_CACHE
+) -> pd.DataFrame:
+    """
+    Load only the id columns (id, item_id, ..., state_id) of the sales data.
+
+    Args:
+        raw_data_dir (Path): Path to the raw data directory
+        use_cache (bool): Read through the Parquet cache of the CSV file
+
+    Returns:
+        pd.DataFrame: One row per series with its id columns
+    """
+    sales_path = raw_data_dir / "sales_train_validation.csv"
+    header = _read_header(sales_path, use_cache=use_cache)
+    id_columns = [col for col in header if not col.startswith("d_")]
+    return _read_with_cache(
+        sales_path, _sales_dtypes(header), columns=id_columns, use_cache=use_cache
+    )
+
 
 def load_sales_data(
-    raw_data_dir: Path = RAW_DATA_DIR, start_date_train: int = START_DATE_TRAIN
+    raw_data_dir: Path = RAW_DATA_DIR,
+    start_date_train: int = START_DATE_TRAIN,
+    use_cache: bool = USE_DATA_CACHE,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
 ) -> pd.DataFrame:
     """
     Load the M5 sales training data and drop older dates before the training start.
 
+    Days before the training start are never materialised: they are skipped
+    while parsing the CSV, or projected away when reading the Parquet cache.
+    Sales are stored as int16 and the id columns as categories.
+
     Args:
         raw_data_dir (Path): Path to the raw data directory
         start_date_train (int): First day (d_*) to keep for training
+        use_cache (bool): Read through the Parquet cache of the CSV file
+        filters (Optional[List[Tuple]]): Row filters, e.g. [("store_id", "==", "CA_1")]
 
     Returns:
         pd.DataFrame: Trimmed sales_train_validation dataset
     """
     sales_path = raw_data_dir / "sales_train_validation.csv"
-    if not sales_path.exists():
-        logger.error(f"Sales data not found at {sales_path}")
-        raise FileNotFoundError(sales_path)
+    header = _read_header(sales_path, use_cache=use_cache)
 
-    logger.info(f"Loading sales data from {sales_path}")
-    df = pd.read_csv(sales_path)
+    day_columns = [col for col in header if col.startswith("d_")]
+    id_columns = [col for col in header if not col.startswith("d_")]
 
     # Remove columns before start date
-    older_dates = [f"d_{i}" for i in range(1, start_date_train)]
-    df.drop(columns=[col for col in older_dates if col in df.columns], inplace=True)
+    keep_days = [col for col in day_columns if int(col[2:]) >= start_date_train]
 
-    return df
+    logger.info(f"Loading sales data from {sales_path}")
+    return _read_with_cache(
+        sales_path,
+        _sales_dtypes(header),
+        columns=id_columns + keep_days,
+        use_cache=use_cache,
+        filters=filters,
+    )
 
 
-def load_calendar_data(raw_data_dir: Path = RAW_DATA_DIR) -> pd.DataFrame:
+def load_calendar_data(
+    raw_data_dir: Path = RAW_DATA_DIR, use_cache: bool = USE_DATA_CACHE
+) -> pd.DataFrame:
     """
     Load the calendar file with date mappings and events.
 
     Args:
         raw_data_dir (Path): Path to the raw data directory
+        use_cache (bool): Read through the Parquet cache of the CSV file
 
     Returns:
         pd.DataFrame: calendar.csv dataset
     """
     path = raw_data_dir / "calendar.csv"
-    if not path.exists():
-        logger.error(f"Calendar file not found at {path}")
-        raise FileNotFoundError(path)
-
     logger.info(f"Loading calendar data from {path}")
-    return pd.read_csv(path)
+    return _read_with_cache(path, CALENDAR_DTYPES, use_cache=use_cache)
 
 
-def load_sell_prices(raw_data_dir: Path = RAW_DATA_DIR) -> pd.DataFrame:
+def load_sell_prices(
+    raw_data_dir: Path = RAW_DATA_DIR,
+    use_cache: bool = USE_DATA_CACHE,
+    filters: Optional[List[Tuple[str, str, Any]]] = None,
+) -> pd.DataFrame:
     """
     Load item price history data.
 
     Args:
         raw_data_dir (Path): Path to the raw data directory
+        use_cache (bool): Read through the Parquet cache of the CSV file
+        filters (Optional[List[Tuple]]): Row filters, e.g. [("store_id", "==", "CA_1")]
 
     Returns:
         pd.DataFrame: sell_prices.csv dataset
     """
     path = raw_data_dir / "sell_prices.csv"
-    if not path.exists():
-        logger.error(f"Sell prices file not found at {path}")
-        raise FileNotFoundError(path)
-
     logger.info(f"Loading sell prices from {path}")
-    return pd.read_csv(path)
+    return _read_with_cache(path, PRICES_DTYPES, use_cache=use_cache, filters=filters)
@@ -0,0 +1,73 @@
+import logging
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def sort_by_day(df: pd.DataFrame, day_col: str = "d_idx") -> pd.DataFrame:
+    """
+    Order rows by integer day, keeping the series order within each day.
+
+    Args:
+        df (pd.DataFrame): DataFrame with an integer day column.
+        day_col (str): Name of the day column.
+
+    Returns:
+        pd.DataFrame: `df` itself if already sorted, else a sorted copy.
+    """
+    if df[day_col].is_monotonic_increasing:
+        return df
+    order = np.argsort(df[day_col].to_numpy(), kind="stable")
+    return df.take(order).reset_index(drop=True)
+
+
+def day_slices(
+    days: np.ndarray, boundaries: List[Optional[int]]
+) -> List[slice]:
+    """
+    Row slices of consecutive day ranges in a day-sorted array.
+
+    Args:
+        days (np.ndarray): Sorted integer day of every row.
+        boundaries (List[Optional[int]]): Day boundaries [b0, b1, ..., bn];
+            range i covers days b_i <= d < b_{i+1}, None meaning unbounded.
+
+    Returns:
+        List[slice]: One positional slice per range.
+    """
+    positions = np.searchsorted(
+        days, [0 if b is None else b for b in boundaries], side="left"
+    ).tolist()
+    if boundaries[0] is None:
+        positions[0] = 0
+    positions[1:] = [
+        len(days) if b is None else p for b, p in zip(boundaries[1:], positions[1:])
+    ]
+    return [slice(a, b) for a, b in zip(positions[:-1], positions[1:])]
+
+
+def split_by_day(
+    df: pd.DataFrame,
+    boundaries: List[Optional[int]],
+    day_col: str = "d_idx",
+) -> List[pd.DataFrame]:
+    """
+    Split a day-sorted DataFrame into contiguous day ranges.
+
+    Each part is a positional slice of `df`, found with `searchsorted`, so no
+    boolean mask or copy of the whole frame is built.
+
+    Args:
+        df (pd.DataFrame): DataFrame sorted by `day_col` (see sort_by_day).
+        boundaries (List[Optional[int]]): Day boundaries, see day_slices.
+        day_col (str): Name of the day column.
+
+    Returns:
+        List[pd.DataFrame]: One slice of `df` per day range.
+    """
+    slices = day_slices(df[day_col].to_numpy(), boundaries)
+    logger.info(f"Day ranges {boundaries} -> rows {[(s.start, s.stop) for s in slices]}")
+    return [df.iloc[s] for s in slices]
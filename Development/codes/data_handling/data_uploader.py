@@ -1,6 +1,7 @@
 import pandas as pd
 import logging
 from pathlib import Path
+from typing import List
 from codes.config import PROCESSED_DATA_DIR, PROCESSED_DATA_BUCKET
 import boto3
 
@@ -13,6 +14,7 @@ def save_and_upload_to_s3(
     df_test: pd.DataFrame,
     local_dir: Path = PROCESSED_DATA_DIR,
     s3_bucket: str = PROCESSED_DATA_BUCKET,
+    extra_files: List[Path] = [],
 ):
     """
     Save two DataFrames to CSV and upload them to an S3 bucket.
@@ -25,6 +27,8 @@ def save_and_upload_to_s3(
         s3_bucket (str): Name of the S3 bucket.
         s3_keys (tuple): S3 object keys for the files (e.g., ("folder/data1.csv", "folder/data2.csv")).
         aws_region (str): AWS region (default: "us-east-1").
+        extra_files (List[Path]): Already saved files uploaded alongside
+            (e.g. the category schema).
     """
 
     reference_path = local_dir / "reference_data.csv"
@@ -39,5 +43,7 @@ def save_and_upload_to_s3(
         str(reference_path), s3_bucket, "/".join(str(reference_path).split("/")[-3:])
     )    
     s3.upload_file(str(test_path), s3_bucket, "/".join(str(test_path).split("/")[-3:]))
+    for path in extra_files:
+        s3.upload_file(str(path), s3_bucket, "/".join(str(path).split("/")[-3:]))
 
     print(f"Uploaded {local_dir} to s3://{s3_bucket} bucket.")
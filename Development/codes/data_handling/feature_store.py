@@ -0,0 +1,276 @@
+import hashlib
+import json
+import logging
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from codes.config import (
+    FEATURE_STORE_DIR,
+    PROCESSED_DATA_DIR,
+    DAY_BUCKET_SIZE,
+    RAW_DATA_DIR,
+    START_DATE_TRAIN,
+)
+
+logger = logging.getLogger(__name__)
+
+# Digests of the raw files; outside the store, so rebuilding it keeps them
+DIGEST_CACHE_FILE = PROCESSED_DATA_DIR / "_raw_digests.json"
+# Leading underscore: ignored by Parquet dataset discovery
+MANIFEST_FILE = "_manifest.json"
+WINDOW_STATE_DIR = "_window_state"
+PARTITION_COLUMNS = ["day_bucket", "store_id"]
+
+
+def _file_digest(
+    path: Path, cache: Dict[str, Any], chunk_size: int = 1 << 20
+) -> str:
+    """
+    SHA-256 of the whole file, read in chunks.
+
+    The digest is kept in `cache` with the file's size and modification
+    time and reused while both are unchanged, so an unchanged file is
+    hashed only once.
+    """
+    stat = path.stat()
+    key = str(path.resolve())
+    cached = cache.get(key)
+    if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+        return cached["sha256"]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    cache[key] = {
+        "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()
+    }
+    return cache[key]["sha256"]
+
+
+def raw_data_fingerprint(
+    raw_data_dir: Path = RAW_DATA_DIR,
+    start_date_train: int = START_DATE_TRAIN,
+    cache_file: Path = DIGEST_CACHE_FILE,
+) -> str:
+    """
+    Fingerprint of the inputs the features are computed from.
+
+    Every raw file is hashed in full; the digests are cached in
+    `cache_file` (outside the feature store, which a rebuild deletes) and
+    only recomputed for files whose size or modification time changed.
+
+    Args:
+        raw_data_dir (Path): Path to the raw data directory
+        start_date_train (int): First day (d_*) kept for training
+        cache_file (Path): Digest cache (kept when the store is rebuilt)
+
+    Returns:
+        str: Hex digest that changes when the content of a raw file or the
+        start day changes, but not when the same files are downloaded again
+    """
+    cache = json.loads(cache_file.read_text()) if cache_file.exists() else {}
+
+    digest = hashlib.sha256(str(start_date_train).encode())
+    for name in ["sales_train_validation.csv", "calendar.csv", "sell_prices.csv"]:
+        path = raw_data_dir / name
+        if not path.exists():
+            path = path.with_suffix(".parquet")
+        digest.update(f"{name}:{_file_digest(path, cache)}".encode())
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    cache_file.write_text(json.dumps(cache, indent=2))
+    return digest.hexdigest()
+
+
+def clear_feature_store(root: Path = FEATURE_STORE_DIR) -> None:
+    """Remove all partitions and the manifest of a feature store."""
+    if root.exists():
+        shutil.rmtree(root)
+    root.mkdir(parents=True, exist_ok=True)
+
+
+def write_partition(
+    df: pd.DataFrame,
+    root: Path = FEATURE_STORE_DIR,
+    day_bucket_size: int = DAY_BUCKET_SIZE,
+) -> None:
+    """
+    Append feature rows to the store, partitioned by day range and store.
+
+    Files get unique names, so several processes may write disjoint rows
+    into the same store concurrently.
+
+    Args:
+        df (pd.DataFrame): Features with 'd_idx' and 'store_id' columns
+        root (Path): Root directory of the feature store
+        day_bucket_size (int): Number of days per day-range partition
+    """
+    day_bucket = (df["d_idx"] // day_bucket_size * day_bucket_size).astype("int16")
+    logger.info(f"Writing {len(df)} feature rows to {root}")
+    df.assign(day_bucket=day_bucket).to_parquet(
+        root, partition_cols=PARTITION_COLUMNS, index=False
+    )
+
+
+def write_manifest(
+    root: Path = FEATURE_STORE_DIR,
+    fingerprint: Optional[str] = None,
+    day_bucket_size: int = DAY_BUCKET_SIZE,
+) -> Dict[str, Any]:
+    """
+    Describe the stored partitions in a small JSON manifest.
+
+    Args:
+        root (Path): Root directory of the feature store
+        fingerprint (Optional[str]): Fingerprint of the inputs (see raw_data_fingerprint)
+        day_bucket_size (int): Number of days per day-range partition
+
+    Returns:
+        Dict[str, Any]: The manifest written to `root / _manifest.json`
+    """
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    table = dataset.to_table(columns=["d_idx", "store_id"])
+    days = pc.min_max(table.column("d_idx")).as_py()
+    stores = pc.unique(table.column("store_id").cast("string")).to_pylist()
+
+    manifest = {
+        "fingerprint": fingerprint,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "day_bucket_size": day_bucket_size,
+        "partition_columns": PARTITION_COLUMNS,
+        "columns": {field.name: str(field.type) for field in dataset.schema},
+        "num_rows": table.num_rows,
+        "first_day": days["min"],
+        "last_day": days["max"],
+        "stores": sorted(stores),
+        "files": sorted(str(Path(f).relative_to(root)) for f in dataset.files),
+    }
+    with open(root / MANIFEST_FILE, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(root: Path = FEATURE_STORE_DIR) -> Optional[Dict[str, Any]]:
+    """Manifest of a feature store, or None if it was never completed."""
+    path = root / MANIFEST_FILE
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_feature_store(
+    df: pd.DataFrame,
+    root: Path = FEATURE_STORE_DIR,
+    fingerprint: Optional[str] = None,
+    day_bucket_size: int = DAY_BUCKET_SIZE,
+) -> Dict[str, Any]:
+    """
+    Replace the content of the feature store with `df`.
+
+    Args:
+        df (pd.DataFrame): Features with 'd_idx' and 'store_id' columns
+        root (Path): Root directory of the feature store
+        fingerprint (Optional[str]): Fingerprint of the inputs
+        day_bucket_size (int): Number of days per day-range partition
+
+    Returns:
+        Dict[str, Any]: The written manifest
+    """
+    clear_feature_store(root)
+    write_partition(df, root, day_bucket_size)
+    return write_manifest(root, fingerprint, day_bucket_size)
+
+
+def read_feature_store(
+    root: Path = FEATURE_STORE_DIR,
+    columns: Optional[List[str]] = None,
+    start_day: Optional[int] = None,
+    end_day: Optional[int] = None,
+    stores: Optional[List[str]] = None,
+    days: Optional[List[int]] = None,
+) -> pd.DataFrame:
+    """
+    Read a day range of the stored features.
+
+    Day-range and store partitions outside the request are never opened,
+    and the 'd_idx' bounds are pushed down to the Parquet row groups.
+
+    Args:
+        root (Path): Root directory of the feature store
+        columns (Optional[List[str]]): Columns to read (all if None)
+        start_day (Optional[int]): First day to read (inclusive)
+        end_day (Optional[int]): Last day to read (exclusive)
+        stores (Optional[List[str]]): Stores to read (all if None)
+        days (Optional[List[int]]): Days of the range to read (all if None)
+
+    Returns:
+        pd.DataFrame: Requested rows and columns
+    """
+    manifest = read_manifest(root)
+    if manifest is None:
+        raise FileNotFoundError(root / MANIFEST_FILE)
+    bucket_size = manifest["day_bucket_size"]
+
+    filters = []
+    if start_day is not None:
+        filters.append(("day_bucket", ">=", start_day // bucket_size * bucket_size))
+        filters.append(("d_idx", ">=", start_day))
+    if end_day is not None:
+        filters.append(("day_bucket", "<=", (end_day - 1) // bucket_size * bucket_size))
+        filters.append(("d_idx", "<", end_day))
+    if stores is not None:
+        filters.append(("store_id", "in", list(stores)))
+    if days is not None:
+        filters.append(("d_idx", "in", [int(d) for d in days]))
+
+    if columns is None:
+        columns = [c for c in manifest["columns"] if c != "day_bucket"]
+
+    logger.info(f"Reading features for days [{start_day}, {end_day}) from {root}")
+    return pd.read_parquet(root, columns=columns, filters=filters or None)
+
+
+def save_window_state(
+    sales: pd.DataFrame,
+    history_days: int,
+    root: Path = FEATURE_STORE_DIR,
+    name: str = "all",
+) -> None:
+    """
+    Keep the trailing days of wide sales needed to extend the window features.
+
+    Args:
+        sales (pd.DataFrame): Wide sales data (id columns and d_* columns)
+        history_days (int): Number of trailing days to keep per series
+        root (Path): Root directory of the feature store
+        name (str): Name of the state part (one per partition)
+    """
+    day_columns = [col for col in sales.columns if col.startswith("d_")]
+    id_columns = [col for col in sales.columns if not col.startswith("d_")]
+    state_dir = root / WINDOW_STATE_DIR
+    state_dir.mkdir(parents=True, exist_ok=True)
+    sales[id_columns + day_columns[-history_days:]].to_parquet(
+        state_dir / f"{name}.parquet", index=False
+    )
+
+
+def load_window_state(root: Path = FEATURE_STORE_DIR) -> Optional[pd.DataFrame]:
+    """Trailing wide sales saved with the store, or None if there is none."""
+    state_dir = root / WINDOW_STATE_DIR
+    if not state_dir.exists() or not any(state_dir.glob("*.parquet")):
+        return None
+    return pd.read_parquet(state_dir)
+
+
+def clear_window_state(root: Path = FEATURE_STORE_DIR) -> None:
+    """Remove the saved window state before it is rewritten."""
+    if (root / WINDOW_STATE_DIR).exists():
+        shutil.rmtree(root / WINDOW_STATE_DIR)
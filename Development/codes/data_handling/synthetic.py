@@ -0,0 +1,165 @@
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from codes.config import RAW_DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Stores by state and departments by category, as in the M5 data
+STORES: Dict[str, List[str]] = {
+    "CA": ["CA_1", "CA_2", "CA_3", "CA_4"],
+    "TX": ["TX_1", "TX_2", "TX_3"],
+    "WI": ["WI_1", "WI_2", "WI_3"],
+}
+DEPARTMENTS: Dict[str, List[str]] = {
+    "FOODS": ["FOODS_1", "FOODS_2", "FOODS_3"],
+    "HOBBIES": ["HOBBIES_1", "HOBBIES_2"],
+    "HOUSEHOLD": ["HOUSEHOLD_1", "HOUSEHOLD_2"],
+}
+EVENTS = [
+    ("SuperBowl", "Sporting"),
+    ("ValentinesDay", "Cultural"),
+    ("Easter", "Cultural"),
+    ("IndependenceDay", "National"),
+    ("Thanksgiving", "National"),
+    ("Christmas", "National"),
+]
+# Days after the last sales day covered by the calendar (M5: 1913 + 56)
+CALENDAR_EXTRA_DAYS = 56
+
+
+def synthetic_ids(n_series: int) -> pd.DataFrame:
+    """
+    Id columns of `n_series` M5-style series (every item in every store).
+
+    Args:
+        n_series (int): Number of series; rounded up to a multiple of the
+            number of stores
+
+    Returns:
+        pd.DataFrame: id, item_id, dept_id, cat_id, store_id, state_id
+    """
+    stores = [(store, state) for state, names in STORES.items() for store in names]
+    departments = [(dept, cat) for cat, names in DEPARTMENTS.items() for dept in names]
+    n_items = -(-n_series // len(stores))
+
+    item_dept = [departments[i % len(departments)] for i in range(n_items)]
+    items = [f"{dept}_{i // len(departments) + 1:03d}" for i, (dept, _) in enumerate(item_dept)]
+    ids = pd.DataFrame(
+        [
+            (f"{item}_{store}_validation", item, dept, cat, store, state)
+            for store, state in stores
+            for item, (dept, cat) in zip(items, item_dept)
+        ],
+        columns=["id", "item_id", "dept_id", "cat_id", "store_id", "state_id"],
+    )
+    return ids
+
+
+def synthetic_calendar(n_days: int, seed: int = 0) -> pd.DataFrame:
+    """calendar.csv of `n_days` days from the M5 start date (2011-01-29)."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2011-01-29", periods=n_days)
+    calendar = pd.DataFrame(
+        {
+            "date": dates.strftime("%Y-%m-%d"),
+            "wm_yr_wk": 11101 + np.arange(n_days) // 7,
+            "weekday": dates.day_name(),
+            "wday": (dates.weekday + 2) % 7 + 1,
+            "month": dates.month,
+            "year": dates.year,
+            "d": [f"d_{i}" for i in range(1, n_days + 1)],
+            "event_name_1": None,
+            "event_type_1": None,
+            "event_name_2": None,
+            "event_type_2": None,
+        }
+    )
+    event_days = rng.choice(n_days, size=n_days // 30, replace=False)
+    events = rng.integers(len(EVENTS), size=len(event_days))
+    calendar.loc[event_days, "event_name_1"] = [EVENTS[e][0] for e in events]
+    calendar.loc[event_days, "event_type_1"] = [EVENTS[e][1] for e in events]
+    for state in STORES:
+        calendar[f"snap_{state}"] = (dates.day <= 10).astype(int)
+    return calendar
+
+
+def generate_m5_data(
+    output_dir: Path = RAW_DATA_DIR,
+    n_series: int = 30490,
+    n_days: int = 1913,
+    seed: int = 0,
+) -> Path:
+    """
+    Write M5-shaped raw files of `n_series` series over `n_days` days.
+
+    sales_train_validation.csv, calendar.csv and sell_prices.csv have the
+    columns and id structure of the Kaggle files (10 stores in 3 states, 7
+    departments in 3 categories). Daily sales are Poisson with a per-series
+    level, a weekly pattern and a random first sale day (zeros before it);
+    weekly prices start at the first sale week and have occasional
+    discounts. No network access is needed.
+
+    Args:
+        output_dir (Path): Directory the files are written to
+        n_series (int): Number of series (rounded up to a multiple of 10)
+        n_days (int): Number of sales days (d_1 ... d_<n_days>)
+        seed (int): Seed of the random draws
+
+    Returns:
+        Path: `output_dir`
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    ids = synthetic_ids(n_series)
+    calendar = synthetic_calendar(n_days + CALENDAR_EXTRA_DAYS, seed)
+    n = len(ids)
+
+    level = rng.gamma(0.8, 1.5, n)
+    weekly = 1 + 0.3 * np.sin(2 * np.pi * np.arange(n_days) / 7)
+    first_day = np.where(rng.random(n) < 0.7, 0, rng.integers(0, n_days, n))
+    rate = level[:, None] * weekly[None, :]
+    rate[np.arange(n_days)[None, :] < first_day[:, None]] = 0
+    sales = rng.poisson(rate).astype(np.int16)
+
+    days = [f"d_{i}" for i in range(1, n_days + 1)]
+    sales_df = pd.concat([ids, pd.DataFrame(sales, columns=days)], axis=1)
+    sales_df.to_csv(output_dir / "sales_train_validation.csv", index=False)
+    calendar.to_csv(output_dir / "calendar.csv", index=False)
+
+    # One price per (store, item, week) from the first sale week onwards
+    weeks = calendar["wm_yr_wk"].unique()
+    first_week = first_day // 7
+    base_price = np.round(rng.lognormal(1.0, 0.6, n), 2)
+    series = np.repeat(np.arange(n), len(weeks) - first_week)
+    week_pos = np.concatenate([np.arange(w, len(weeks)) for w in first_week])
+    discount = np.where(rng.random(len(series)) < 0.05, 0.8, 1.0)
+    pd.DataFrame(
+        {
+            "store_id": ids["store_id"].to_numpy()[series],
+            "item_id": ids["item_id"].to_numpy()[series],
+            "wm_yr_wk": weeks[week_pos],
+            "sell_price": np.round(base_price[series] * discount, 2),
+        }
+    ).to_csv(output_dir / "sell_prices.csv", index=False)
+
+    logger.info(f"Wrote synthetic M5 data ({n} series x {n_days} days) to {output_dir}")
+    return output_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic M5-shaped raw data")
+    parser.add_argument("--output-dir", type=Path, default=RAW_DATA_DIR)
+    parser.add_argument("--series", type=int, default=30490)
+    parser.add_argument("--days", type=int, default=1913)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    generate_m5_data(args.output_dir, args.series, args.days, args.seed)
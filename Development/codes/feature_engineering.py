@@ -1,32 +1,200 @@
+import numpy as np
 import pandas as pd
 import logging
-from typing import List
+from typing import Dict, List, Optional, Tuple
+
+from codes.data_handling.category_schema import ID_COLUMNS, encode_categories
+from codes.profiling import profiled
 
 logger = logging.getLogger(__name__)
 
 
-def melt_sales_data(sales_df: pd.DataFrame) -> pd.DataFrame:
+@profiled()
+def melt_sales_data(
+    sales_df: pd.DataFrame, schema: Optional[Dict[str, List[str]]] = None
+) -> pd.DataFrame:
     """
-    Convert wide-format sales data to long-format using 'melt'.
+    Convert wide-format sales data to long-format.
+
+    Same rows as `sales_df.melt(id_vars=<id columns>, var_name="d",
+    value_name="sales")` (day-major), but the id columns and 'd' are emitted
+    as categoricals built from repeated integer codes, and the integer day
+    'd_idx' is added, so no per-row string is ever materialised.
 
     Args:
         sales_df (pd.DataFrame): Raw sales data in wide format.
+        schema (Optional[Dict[str, List[str]]]): Categories of the id columns
+            (see category_schema); sorted distinct values if None.
 
     Returns:
-        pd.DataFrame: Long-format DataFrame with columns: id, item_id, ..., d, sales.
+        pd.DataFrame: Long-format DataFrame with columns: id, item_id, ...,
+        d, d_idx, sales.
     """
-    required_columns = {"id", "item_id", "dept_id", "cat_id", "store_id", "state_id"}
-    if not required_columns.issubset(sales_df.columns):
-        raise ValueError(
-            f"Sales data missing required columns: {required_columns - set(sales_df.columns)}"
-        )
+    missing = set(ID_COLUMNS) - set(sales_df.columns)
+    if missing:
+        raise ValueError(f"Sales data missing required columns: {missing}")
+
+    day_columns = [col for col in sales_df.columns if col.startswith("d_")]
+    n_series, n_days = len(sales_df), len(day_columns)
 
     logger.info("Melting sales data to long format")
-    return sales_df.melt(
-        id_vars=list(required_columns), var_name="d", value_name="sales"
-    )
+    long = {}
+    for col in ID_COLUMNS:
+        encoded = encode_categories(sales_df[col], (schema or {}).get(col))
+        long[col] = pd.Categorical.from_codes(
+            np.tile(encoded.codes, n_days), dtype=encoded.dtype
+        )
+    day_codes = np.repeat(np.arange(n_days, dtype=np.int16), n_series)
+    long["d"] = pd.Categorical.from_codes(day_codes, categories=day_columns)
+    long["d_idx"] = day_index(pd.Series(day_columns))[day_codes]
+    long["sales"] = sales_df[day_columns].to_numpy().ravel(order="F")
+    return pd.DataFrame(long)
+
+
+def day_index(d: pd.Series) -> np.ndarray:
+    """
+    Map day labels such as 'd_1500' to their integer day number.
+
+    Each distinct label is parsed once, so the cost does not grow with the
+    number of rows sharing a day.
+
+    Args:
+        d (pd.Series): Day labels ('d_<n>'), plain or categorical.
+
+    Returns:
+        np.ndarray: int16 day numbers aligned with `d`.
+    """
+    if isinstance(d.dtype, pd.CategoricalDtype):
+        codes, labels = d.cat.codes.to_numpy(), d.cat.categories
+    else:
+        codes, labels = pd.factorize(d)
+    days = pd.Index(labels).str.slice(2).astype(np.int16).to_numpy()
+    return days[codes]
+
+
+def add_day_index(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the integer day column 'd_idx' derived from 'd'.
+
+    Args:
+        df (pd.DataFrame): DataFrame with a 'd' column.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'd_idx' added.
+    """
+    df["d_idx"] = day_index(df["d"])
+    return df
+
+
+def _uniques(values: pd.Series) -> pd.Index:
+    """Distinct values of a plain or categorical column."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return pd.Index(values.cat.categories)
+    return pd.Index(values.unique())
+
+
+def _positions(values: pd.Series, uniques: pd.Index) -> np.ndarray:
+    """Position of each value in `uniques` (-1 when absent)."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        lookup = np.append(uniques.get_indexer(values.cat.categories), -1)
+        return lookup[values.cat.codes.to_numpy()]
+    return uniques.get_indexer(values)
+
+
+@profiled()
+def merge_calendar(df: pd.DataFrame, calendar: pd.DataFrame) -> pd.DataFrame:
+    """
+    Left-join the calendar attributes onto the long frame by day index.
+
+    Equivalent to `df.merge(calendar, on="d", how="left")`, but the rows are
+    fetched by array indexing on the integer day instead of hashing strings.
+
+    Args:
+        df (pd.DataFrame): Long-format DataFrame with a 'd' column.
+        calendar (pd.DataFrame): Calendar with one row per 'd'.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'd_idx' and the calendar columns added.
+    """
+    if "d_idx" not in df.columns:
+        df = add_day_index(df)
+
+    calendar_days = day_index(calendar["d"]).astype(np.int64)
+    days = df["d_idx"].to_numpy()
+    size = int(max(calendar_days.max(), days.max())) + 1
+    lookup = np.full(size, -1, dtype=np.int64)
+    lookup[calendar_days] = np.arange(len(calendar))
+    rows = lookup[days]
+
+    attributes = calendar.drop(columns="d").reset_index(drop=True)
+    if (rows < 0).any():
+        joined = attributes.reindex(rows)
+    else:
+        joined = attributes.take(rows)
+
+    logger.info(f"Joining {attributes.shape[1]} calendar columns by day index")
+    for col in joined.columns:
+        df[col] = joined[col].array
+    return df
+
+
+@profiled()
+def merge_prices(
+    df: pd.DataFrame, prices: pd.DataFrame, max_dense_size: int = 100_000_000
+) -> pd.DataFrame:
+    """
+    Left-join 'sell_price' onto the long frame by (store, item, week).
 
+    Equivalent to `df.merge(prices, on=["store_id", "item_id", "wm_yr_wk"],
+    how="left")` for unique price keys. Keys are encoded as integers and the
+    price is read from a dense (store x item x week) array, or found with
+    `searchsorted` on the sorted keys when that array would be too large.
 
+    Args:
+        df (pd.DataFrame): DataFrame with 'store_id', 'item_id' and 'wm_yr_wk'.
+        prices (pd.DataFrame): sell_prices dataset.
+        max_dense_size (int): Largest number of cells for the dense array.
+
+    Returns:
+        pd.DataFrame: DataFrame with 'sell_price' added.
+    """
+    stores = _uniques(prices["store_id"])
+    items = _uniques(prices["item_id"])
+    weeks = np.unique(prices["wm_yr_wk"].to_numpy())
+
+    def encode(frame: pd.DataFrame) -> np.ndarray:
+        store = _positions(frame["store_id"], stores)
+        item = _positions(frame["item_id"], items)
+        week_values = frame["wm_yr_wk"].to_numpy()
+        week = np.clip(np.searchsorted(weeks, week_values), 0, len(weeks) - 1)
+        found = (store >= 0) & (item >= 0) & (weeks[week] == week_values)
+        key = (store.astype(np.int64) * len(items) + item) * len(weeks) + week
+        return np.where(found, key, -1)
+
+    price_keys = encode(prices)
+    price_values = prices["sell_price"].to_numpy(dtype=np.float32)
+    keys = encode(df)
+    found = keys >= 0
+    n_cells = len(stores) * len(items) * len(weeks)
+
+    logger.info(f"Joining sell prices over {n_cells} (store, item, week) keys")
+    sell_price = np.full(len(df), np.nan, dtype=np.float32)
+    if n_cells <= max_dense_size:
+        dense = np.full(n_cells, np.nan, dtype=np.float32)
+        dense[price_keys] = price_values
+        sell_price[found] = dense[keys[found]]
+    else:
+        order = np.argsort(price_keys, kind="stable")
+        sorted_keys = price_keys[order]
+        pos = np.clip(np.searchsorted(sorted_keys, keys), 0, len(sorted_keys) - 1)
+        hit = found & (sorted_keys[pos] == keys)
+        sell_price[hit] = price_values[order][pos[hit]]
+
+    df["sell_price"] = sell_price
+    return df
+
+
+@profiled()
 def add_lag_features(df: pd.DataFrame, lags: List[int] = [7, 28]) -> pd.DataFrame:
     """
     Add lag features (e.g., sales 7/28 days ago) to each item.
@@ -45,6 +213,7 @@ def add_lag_features(df: pd.DataFrame, lags: List[int] = [7, 28]) -> pd.DataFram
     return df
 
 
+@profiled()
 def add_rolling_features(
     df: pd.DataFrame, windows: List[int] = [7, 28], base_lag_col: str = "lag_28"
 ) -> pd.DataFrame:
@@ -73,6 +242,148 @@ def add_rolling_features(
     return df
 
 
+def _shift_days(matrix: np.ndarray, periods: int) -> np.ndarray:
+    """Shift a (series x day) matrix forward in time, padding with NaN."""
+    shifted = np.full(matrix.shape, np.nan, dtype=np.float32)
+    if periods < matrix.shape[1]:
+        shifted[:, periods:] = matrix[:, : matrix.shape[1] - periods]
+    return shifted
+
+
+def _rolling_mean(matrix: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing rolling mean along the day axis using cumulative sums.
+
+    A window containing any NaN yields NaN, as `pd.Series.rolling(window).mean()`.
+    """
+    n_days = matrix.shape[1]
+    result = np.full(matrix.shape, np.nan, dtype=np.float32)
+    if window > n_days:
+        return result
+
+    missing = np.isnan(matrix)
+    padded = np.zeros((matrix.shape[0], n_days + 1), dtype=np.float64)
+    np.cumsum(np.where(missing, 0.0, matrix), axis=1, out=padded[:, 1:])
+    counts = np.zeros((matrix.shape[0], n_days + 1), dtype=np.int32)
+    np.cumsum(missing, axis=1, out=counts[:, 1:])
+
+    sums = padded[:, window:] - padded[:, :-window]
+    gaps = counts[:, window:] - counts[:, :-window]
+    result[:, window - 1 :] = np.where(gaps == 0, sums / window, np.nan)
+    return result
+
+
+def compute_window_features(
+    sales: np.ndarray,
+    lags: List[int] = [7, 28],
+    windows: List[int] = [7, 28],
+    base_lag: int = 28,
+) -> Dict[str, np.ndarray]:
+    """
+    Compute lag and rolling-mean features on a wide (series x day) sales matrix.
+
+    Args:
+        sales (np.ndarray): Sales matrix, one row per series and one column per day.
+        lags (List[int]): List of lag periods.
+        windows (List[int]): List of rolling window sizes.
+        base_lag (int): Lag the rolling means are computed over.
+
+    Returns:
+        Dict[str, np.ndarray]: Feature matrices (same shape as `sales`) keyed by
+        column name, e.g. 'lag_7' or 'rolling_mean_28'.
+    """
+    sales = np.asarray(sales, dtype=np.float32)
+    features = {f"lag_{lag}": _shift_days(sales, lag) for lag in lags}
+    # The rolling mean of a lag equals the lagged rolling mean of the sales
+    for window in windows:
+        features[f"rolling_mean_{window}"] = _shift_days(
+            _rolling_mean(sales, window), base_lag
+        )
+    return features
+
+
+def _series_layout(codes: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Row order that groups a long frame into equal-length, time-ordered series.
+
+    Returns None when the rows already follow the layout produced by
+    `melt_sales_data` (day-major, series in the same order every day), and
+    raises ValueError when the series do not all have the same length.
+    """
+    n_series = int(codes.max()) + 1 if len(codes) else 0
+    if n_series == 0 or len(codes) % n_series:
+        raise ValueError("Series of unequal length cannot be laid out as a matrix.")
+
+    first_day = codes[:n_series]
+    if np.array_equal(np.sort(first_day), np.arange(n_series)) and np.all(
+        codes.reshape(-1, n_series) == first_day
+    ):
+        return None
+
+    if np.any(np.bincount(codes, minlength=n_series) != len(codes) // n_series):
+        raise ValueError("Series of unequal length cannot be laid out as a matrix.")
+    return np.argsort(codes, kind="stable")
+
+
+@profiled()
+def add_window_features(
+    df: pd.DataFrame,
+    lags: List[int] = [7, 28],
+    windows: List[int] = [7, 28],
+    base_lag_col: str = "lag_28",
+) -> pd.DataFrame:
+    """
+    Vectorized equivalent of `add_lag_features` followed by `add_rolling_features`.
+
+    The long frame is viewed as a (series x day) matrix, the features are
+    computed with array operations and attached back in row order. Rows of
+    each 'id' must be in time order; frames whose series differ in length
+    fall back to the groupby implementation.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'id' and 'sales' columns.
+        lags (List[int]): List of lag periods.
+        windows (List[int]): List of rolling window sizes.
+        base_lag_col (str): Lag column the rolling means are computed over.
+
+    Returns:
+        pd.DataFrame: DataFrame with lag and rolling mean columns added.
+    """
+    base_lag = int(base_lag_col.rsplit("_", 1)[-1])
+    if base_lag not in lags:
+        raise ValueError(
+            f"Missing base lag column '{base_lag_col}' for rolling features."
+        )
+
+    codes = pd.factorize(df["id"], sort=False)[0]
+    try:
+        order = _series_layout(codes)
+    except ValueError:
+        logger.warning("Series have unequal lengths; using groupby features")
+        df = add_lag_features(df, lags)
+        return add_rolling_features(df, windows, base_lag_col)
+
+    n_series = int(codes.max()) + 1
+    sales = df["sales"].to_numpy(dtype=np.float32)
+    if order is None:
+        # Day-major layout: row k is day k // n_series of series codes[k]
+        inverse = np.argsort(codes[:n_series])
+        wide = sales.reshape(-1, n_series)[:, inverse].T
+    else:
+        wide = sales[order].reshape(n_series, -1)
+
+    logger.info(f"Adding window features on a {wide.shape} sales matrix")
+    for name, matrix in compute_window_features(wide, lags, windows, base_lag).items():
+        if order is None:
+            df[name] = matrix.T[:, codes[:n_series]].ravel()
+        else:
+            column = np.empty(len(df), dtype=np.float32)
+            column[order] = matrix.ravel()
+            df[name] = column
+    return df
+
+
+@profiled()
 def add_date_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Add temporal features (weekday, week, month, year) from 'date'.
@@ -90,8 +401,120 @@ def add_date_features(df: pd.DataFrame) -> pd.DataFrame:
 
     logger.info("Adding date features")
     df["date"] = pd.to_datetime(df["date"])
-    df["weekday"] = df["date"].dt.weekday
-    df["week"] = df["date"].dt.isocalendar().week.astype(int)
-    df["month"] = df["date"].dt.month
-    df["year"] = df["date"].dt.year
+    df["weekday"] = df["date"].dt.weekday.astype(np.int8)
+    df["week"] = df["date"].dt.isocalendar().week.astype(np.int8)
+    df["month"] = df["date"].dt.month.astype(np.int8)
+    df["year"] = df["date"].dt.year.astype(np.int16)
     return df
+
+
+@profiled()
+def add_calendar_features(calendar: pd.DataFrame) -> pd.DataFrame:
+    """
+    Compute the calendar-derived features once per day, on the calendar table.
+
+    They reach the long frame through `merge_calendar`, which broadcasts them
+    by integer day index; features derived from events or SNAP flags belong
+    here as well.
+
+    Args:
+        calendar (pd.DataFrame): calendar.csv dataset.
+
+    Returns:
+        pd.DataFrame: Calendar with compact date features added.
+    """
+    calendar = add_date_features(calendar.copy())
+    for col in [c for c in calendar.columns if c.startswith("snap_")]:
+        calendar[col] = calendar[col].astype(np.int8)
+    return calendar
+
+
+def build_features(
+    sales: pd.DataFrame,
+    calendar: pd.DataFrame,
+    prices: pd.DataFrame,
+    schema: Optional[Dict[str, List[str]]] = None,
+) -> pd.DataFrame:
+    """
+    Full feature pipeline: melt, calendar and price joins, lag/rolling and date features.
+
+    Date features are computed on the calendar before the join, so there is
+    no datetime pass over the long frame.
+
+    Args:
+        sales (pd.DataFrame): Raw sales data in wide format.
+        calendar (pd.DataFrame): calendar.csv dataset.
+        prices (pd.DataFrame): sell_prices.csv dataset.
+        schema (Optional[Dict[str, List[str]]]): Categories of the id columns.
+
+    Returns:
+        pd.DataFrame: Long-format DataFrame with all model features.
+    """
+    df = melt_sales_data(sales, schema)
+    df = merge_calendar(df, add_calendar_features(calendar))
+    df = merge_prices(df, prices)
+    return add_window_features(df)
+
+
+def window_history_days(
+    lags: List[int] = [7, 28], windows: List[int] = [7, 28], base_lag: int = 28
+) -> int:
+    """
+    Number of trailing days needed to compute the window features of a new day.
+
+    Args:
+        lags (List[int]): List of lag periods.
+        windows (List[int]): List of rolling window sizes.
+        base_lag (int): Lag the rolling means are computed over.
+
+    Returns:
+        int: Length of the per-series history to keep.
+    """
+    return max(max(lags), base_lag + max(windows) - 1)
+
+
+def build_incremental_features(
+    history: pd.DataFrame,
+    new_sales: pd.DataFrame,
+    calendar: pd.DataFrame,
+    prices: pd.DataFrame,
+    schema: Optional[Dict[str, List[str]]] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Compute the features of newly appended days from the trailing history only.
+
+    Args:
+        history (pd.DataFrame): Wide sales of the last `window_history_days()`
+            days per series, with an 'id' column (the window state).
+        new_sales (pd.DataFrame): Wide sales of the new days with all id columns.
+        calendar (pd.DataFrame): calendar.csv dataset.
+        prices (pd.DataFrame): sell_prices.csv dataset.
+        schema (Optional[Dict[str, List[str]]]): Categories of the id columns.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: Long-format features of the new days,
+        and the updated window state.
+    """
+    new_days = [col for col in new_sales.columns if col.startswith("d_")]
+    id_columns = [col for col in new_sales.columns if not col.startswith("d_")]
+    history_days = [col for col in history.columns if col.startswith("d_")]
+
+    # Series missing from the history (new items) get an empty past
+    past = history.set_index(history["id"].astype(str))[history_days]
+    past = past.reindex(new_sales["id"].astype(str))
+    combined = pd.concat(
+        [
+            new_sales[id_columns].reset_index(drop=True),
+            past.reset_index(drop=True),
+            new_sales[new_days].reset_index(drop=True),
+        ],
+        axis=1,
+    )
+
+    logger.info(f"Computing features for {len(new_days)} new days")
+    features = build_features(combined, calendar, prices, schema)
+    first_new_day = int(new_days[0][2:])
+    features = features[features["d_idx"] >= first_new_day].reset_index(drop=True)
+
+    state_days = (history_days + new_days)[-window_history_days():]
+    return features, combined[id_columns + state_days]
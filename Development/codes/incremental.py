@@ -0,0 +1,104 @@
+import logging
+from pathlib import Path
+from typing import Optional
+
+from codes.data_handling.category_schema import (
+    build_category_schema,
+    load_category_schema,
+    save_category_schema,
+)
+from codes.data_handling.data_loader import (
+    load_sales_data,
+    load_calendar_data,
+    load_sell_prices,
+)
+from codes.data_handling.feature_store import (
+    read_manifest,
+    write_partition,
+    write_manifest,
+    load_window_state,
+    save_window_state,
+    clear_window_state,
+    WINDOW_STATE_DIR,
+)
+from codes.feature_engineering import (
+    build_incremental_features,
+    day_index,
+    window_history_days,
+)
+from codes.config import (
+    FEATURE_STORE_DIR,
+    RAW_DATA_DIR,
+    START_DATE_TRAIN,
+    CATEGORY_SCHEMA_FILE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def can_refresh(
+    root: Path = FEATURE_STORE_DIR, start_date_train: int = START_DATE_TRAIN
+) -> bool:
+    """True if the store starts at `start_date_train` and has a window state to extend."""
+    manifest = read_manifest(root)
+    if manifest is None or manifest["first_day"] != start_date_train:
+        return False
+    return (root / WINDOW_STATE_DIR).exists()
+
+
+def refresh_feature_store(
+    root: Path = FEATURE_STORE_DIR,
+    raw_data_dir: Path = RAW_DATA_DIR,
+    fingerprint: Optional[str] = None,
+    schema_path: Path = CATEGORY_SCHEMA_FILE,
+) -> int:
+    """
+    Append the features of the days added to the raw data since the last build.
+
+    Only the new day columns are read from the sales data, and the lag and
+    rolling features are computed from the saved per-series window state, so
+    the cost grows with the number of new days rather than with the history.
+    Past days are assumed unchanged. Series that are new to the category
+    schema are appended to it, keeping the existing codes.
+
+    Args:
+        root (Path): Root directory of the feature store
+        raw_data_dir (Path): Path to the raw data directory
+        fingerprint (Optional[str]): Fingerprint of the inputs, for the manifest
+        schema_path (Path): Category schema of the id columns
+
+    Returns:
+        int: Number of days appended
+    """
+    manifest = read_manifest(root)
+    history = load_window_state(root)
+    if manifest is None or history is None:
+        raise FileNotFoundError(f"No feature store with a window state in {root}")
+
+    new_sales = load_sales_data(raw_data_dir, start_date_train=manifest["last_day"] + 1)
+    new_days = [col for col in new_sales.columns if col.startswith("d_")]
+    if not new_days:
+        logger.info("No new days to add to the feature store")
+        return 0
+
+    calendar = load_calendar_data(raw_data_dir)
+    first_new_week = calendar["wm_yr_wk"][
+        day_index(calendar["d"]) == int(new_days[0][2:])
+    ].min()
+    prices = load_sell_prices(
+        raw_data_dir, filters=[("wm_yr_wk", ">=", int(first_new_week))]
+    )
+
+    schema = build_category_schema(new_sales, base=load_category_schema(schema_path))
+    save_category_schema(schema, schema_path)
+
+    features, state = build_incremental_features(
+        history, new_sales, calendar, prices, schema
+    )
+    write_partition(features, root, manifest["day_bucket_size"])
+    clear_window_state(root)
+    save_window_state(state, window_history_days(), root)
+    write_manifest(root, fingerprint, manifest["day_bucket_size"])
+
+    logger.info(f"Appended {len(new_days)} days ({len(features)} rows) to {root}")
+    return len(new_days)
@@ -1,4 +1,5 @@
 import numpy as np
+from typing import Dict, Optional, Tuple
 
 
 def smape(y_true: np.ndarray, y_pred: np.ndarray) -> float:
@@ -43,3 +44,190 @@ def mase(y_true: np.ndarray, y_pred: np.ndarray, seasonality: int = 1) -> float:
     numerator = np.mean(np.abs(y_trimmed - pred_trimmed))
 
     return numerator / denominator if denominator != 0 else np.inf
+
+
+def series_codes(
+    X, columns: Tuple[str, ...] = ("store_id", "item_id")
+) -> Optional[Tuple[np.ndarray, int]]:
+    """
+    Integer series code of every row, from categorical id columns.
+
+    Codes are built from the category codes, so frames encoded with the same
+    categories (see the category schema) get the same code per series.
+
+    Args:
+        X (pd.DataFrame): Rows with categorical `columns`
+        columns (Tuple[str, ...]): Id columns identifying a series
+
+    Returns:
+        Optional[Tuple[np.ndarray, int]]: int64 codes and the number of
+        possible series, or None if X lacks the categorical columns
+    """
+    if not all(
+        col in getattr(X, "columns", []) and hasattr(X[col], "cat") for col in columns
+    ):
+        return None
+    codes = np.zeros(len(X), dtype=np.int64)
+    n_series = 1
+    for col in columns:
+        n_categories = len(X[col].cat.categories)
+        codes = codes * n_categories + X[col].cat.codes.to_numpy()
+        n_series *= n_categories
+    return codes, n_series
+
+
+def series_scale(
+    y: np.ndarray,
+    codes: np.ndarray,
+    n_series: int,
+    seasonality: int = 1,
+    squared: bool = False,
+    from_first_sale: bool = True,
+) -> np.ndarray:
+    """
+    Naive-forecast scale of every series over its training history.
+
+    Rows of a series must be in time order (e.g. sorted by day) and
+    consecutive in time; other series' rows may be interleaved.
+
+    Args:
+        y (np.ndarray): Training target of every row
+        codes (np.ndarray): Series code of every row
+        n_series (int): Number of possible series codes
+        seasonality (int): Lag of the naive forecast
+        squared (bool): Mean squared (RMSSE) instead of absolute (MASE) differences
+        from_first_sale (bool): Ignore the leading zeros of each series, as
+            in the M5 evaluation
+
+    Returns:
+        np.ndarray: Scale per series code, NaN for series without history
+    """
+    order = np.argsort(codes, kind="stable")
+    y_sorted = np.asarray(y, dtype=np.float64)[order]
+    codes_sorted = codes[order]
+
+    same_series = codes_sorted[seasonality:] == codes_sorted[:-seasonality]
+    if from_first_sale:
+        # Running sales total within each series; zero before the first sale
+        starts = np.flatnonzero(np.r_[True, codes_sorted[1:] != codes_sorted[:-1]])
+        totals = np.cumsum(y_sorted)
+        offsets = np.repeat(
+            totals[starts] - y_sorted[starts], np.diff(np.r_[starts, len(y_sorted)])
+        )
+        same_series &= (totals - offsets)[:-seasonality] > 0
+
+    diffs = y_sorted[seasonality:] - y_sorted[:-seasonality]
+    diffs = diffs**2 if squared else np.abs(diffs)
+    series = codes_sorted[seasonality:][same_series]
+    sums = np.bincount(series, weights=diffs[same_series], minlength=n_series)
+    counts = np.bincount(series, minlength=n_series)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def _series_mean_score(
+    errors: np.ndarray, codes: np.ndarray, scale: np.ndarray
+) -> np.ndarray:
+    """Mean error of every series divided by its scale (NaN if not scorable)."""
+    sums = np.bincount(codes, weights=errors, minlength=len(scale))
+    counts = np.bincount(codes, minlength=len(scale))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = sums / counts / scale
+    return np.where((counts > 0) & (scale > 0), scores, np.nan)
+
+
+def series_mase(
+    y_true: np.ndarray, y_pred: np.ndarray, codes: np.ndarray, scale: np.ndarray
+) -> float:
+    """
+    Mean over series of the per-series MASE.
+
+    Args:
+        y_true (np.ndarray): Ground truth values.
+        y_pred (np.ndarray): Predicted values.
+        codes (np.ndarray): Series code of every row.
+        scale (np.ndarray): Per-series scale from series_scale.
+
+    Returns:
+        float: MASE averaged over the series with a positive scale.
+    """
+    errors = np.abs(np.asarray(y_true, dtype=np.float64) - y_pred)
+    scores = _series_mean_score(errors, codes, scale)
+    return float(np.nanmean(scores)) if np.isfinite(scores).any() else np.inf
+
+
+def series_rmsse(
+    y_true: np.ndarray, y_pred: np.ndarray, codes: np.ndarray, scale_sq: np.ndarray
+) -> float:
+    """
+    Mean over series of the per-series RMSSE.
+
+    Args:
+        y_true (np.ndarray): Ground truth values.
+        y_pred (np.ndarray): Predicted values.
+        codes (np.ndarray): Series code of every row.
+        scale_sq (np.ndarray): Per-series squared scale (series_scale(squared=True)).
+
+    Returns:
+        float: RMSSE averaged over the series with a positive scale.
+    """
+    errors = (np.asarray(y_true, dtype=np.float64) - y_pred) ** 2
+    scores = np.sqrt(_series_mean_score(errors, codes, scale_sq))
+    return float(np.nanmean(scores)) if np.isfinite(scores).any() else np.inf
+
+
+def series_metric_inputs(X_train, y_train, X_valid) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Validation series codes and training scales for series_mase/series_rmsse.
+
+    Args:
+        X_train, y_train: training data (rows in time order per series)
+        X_valid: validation features
+
+    Returns:
+        Optional[Dict[str, np.ndarray]]: 'codes', 'scale' and 'scale_sq', or
+        None when the frames have no categorical series ids
+    """
+    train, valid = series_codes(X_train), series_codes(X_valid)
+    if train is None or valid is None or train[1] != valid[1]:
+        return None
+    (codes, n_series), y = train, np.asarray(y_train)
+    return {
+        "codes": valid[0],
+        "scale": series_scale(y, codes, n_series),
+        "scale_sq": series_scale(y, codes, n_series, squared=True),
+    }
+
+
+def regression_metrics(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    series: Optional[Dict[str, np.ndarray]] = None,
+) -> Dict[str, float]:
+    """
+    RMSE, sMAPE and MASE of a prediction (plus RMSSE when series are known).
+
+    With `series` (see series_metric_inputs), MASE is computed per series
+    against its own naive forecast; without, on the flat array.
+
+    Args:
+        y_true (np.ndarray): Ground truth values.
+        y_pred (np.ndarray): Predicted values.
+        series (Optional[Dict[str, np.ndarray]]): Series codes and scales.
+
+    Returns:
+        Dict[str, float]: Metric values by name.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    metrics = {
+        "rmse": float(np.sqrt(np.mean((y_true - y_pred) ** 2))),
+        "sMAPE": smape(y_true, y_pred),
+    }
+    if series is None:
+        metrics["MASE"] = mase(y_true, y_pred)
+    else:
+        metrics["MASE"] = series_mase(y_true, y_pred, series["codes"], series["scale"])
+        metrics["RMSSE"] = series_rmsse(
+            y_true, y_pred, series["codes"], series["scale_sq"]
+        )
+    return metrics
@@ -0,0 +1,275 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from codes.metrics.error_metrics import series_codes
+
+logger = logging.getLogger(__name__)
+
+# The 12 aggregation levels of the M5 evaluation, as id column combinations
+# (42,840 series on the full data)
+LEVELS: List[Tuple[str, ...]] = [
+    (),
+    ("state_id",),
+    ("store_id",),
+    ("cat_id",),
+    ("dept_id",),
+    ("state_id", "cat_id"),
+    ("state_id", "dept_id"),
+    ("store_id", "cat_id"),
+    ("store_id", "dept_id"),
+    ("item_id",),
+    ("state_id", "item_id"),
+    ("store_id", "item_id"),
+]
+
+# Days of the training history the series weights are computed on
+WEIGHT_DAYS = 28
+
+
+def level_name(columns: Tuple[str, ...]) -> str:
+    """Name of an aggregation level, e.g. 'store_id/dept_id' or 'total'."""
+    return "/".join(columns) or "total"
+
+
+def summing_matrix(
+    ids: pd.DataFrame, levels: List[Tuple[str, ...]] = LEVELS
+) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """
+    Sparse matrix summing the bottom series into every aggregated series.
+
+    Row i of `S @ Y` is aggregated series i, for Y with one row per bottom
+    series (row of `ids`).
+
+    Args:
+        ids (pd.DataFrame): Id columns of the bottom series, one row each
+        levels (List[Tuple[str, ...]]): Id column combinations to aggregate by
+
+    Returns:
+        Tuple[sparse.csr_matrix, np.ndarray]: The (n_aggregated x n_bottom)
+        0/1 matrix and the level number of each of its rows
+    """
+    n_bottom = len(ids)
+    rows, level_of, offset = [], [], 0
+    for level, columns in enumerate(levels):
+        if columns:
+            groups = ids.groupby(list(columns), observed=True, sort=True).ngroup()
+            groups = groups.to_numpy()
+        else:
+            groups = np.zeros(n_bottom, dtype=np.int64)
+        n_groups = int(groups.max()) + 1 if n_bottom else 0
+        rows.append(groups + offset)
+        level_of.append(np.full(n_groups, level))
+        offset += n_groups
+
+    rows = np.concatenate(rows)
+    cols = np.tile(np.arange(n_bottom), len(levels))
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows)), (rows, cols)), shape=(offset, n_bottom)
+    )
+    return matrix, np.concatenate(level_of)
+
+
+def _day_positions(codes: np.ndarray, align_end: bool = False) -> np.ndarray:
+    """
+    Day offset of every row: its rank among the rows of its series.
+
+    With `align_end`, shorter series are shifted so that all series end on
+    the same day (e.g. items without the full training history).
+    """
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    counts = np.diff(np.r_[starts, len(codes)])
+    ranks = np.arange(len(codes)) - np.repeat(starts, counts)
+    if align_end and len(codes):
+        ranks += np.repeat(counts.max() - counts, counts)
+    positions = np.empty(len(codes), dtype=np.int64)
+    positions[order] = ranks
+    return positions
+
+
+def _aggregated_scale(
+    S: sparse.csr_matrix,
+    bottom: np.ndarray,
+    days: np.ndarray,
+    values: np.ndarray,
+    block_days: int = 128,
+) -> np.ndarray:
+    """
+    Mean squared one-day difference of every aggregated training series.
+
+    The bottom series are densified `block_days` days at a time, so memory
+    stays bounded on long histories. As in the M5 evaluation, each series
+    only counts from its first non-zero value.
+    """
+    n_agg, n_bottom = S.shape
+    n_days = int(days.max()) + 1 if len(days) else 0
+    order = np.argsort(days, kind="stable")
+    days, bottom, values = days[order], bottom[order], values[order]
+    bounds = np.searchsorted(days, np.arange(0, n_days + block_days, block_days))
+
+    sums = np.zeros(n_agg)
+    counts = np.zeros(n_agg)
+    prev, started = None, np.zeros(n_agg, dtype=bool)
+    for first, a, b in zip(range(0, n_days, block_days), bounds[:-1], bounds[1:]):
+        block = np.zeros((n_bottom, min(block_days, n_days - first)))
+        block[bottom[a:b], days[a:b] - first] = values[a:b]
+        agg = S @ block
+
+        # Whether each series had a non-zero value up to (and including) each day
+        started_by = started[:, None] | (np.cumsum(agg, axis=1) > 0)
+        if prev is not None:
+            agg = np.column_stack([prev, agg])
+            started_by = np.column_stack([started, started_by])
+        counted = started_by[:, :-1]
+        sums += np.where(counted, np.diff(agg, axis=1) ** 2, 0).sum(axis=1)
+        counts += counted.sum(axis=1)
+        prev, started = agg[:, -1], started_by[:, -1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+class WRMSSEEvaluator:
+    """
+    Weighted RMSSE over all aggregation levels of the hierarchy.
+
+    Everything that does not depend on the predictions is computed once:
+    the summing matrix, the aggregated actuals of the validation period,
+    the scale of every aggregated series (from the training history) and
+    its weight (share of the dollar sales of its level over the last
+    WEIGHT_DAYS training days, each level weighing 1/n_levels). Scoring a
+    prediction then takes one sparse matmul.
+
+    The rows of each series must be in time order and cover consecutive
+    days, as in the day-sorted splits of split_data; training histories
+    are aligned on their last day.
+
+    Args:
+        X_train, y_train: training data, with the id columns of `levels`
+        X_valid, y_valid: validation data scored by the evaluator
+        levels (List[Tuple[str, ...]]): Aggregation levels
+    """
+
+    def __init__(
+        self,
+        X_train: pd.DataFrame,
+        y_train,
+        X_valid: pd.DataFrame,
+        y_valid,
+        levels: List[Tuple[str, ...]] = LEVELS,
+    ):
+        self.levels = levels
+        codes, _ = series_codes(X_valid)
+        self.series, first_row, self._bottom = np.unique(
+            codes, return_index=True, return_inverse=True
+        )
+        self._days = _day_positions(codes)
+        self.horizon = int(self._days.max()) + 1
+
+        columns = sorted({col for level in levels for col in level})
+        ids = X_valid[columns].iloc[first_row].reset_index(drop=True)
+        self.S, self.level_of = summing_matrix(ids, levels)
+
+        y_valid = np.asarray(y_valid, dtype=np.float64)
+        self.actuals = self.S @ self._bottom_matrix(y_valid)
+
+        # Training rows of the validated series only
+        train_codes, _ = series_codes(X_train)
+        bottom = np.searchsorted(self.series, train_codes)
+        known = (bottom < len(self.series)) & (
+            self.series[np.minimum(bottom, len(self.series) - 1)] == train_codes
+        )
+        y = np.asarray(y_train, dtype=np.float64)[known]
+        bottom, days = bottom[known], _day_positions(train_codes[known], align_end=True)
+        self.scale = _aggregated_scale(self.S, bottom, days, y)
+
+        # Dollar sales of the last WEIGHT_DAYS training days
+        recent = days > days.max(initial=0) - WEIGHT_DAYS
+        if "sell_price" in X_train.columns:
+            price = X_train["sell_price"].to_numpy(dtype=np.float64)[known]
+            dollars = y * np.nan_to_num(price)
+        else:
+            dollars = y
+        bottom_dollars = np.bincount(
+            bottom[recent], weights=dollars[recent], minlength=len(self.series)
+        )
+        agg_dollars = self.S @ bottom_dollars
+        level_totals = np.bincount(self.level_of, weights=agg_dollars)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weights = agg_dollars / level_totals[self.level_of] / len(levels)
+        self.weights = np.where(self.scale > 0, np.nan_to_num(weights), 0.0)
+
+        logger.info(
+            f"WRMSSE over {self.S.shape[0]} series ({len(self.series)} bottom) "
+            f"and {self.horizon} days"
+        )
+
+    def _bottom_matrix(self, values: np.ndarray) -> np.ndarray:
+        """(n_bottom x horizon) matrix of row-level values."""
+        matrix = np.zeros((len(self.series), self.horizon))
+        matrix[self._bottom, self._days] = values
+        return matrix
+
+    def rmsse(self, y_pred) -> np.ndarray:
+        """RMSSE of every aggregated series (NaN where the scale is zero)."""
+        predicted = self.S @ self._bottom_matrix(np.asarray(y_pred, dtype=np.float64))
+        mse = np.mean((self.actuals - predicted) ** 2, axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.scale > 0, np.sqrt(mse / self.scale), np.nan)
+
+    def __call__(self, y_pred) -> float:
+        """WRMSSE of predictions for the validation rows (in their order)."""
+        return float(np.nansum(self.weights * self.rmsse(y_pred)))
+
+    def level_scores(self, y_pred) -> Dict[str, float]:
+        """WRMSSE of every aggregation level on its own."""
+        weighted = np.nan_to_num(self.weights * self.rmsse(y_pred))
+        scores = np.bincount(self.level_of, weights=weighted) * len(self.levels)
+        return {
+            level_name(columns): float(score)
+            for columns, score in zip(self.levels, scores)
+        }
+
+    def feval(self, preds, eval_data):
+        """
+        LightGBM-compatible WRMSSE metric for the validation Dataset.
+
+        Returns:
+            tuple: (metric_name, value, is_higher_better)
+        """
+        return "WRMSSE", self(preds), False
+
+
+def build_wrmsse_evaluator(
+    X_train: pd.DataFrame,
+    y_train,
+    X_valid: pd.DataFrame,
+    y_valid,
+    levels: List[Tuple[str, ...]] = LEVELS,
+) -> Optional[WRMSSEEvaluator]:
+    """
+    WRMSSE evaluator of the validation split, if the frames carry the ids.
+
+    Args:
+        X_train, y_train: training data
+        X_valid, y_valid: validation data
+        levels (List[Tuple[str, ...]]): Aggregation levels
+
+    Returns:
+        Optional[WRMSSEEvaluator]: The evaluator, or None when an id column
+        of `levels` (or the categorical store/item ids) is missing
+    """
+    columns = {col for level in levels for col in level} | {"store_id", "item_id"}
+    missing = {
+        col for col in columns
+        if col not in X_train.columns or col not in X_valid.columns
+    }
+    if missing or series_codes(X_train) is None or series_codes(X_valid) is None:
+        logger.info(f"WRMSSE not computed: missing id columns {sorted(missing)}")
+        return None
+    return WRMSSEEvaluator(X_train, y_train, X_valid, y_valid, levels)
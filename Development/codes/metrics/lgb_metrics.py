@@ -1,6 +1,40 @@
-from .error_metrics import smape, mase
+from .error_metrics import smape, series_mase
+from codes.config import EVAL_EVERY, LOSS_METRIC
+import weakref
+from typing import Any, Callable, Dict, Optional
 import numpy as np
 
+# Label-derived quantities per Dataset; labels never change during training
+_label_cache = weakref.WeakKeyDictionary()
+
+
+def _label_state(train_data, seasonality: int = 1) -> Dict[str, Any]:
+    """
+    Cached float64 labels of a Dataset and their naive-forecast MASE denominator.
+
+    Args:
+        train_data (lgb.Dataset): Dataset the metric is evaluated on
+        seasonality (int): Seasonal lag of the naive forecast
+
+    Returns:
+        Dict[str, Any]: 'y', and 'y_trimmed' and 'denominator' per seasonality
+    """
+    state = _label_cache.get(train_data)
+    if state is None:
+        state = {"y": np.asarray(train_data.get_label(), dtype=np.float64)}
+        _label_cache[train_data] = state
+
+    key = f"mase_{seasonality}"
+    if key not in state:
+        y = state["y"]
+        if len(y) <= seasonality:
+            state[key] = None
+        else:
+            y_trimmed = y[seasonality:]
+            denominator = np.mean(np.abs(y_trimmed - y[:-seasonality]))
+            state[key] = {"y_trimmed": y_trimmed, "denominator": denominator}
+    return state
+
 
 def smape_lgb_metric(preds, train_data):
     """
@@ -9,10 +43,19 @@ def smape_lgb_metric(preds, train_data):
     Returns:
         tuple: (metric_name, value, is_higher_better)
     """
-    y_true = train_data.get_label()
+    y_true = _label_state(train_data)["y"]
     return "sMAPE", smape(y_true, preds), False
 
 
+def _mase_value(preds, train_data, seasonality: int = 1) -> float:
+    """MASE of `preds`, same value as `mase` with the label terms cached."""
+    cached = _label_state(train_data, seasonality)[f"mase_{seasonality}"]
+    if cached is None or cached["denominator"] == 0:
+        return np.inf
+    numerator = np.mean(np.abs(cached["y_trimmed"] - preds[seasonality:]))
+    return numerator / cached["denominator"]
+
+
 def mase_lgb_metric(preds, train_data):
     """
     LightGBM-compatible MASE metric using naive seasonal forecast.
@@ -20,10 +63,67 @@ def mase_lgb_metric(preds, train_data):
     Returns:
         tuple: (metric_name, value, is_higher_better)
     """
-    y_true = train_data.get_label()
+    return "MASE", _mase_value(preds, train_data, seasonality=1), False
+
+
+def make_mase_feval(
+    every_k: int = 1,
+    seasonality: int = 1,
+    series: Optional[Dict[str, np.ndarray]] = None,
+) -> Callable:
+    """
+    MASE feval that is only computed on every `every_k`-th call per Dataset.
 
-    if len(y_true) <= 1:
-        return "MASE", np.inf, False
+    On the other iterations the last computed value is returned again, so
+    with early stopping the patience still counts iterations and the best
+    iteration is always one where the metric was computed.
 
-    # Trim the arrays to calculate lag-1 naive forecast
-    return "MASE", mase(y_true, preds, seasonality=1), False
+    Args:
+        every_k (int): Evaluation period in boosting iterations
+        seasonality (int): Seasonal lag of the naive forecast
+        series (Optional[Dict[str, np.ndarray]]): Series codes of the
+            validation rows and their training scales (see
+            series_metric_inputs); per-series MASE is computed when given
+
+    Returns:
+        Callable: LightGBM-compatible feval
+    """
+    if every_k <= 1 and seasonality == 1 and series is None:
+        return mase_lgb_metric
+
+    def value_of(preds, train_data):
+        if series is None:
+            return _mase_value(preds, train_data, seasonality)
+        y_true = _label_state(train_data)["y"]
+        return series_mase(y_true, preds, series["codes"], series["scale"])
+
+    # Calls so far and last value, per Dataset
+    counters = weakref.WeakKeyDictionary()
+
+    def feval(preds, train_data):
+        calls, value = counters.get(train_data, (0, None))
+        if calls % max(every_k, 1) == 0:
+            value = value_of(preds, train_data)
+        counters[train_data] = (calls + 1, value)
+        return "MASE", value, False
+
+    return feval
+
+
+def validation_feval(
+    series: Optional[Dict[str, np.ndarray]] = None, evaluator=None
+) -> Callable:
+    """
+    Validation metric minimised by early stopping and successive halving.
+
+    Args:
+        series (Optional[Dict[str, np.ndarray]]): Series codes and scales
+            for per-series MASE (see series_metric_inputs)
+        evaluator (Optional[WRMSSEEvaluator]): Used when LOSS_METRIC is 'WRMSSE'
+
+    Returns:
+        Callable: LightGBM-compatible feval
+    """
+    if LOSS_METRIC == "WRMSSE" and evaluator is not None:
+        return evaluator.feval
+    return make_mase_feval(EVAL_EVERY, series=series)
@@ -0,0 +1,286 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import weakref
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import lightgbm as lgb
+import pandas as pd
+
+from codes.models.matrix import matrix_dataset
+from codes.config import DATASET_CACHE_DIR, DATASET_CACHE_KEYS, USE_DATASET_CACHE
+
+logger = logging.getLogger(__name__)
+
+# Parameters fixed when a Dataset is binned; changing one needs a new Dataset
+BINNING_PARAMS = [
+    "max_bin",
+    "max_bin_by_feature",
+    "min_data_in_bin",
+    "bin_construct_sample_cnt",
+    "data_random_seed",
+    "use_missing",
+    "zero_as_missing",
+    "feature_pre_filter",
+    "linear_tree",
+    "enable_bundle",
+    "max_conflict_rate",
+    "is_enable_sparse",
+    "forcedbins_filename",
+]
+
+# Without pre-filtering, min_data_in_leaf can change between trials
+DEFAULT_DATASET_PARAMS = {"feature_pre_filter": False, "verbose": -1}
+
+# Files of a key: '<key>.json', '<key>_train.bin', '<key>_X_valid.npy', ...
+_KEY_FILE = re.compile(r"^([0-9a-f]{16})[._]")
+
+_fingerprints: Dict[int, Tuple[weakref.ref, str]] = {}
+_datasets: Dict[str, Tuple[lgb.Dataset, lgb.Dataset]] = {}
+
+
+def _object_hash(obj) -> str:
+    """Hash of a DataFrame or Series, remembered while the object is alive."""
+    cached = _fingerprints.get(id(obj))
+    if cached is not None and cached[0]() is obj:
+        return cached[1]
+
+    frame = obj.to_frame() if isinstance(obj, pd.Series) else obj
+    digest = hashlib.sha256()
+    for col, dtype in frame.dtypes.items():
+        digest.update(f"{col}:{dtype}".encode())
+        if isinstance(dtype, pd.CategoricalDtype):
+            digest.update(json.dumps(dtype.categories.astype(str).tolist()).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    _fingerprints[id(obj)] = (weakref.ref(obj), digest.hexdigest())
+    return _fingerprints[id(obj)][1]
+
+
+def frame_fingerprint(X: pd.DataFrame, y: Optional[pd.Series] = None) -> str:
+    """
+    Content hash of a feature matrix and its label.
+
+    The hash of each object is remembered while the object is alive, so
+    repeated calls with the same frames (e.g. one per trial) are free.
+
+    Args:
+        X (pd.DataFrame): Feature matrix
+        y (Optional[pd.Series]): Label
+
+    Returns:
+        str: Hex digest of the values, column names, dtypes and categories
+    """
+    parts = [_object_hash(X)] + ([_object_hash(y)] if y is not None else [])
+    return hashlib.sha256(":".join(parts).encode()).hexdigest()
+
+
+def dataset_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Subset of the training parameters that determines how a Dataset is binned.
+
+    With `feature_pre_filter` enabled, features are also dropped based on
+    `min_data_in_leaf`, which then becomes a binning parameter as well.
+
+    Args:
+        params (Dict[str, Any]): LightGBM training parameters
+
+    Returns:
+        Dict[str, Any]: Parameters to construct the Dataset with
+    """
+    selected = {**DEFAULT_DATASET_PARAMS}
+    selected.update({k: v for k, v in params.items() if k in BINNING_PARAMS})
+    if selected["feature_pre_filter"] and "min_data_in_leaf" in params:
+        selected["min_data_in_leaf"] = int(params["min_data_in_leaf"])
+    return selected
+
+
+def _load_binary(
+    path: Path, meta: Dict[str, Any], params: Dict[str, Any], reference=None
+) -> lgb.Dataset:
+    dataset = lgb.Dataset(str(path), params=params, reference=reference).construct()
+    # Not stored in the binary file; needed to predict on DataFrames
+    dataset.pandas_categorical = meta["pandas_categorical"]
+    return dataset
+
+
+def dataset_key(
+    X_train: pd.DataFrame,
+    y_train: pd.Series,
+    X_valid: pd.DataFrame,
+    y_valid: pd.Series,
+    params: Dict[str, Any],
+) -> str:
+    """Cache key of the Datasets built from these matrices and parameters."""
+    return hashlib.sha256(
+        json.dumps(
+            [
+                frame_fingerprint(X_train, y_train),
+                frame_fingerprint(X_valid, y_valid),
+                dataset_params(params),
+            ],
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()[:16]
+
+
+def dataset_files(key: str, cache_dir: Optional[Path] = None) -> Dict[str, Path]:
+    """Paths of the binary train/valid files and of the metadata of a key."""
+    cache_dir = cache_dir or DATASET_CACHE_DIR
+    return {
+        "train": cache_dir / f"{key}_train.bin",
+        "valid": cache_dir / f"{key}_valid.bin",
+        "meta": cache_dir / f"{key}.json",
+    }
+
+
+def load_cached_datasets(
+    key: str, params: Dict[str, Any], cache_dir: Optional[Path] = None
+) -> Optional[Tuple[lgb.Dataset, lgb.Dataset]]:
+    """
+    Train and validation Datasets saved under `key`, without the raw matrices.
+
+    Args:
+        key (str): Cache key (see dataset_key)
+        params (Dict[str, Any]): LightGBM training parameters
+        cache_dir (Optional[Path]): Directory of the binary Dataset files
+
+    Returns:
+        Optional[Tuple[lgb.Dataset, lgb.Dataset]]: The Datasets, or None if
+        they were not saved (completely)
+    """
+    files = dataset_files(key, cache_dir)
+    if not all(path.exists() for path in files.values()):
+        return None
+
+    logger.info(f"Loading binned Datasets {key} from {files['train'].parent}")
+    # Marks the key as recently used (see evict_datasets)
+    os.utime(files["meta"])
+    with open(files["meta"]) as f:
+        meta = json.load(f)
+    ds_params = dataset_params(params)
+    train = _load_binary(files["train"], meta, ds_params)
+    valid = _load_binary(files["valid"], meta, ds_params, reference=train)
+    return train, valid
+
+
+def get_datasets(
+    X_train: pd.DataFrame,
+    y_train: pd.Series,
+    X_valid: pd.DataFrame,
+    y_valid: pd.Series,
+    params: Dict[str, Any],
+    cache_dir: Optional[Path] = None,
+    use_cache: bool = USE_DATASET_CACHE,
+) -> Tuple[lgb.Dataset, lgb.Dataset]:
+    """
+    Constructed (binned) train and validation Datasets, built once per content.
+
+    Datasets are keyed by the hash of the matrices and of the binning
+    parameters. They are kept in memory for later calls in the same process
+    and saved as LightGBM binary files in `cache_dir` for later runs, so
+    hyperopt trials and the final fit share one binning pass. They are
+    built on the float32 matrices of the frames (see matrix).
+
+    Args:
+        X_train, y_train: training data
+        X_valid, y_valid: validation data
+        params (Dict[str, Any]): LightGBM training parameters
+        cache_dir (Optional[Path]): Directory of the binary Dataset files
+            (DATASET_CACHE_DIR if None)
+        use_cache (bool): Build fresh Datasets, without caching, when False
+
+    Returns:
+        Tuple[lgb.Dataset, lgb.Dataset]: Train and validation Datasets
+    """
+    ds_params = dataset_params(params)
+    if not use_cache:
+        train = matrix_dataset(X_train, y_train, ds_params)
+        valid = matrix_dataset(X_valid, y_valid, ds_params, reference=train)
+        return train, valid
+
+    key = dataset_key(X_train, y_train, X_valid, y_valid, params)
+    if key in _datasets:
+        return _datasets[key]
+
+    datasets = load_cached_datasets(key, params, cache_dir)
+    if datasets is None:
+        files = dataset_files(key, cache_dir)
+        logger.info(f"Binning Datasets {key} and saving them to {files['train'].parent}")
+        files["train"].parent.mkdir(parents=True, exist_ok=True)
+        train = matrix_dataset(X_train, y_train, ds_params).construct()
+        valid = matrix_dataset(
+            X_valid, y_valid, ds_params, reference=train
+        ).construct()
+        train.save_binary(str(files["train"]))
+        valid.save_binary(str(files["valid"]))
+        # Written last: marks the binary files as complete
+        with open(files["meta"], "w") as f:
+            json.dump({"pandas_categorical": train.pandas_categorical}, f)
+        datasets = (train, valid)
+        evict_datasets(cache_dir, keep=(key,))
+
+    _datasets[key] = datasets
+    return datasets
+
+
+def _key_files(cache_dir: Path) -> Dict[str, List[Path]]:
+    """Files of every cache key in `cache_dir`."""
+    files: Dict[str, List[Path]] = {}
+    if cache_dir.exists():
+        for path in cache_dir.iterdir():
+            match = _KEY_FILE.match(path.name)
+            if match:
+                files.setdefault(match.group(1), []).append(path)
+    return files
+
+
+def evict_datasets(
+    cache_dir: Optional[Path] = None,
+    max_keys: int = DATASET_CACHE_KEYS,
+    keep: Tuple[str, ...] = (),
+) -> List[str]:
+    """
+    Delete the files of all but the `max_keys` most recently used keys.
+
+    A key's files are its binary Datasets and metadata and the arrays the
+    parallel trials share next to them. Its last use is the latest
+    modification time of these files (loading a key touches its metadata).
+
+    Args:
+        cache_dir (Optional[Path]): Directory of the binary Dataset files
+            (DATASET_CACHE_DIR if None)
+        max_keys (int): Number of keys kept
+        keep (Tuple[str, ...]): Keys never deleted (e.g. the one in use)
+
+    Returns:
+        List[str]: Deleted keys
+    """
+    files = _key_files(cache_dir or DATASET_CACHE_DIR)
+    by_use = sorted(
+        files, key=lambda k: max(path.stat().st_mtime for path in files[k]), reverse=True
+    )
+    evicted = [k for k in by_use[max_keys:] if k not in keep]
+    for key in evicted:
+        for path in files[key]:
+            path.unlink(missing_ok=True)
+    if evicted:
+        logger.info(f"Removed {len(evicted)} least recently used binned Datasets")
+    return evicted
+
+
+def clear_dataset_cache(remove_files: bool = False, cache_dir: Optional[Path] = None) -> None:
+    """
+    Forget the Datasets kept in memory.
+
+    Args:
+        remove_files (bool): Also delete the files of all keys
+        cache_dir (Optional[Path]): Directory of the binary Dataset files
+            (DATASET_CACHE_DIR if None)
+    """
+    _datasets.clear()
+    _fingerprints.clear()
+    if remove_files:
+        evict_datasets(cache_dir, max_keys=0)
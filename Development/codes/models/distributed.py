@@ -0,0 +1,260 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import socket
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from codes.data_handling.category_schema import apply_category_schema
+from codes.data_handling.feature_store import read_feature_store
+from codes.metrics.error_metrics import regression_metrics, series_metric_inputs
+from codes.metrics.hierarchy import build_wrmsse_evaluator
+from codes.models.matrix import as_matrix, build_matrix, matrix_schema
+from codes.profiling import profile_stage
+from codes.tuning.parallel_trials import threads_per_trial
+from codes.config import (
+    DIST_DATA_DIR,
+    DIST_MACHINES,
+    DIST_TIMEOUT,
+    DIST_TREE_LEARNER,
+    END_DATE_TRAIN,
+    FEATURE_STORE_DIR,
+    START_DATE_TRAIN,
+    TARGET,
+    USE_WRMSSE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Learners whose machines each hold a share of the rows
+TREE_LEARNERS = ("data", "voting")
+JOB_FILE = "job.json"
+MODEL_FILE = "model.txt"
+
+
+def is_local(host: str) -> bool:
+    """Whether `host` (of a 'host:port' machine entry) is this machine."""
+    hostname = socket.gethostname()
+    return host in ("127.0.0.1", "localhost", hostname) or host == socket.gethostbyname(
+        hostname
+    )
+
+
+def partition_days(first_day: int, end_day: int, n_parts: int) -> List[List[int]]:
+    """
+    Spread the training days [first_day, end_day) over `n_parts` machines.
+
+    Machine r gets every `n_parts`-th day from day first_day + r. Contiguous
+    blocks of days would give each machine its own time range; LightGBM
+    finds the feature bins from one machine's sample and the voting learner
+    assumes all machines see the same distribution, so every machine needs
+    rows of the whole date range (and of all series).
+
+    Args:
+        first_day (int): First training day
+        end_day (int): First day after the training days
+        n_parts (int): Number of machines
+
+    Returns:
+        List[List[int]]: Days of every machine
+    """
+    return [list(range(first_day + rank, end_day, n_parts)) for rank in range(n_parts)]
+
+
+def run_worker(rank: int, data_dir: Path) -> None:
+    """
+    Train as machine `rank` of a distributed job written by train_distributed.
+
+    The machine reads its own days straight from the feature store (which
+    must be reachable at the same path on every machine), then trains the
+    same model as the others on them; LightGBM synchronises the histograms
+    (or the voted split candidates) over its socket network. Rank 0 saves
+    the model to the job directory.
+
+    Args:
+        rank (int): Position of this machine in the job's machine list
+        data_dir (Path): Job directory (shared by all the machines)
+    """
+    data_dir = Path(data_dir)
+    with open(data_dir / JOB_FILE) as f:
+        job = json.load(f)
+
+    machines = job["machines"]
+    params = {
+        **job["params"],
+        "machines": ",".join(machines),
+        "num_machines": len(machines),
+        "local_listen_port": int(machines[rank].rsplit(":", 1)[1]),
+        "pre_partition": True,
+    }
+    first_day, end_day = job["train_days"]
+    df = read_feature_store(
+        Path(job["feature_store"]),
+        columns=job["features"] + [TARGET],
+        start_day=first_day,
+        end_day=end_day,
+        days=job["days"][rank],
+    )
+    # Same category codes as the launcher's frames
+    df = apply_category_schema(df, job["categories"])
+    train_data = lgb.Dataset(
+        build_matrix(df, job["features"]),
+        label=df[TARGET].to_numpy(dtype=np.float32),
+        feature_name=job["features"],
+        categorical_feature=job["categorical"],
+        params=params,
+    )
+    del df
+    model = lgb.train(params, train_data, num_boost_round=job["num_boost_round"])
+    if rank == 0:
+        model.save_model(str(data_dir / MODEL_FILE))
+    logger.info(
+        f"Machine {rank} of {len(machines)} finished ({train_data.num_data()} rows)"
+    )
+
+
+def _wait(processes: Dict[int, multiprocessing.Process]) -> None:
+    """Wait for the local workers, stopping all of them if one fails."""
+    while any(p.is_alive() for p in processes.values()):
+        failed = [rank for rank, p in processes.items() if p.exitcode not in (None, 0)]
+        if failed:
+            for p in processes.values():
+                p.terminate()
+            raise RuntimeError(f"Distributed training failed on machines {failed}")
+        time.sleep(0.5)
+    failed = [rank for rank, p in processes.items() if p.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"Distributed training failed on machines {failed}")
+
+
+def train_distributed(
+    X_train: pd.DataFrame,
+    y_train: pd.Series,
+    X_valid: pd.DataFrame,
+    y_valid: pd.Series,
+    params: Dict,
+    num_boost_round: int = 500,
+    machines: List[str] = DIST_MACHINES,
+    tree_learner: str = DIST_TREE_LEARNER,
+    data_dir: Path = DIST_DATA_DIR,
+    time_out: int = DIST_TIMEOUT,
+    feature_store: Path = FEATURE_STORE_DIR,
+    train_days: Tuple[int, int] = (START_DATE_TRAIN, END_DATE_TRAIN),
+) -> Tuple[lgb.Booster, Dict[str, float], np.ndarray]:
+    """
+    Train a LightGBM model with its training rows spread over several machines.
+
+    Only the job settings are written to `data_dir`: the machines, the
+    parameters, the feature schema and the training days of every machine
+    (see partition_days). Each machine reads its rows from `feature_store`
+    itself, so the training rows are never copied; the job directory and
+    the feature store must be shared storage, mounted at the same paths on
+    every machine. The workers of the local entries of `machines`
+    ('host:port') are started here; each remote host runs
+    `python -m codes.models.distributed --rank <i> --data-dir <data_dir>`.
+    The first machine must be local.
+
+    Validation metrics are not synchronised between machines, so there is
+    no early stopping: the tuned 'best_iteration' (or `num_boost_round`)
+    rounds are trained, and the model is evaluated here as in
+    train_lightgbm_model.
+
+    Args:
+        X_train, y_train: training data (the rows of `train_days` in
+            `feature_store`; only used for the schema and the metrics)
+        X_valid, y_valid: validation data
+        params (Dict): LightGBM parameters (e.g. from run_hyperopt)
+        num_boost_round (int): Rounds without a tuned 'best_iteration'
+        machines (List[str]): 'host:port' of every machine
+        tree_learner (str): 'data' or 'voting' parallel learner
+        data_dir (Path): Job directory shared by the machines
+        time_out (int): Socket time-out in minutes
+        feature_store (Path): Feature store written by prepare_data
+        train_days (Tuple[int, int]): First and first-after training day
+
+    Returns:
+        Tuple: the model, its validation metrics and predictions
+    """
+    if tree_learner not in TREE_LEARNERS:
+        raise ValueError(f"Tree learner must be one of {TREE_LEARNERS}")
+    if not is_local(machines[0].rsplit(":", 1)[0]):
+        raise ValueError("The first machine must be this one")
+
+    local = [rank for rank, m in enumerate(machines) if is_local(m.rsplit(":", 1)[0])]
+    model_params = {
+        "objective": "regression",
+        "verbose": -1,
+        **{
+            k: int(v) if k in ["num_leaves", "min_data_in_leaf"] else v
+            for k, v in params.items()
+            if k != "best_iteration"
+        },
+        "tree_learner": tree_learner,
+        "time_out": time_out,
+        "num_threads": threads_per_trial(len(local)),
+    }
+    schema = matrix_schema(X_train)
+    days = partition_days(*train_days, len(machines))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    with open(data_dir / JOB_FILE, "w") as f:
+        json.dump(
+            {
+                "machines": machines,
+                "params": model_params,
+                "num_boost_round": int(params.get("best_iteration") or num_boost_round),
+                **schema,
+                "feature_store": str(Path(feature_store).resolve()),
+                "train_days": [int(day) for day in train_days],
+                "days": days,
+            },
+            f,
+            indent=2,
+        )
+    (data_dir / MODEL_FILE).unlink(missing_ok=True)
+    logger.info(
+        f"Distributed '{tree_learner}' training on {len(machines)} machines "
+        f"({len(local)} local), days per machine {[len(d) for d in days]}"
+    )
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = {
+        rank: ctx.Process(target=run_worker, args=(rank, data_dir)) for rank in local
+    }
+    with profile_stage("train"):
+        for p in processes.values():
+            p.start()
+        _wait(processes)
+
+    model = lgb.Booster(model_file=str(data_dir / MODEL_FILE))
+    model.pandas_categorical = [
+        schema["categories"][col] for col in schema["categorical"]
+    ]
+    with profile_stage("predict") as stage:
+        y_pred = stage.result = model.predict(as_matrix(X_valid))
+    metrics = {
+        **regression_metrics(
+            y_valid.to_numpy(), y_pred, series_metric_inputs(X_train, y_train, X_valid)
+        ),
+        "num_boost_round": model.current_iteration(),
+    }
+    evaluator = (
+        build_wrmsse_evaluator(X_train, y_train, X_valid, y_valid) if USE_WRMSSE else None
+    )
+    if evaluator is not None:
+        metrics["WRMSSE"] = evaluator(y_pred)
+    return model, metrics, y_pred
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker of a distributed LightGBM job")
+    parser.add_argument("--rank", type=int, required=True)
+    parser.add_argument("--data-dir", type=Path, default=DIST_DATA_DIR)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    run_worker(args.rank, args.data_dir)
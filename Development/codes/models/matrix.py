@@ -0,0 +1,142 @@
+import logging
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Matrices built for (or registered to) a frame, while the frame is alive
+_matrices: Dict[int, Tuple[weakref.ref, np.ndarray]] = {}
+
+
+def matrix_schema(X: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Column order and category codes of the matrix built from a frame.
+
+    Args:
+        X (pd.DataFrame): Feature frame
+
+    Returns:
+        Dict[str, Any]: 'features' (column order), 'categorical' (columns
+        holding category codes) and 'categories' (code -> value, per column)
+    """
+    categorical = [
+        col for col, dtype in X.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)
+    ]
+    return {
+        "features": [str(col) for col in X.columns],
+        "categorical": categorical,
+        "categories": {col: X[col].cat.categories.tolist() for col in categorical},
+    }
+
+
+def build_matrix(
+    df: pd.DataFrame, features: Optional[List[str]] = None
+) -> np.ndarray:
+    """
+    C-contiguous float32 matrix of the feature columns, categories as codes.
+
+    Columns are written one at a time into the preallocated matrix, so no
+    intermediate frame is materialised. Missing categories become NaN, as
+    in LightGBM's own DataFrame conversion; row slices of the result are
+    contiguous views LightGBM can read without copying.
+
+    Args:
+        df (pd.DataFrame): Frame holding the feature columns
+        features (Optional[List[str]]): Columns to include (all if None)
+
+    Returns:
+        np.ndarray: (n_rows, n_features) float32 matrix
+    """
+    features = list(df.columns) if features is None else features
+    matrix = np.empty((len(df), len(features)), dtype=np.float32)
+    for i, col in enumerate(features):
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()
+            matrix[:, i] = np.where(codes < 0, np.nan, codes)
+        else:
+            matrix[:, i] = values.to_numpy(dtype=np.float32, na_value=np.nan)
+    return matrix
+
+
+def register_matrix(X: pd.DataFrame, matrix: np.ndarray) -> None:
+    """Use `matrix` (e.g. a slice of a larger matrix) as the matrix of frame `X`."""
+    if matrix.shape != X.shape:
+        raise ValueError(f"Matrix shape {matrix.shape} does not match frame {X.shape}")
+    key = id(X)
+    # Dropped with the frame, so the matrix does not outlive it
+    _matrices[key] = (weakref.ref(X, lambda _: _matrices.pop(key, None)), matrix)
+
+
+def as_matrix(X) -> np.ndarray:
+    """
+    The float32 matrix of a feature frame, built once per frame.
+
+    Arrays (e.g. memory-mapped matrices) are returned as they are when
+    already float32 and C-contiguous.
+
+    Args:
+        X: Feature frame or array
+
+    Returns:
+        np.ndarray: C-contiguous float32 matrix
+    """
+    if not isinstance(X, pd.DataFrame):
+        return np.ascontiguousarray(X, dtype=np.float32)
+    cached = _matrices.get(id(X))
+    if cached is not None and cached[0]() is X:
+        return cached[1]
+    matrix = build_matrix(X)
+    register_matrix(X, matrix)
+    return matrix
+
+
+def matrix_dataset(
+    X,
+    y,
+    params: Dict[str, Any],
+    reference: Optional[lgb.Dataset] = None,
+) -> lgb.Dataset:
+    """
+    LightGBM Dataset on the float32 matrix of a frame.
+
+    Category code columns are declared as categorical features, and the
+    categories are kept as the Dataset's (and hence the Booster's)
+    `pandas_categorical`, so the model also predicts on DataFrames encoded
+    with the same categories.
+
+    Args:
+        X: Feature frame (or matrix, used as is)
+        y: Label
+        params (Dict[str, Any]): Dataset parameters
+        reference (Optional[lgb.Dataset]): Training Dataset of a validation set
+
+    Returns:
+        lgb.Dataset: The (not yet constructed) Dataset
+    """
+    label = np.asarray(y, dtype=np.float32)
+    if not isinstance(X, pd.DataFrame):
+        return lgb.Dataset(X, label=label, params=params, reference=reference)
+
+    schema = matrix_schema(X)
+    dataset = lgb.Dataset(
+        as_matrix(X),
+        label=label,
+        params=params,
+        reference=reference,
+        feature_name=schema["features"],
+        categorical_feature=schema["categorical"],
+    )
+    dataset.pandas_categorical = [
+        schema["categories"][col] for col in schema["categorical"]
+    ]
+    return dataset
+
+
+def clear_matrices() -> None:
+    """Forget the matrices built for frames."""
+    _matrices.clear()
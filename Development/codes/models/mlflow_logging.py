@@ -1,9 +1,56 @@
+import atexit
+import json
+import logging
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
 import mlflow
 import mlflow.lightgbm
-from typing import Dict
 import pandas as pd
+from mlflow.entities import Metric, Param
+from mlflow.exceptions import MlflowException
+from mlflow.tracking import MlflowClient
+
+from codes.models.sharded import BUNDLE_DIR, ShardedModel
+from codes.config import (
+    MLFLOW_MODEL_DIR,
+    PROCESSED_DATA_DIR,
+    CATEGORY_SCHEMA_FILE,
+    MLFLOW_ASYNC,
+    MLFLOW_EXPERIMENT_NAME,
+    MLFLOW_SPOOL_FILE,
+    MLFLOW_TRACKING_URI,
+)
+
+logger = logging.getLogger(__name__)
+
+# Limits of one MlflowClient.log_batch request
+MAX_BATCH_METRICS = 1000
+MAX_BATCH_PARAMS = 100
+# Seconds offline before sending is tried again
+RETRY_SECONDS = 30.0
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Whether a failed request may succeed later (server unreachable or busy).
 
-from codes.config import MLFLOW_MODEL_DIR, PROCESSED_DATA_DIR
+    Connection and time-out errors, and MLflow errors with a 5xx or 429
+    status (the REST client reports exhausted retries as 500), are
+    transient. Other MLflow errors, e.g. an invalid value or a param logged
+    again with a different value, are rejections that would fail again.
+    """
+    if isinstance(error, (OSError, TimeoutError)):
+        return True
+    if isinstance(error, MlflowException):
+        status = error.get_http_status_code()
+        return status >= 500 or status == 429
+    return False
 
 
 def log_model_and_metrics(
@@ -13,13 +60,17 @@ def log_model_and_metrics(
     predictions: pd.Series = None,
     reference_df: pd.DataFrame = None,
     model_path: str = MLFLOW_MODEL_DIR,
-):
+) -> str:
     """
     Logs metrics, parameters, model, and optionally predictions to MLflow.
+
+    Returns:
+        str: URI of the logged model (of the bundle for a ShardedModel)
     """
-    mlflow.log_params(params)
-    for name, value in metrics.items():
-        mlflow.log_metric(name, value)
+    tracker = get_mlflow_logger()
+    run = tracker.attach(mlflow.active_run().info.run_id)
+    tracker.log_params(run, params)
+    tracker.log_metrics(run, metrics)
 
     if reference_df is not None and predictions is not None:
         assert len(reference_df) == len(predictions), (
@@ -28,4 +79,316 @@ def log_model_and_metrics(
         reference_df["prediction"] = predictions
         reference_df.to_csv(PROCESSED_DATA_DIR / "reference_data.csv", index=False)
 
-    mlflow.lightgbm.log_model(model, artifact_path=model_path)
+    if isinstance(model, ShardedModel):
+        # All shard models in one artifact directory, loaded by the router
+        with tempfile.TemporaryDirectory() as bundle:
+            model.save(bundle)
+            mlflow.log_artifacts(bundle, artifact_path=BUNDLE_DIR)
+        model_uri = mlflow.get_artifact_uri(BUNDLE_DIR)
+    else:
+        model_uri = mlflow.lightgbm.log_model(model, artifact_path=model_path).model_uri
+    # Categories the model's categorical features were encoded with
+    if CATEGORY_SCHEMA_FILE.exists():
+        mlflow.log_artifact(str(CATEGORY_SCHEMA_FILE))
+    return model_uri
+
+
+class AsyncMlflowLogger:
+    """
+    Sends MLflow params and metrics in batches from a background thread.
+
+    Logging calls only put an operation on a queue. A background thread
+    drains the queue, merges the params/metrics of each run into as few
+    log_batch requests as possible, and creates and ends runs in order.
+    Runs are referred to by handles, so they can be started without
+    waiting for the server (see start_run).
+
+    When the tracking server is unreachable (see is_transient), the failed
+    operation and all later ones are appended to a local JSON-lines spool
+    file instead. The spool is replayed when a logger starts and when it is
+    closed, e.g. by the next run once the server is back, and while offline
+    every `retry_seconds` when there is something to send. Operations the
+    server rejects are logged and dropped, so they do not block the rest.
+    Logging errors are never raised to the caller.
+
+    Args:
+        tracking_uri (str): MLflow tracking URI
+        spool_file (Path): Spool file of the operations not sent
+        asynchronous (bool): Send from a background thread (inline if False)
+        client (Optional[MlflowClient]): Client to send with
+        retry_seconds (float): Time offline before sending is tried again
+    """
+
+    def __init__(
+        self,
+        tracking_uri: str = MLFLOW_TRACKING_URI,
+        spool_file: Path = MLFLOW_SPOOL_FILE,
+        asynchronous: bool = MLFLOW_ASYNC,
+        client: Optional[MlflowClient] = None,
+        retry_seconds: float = RETRY_SECONDS,
+    ):
+        self.client = client or MlflowClient(tracking_uri)
+        self.spool_file = Path(spool_file)
+        self.retry_seconds = retry_seconds
+        self.offline = False
+        self._retry_at = 0.0
+        self._run_ids: Dict[str, str] = {}
+        self._experiments: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        if asynchronous:
+            self._thread = threading.Thread(
+                target=self._worker, name="mlflow-logger", daemon=True
+            )
+            self._thread.start()
+        self._submit({"op": "sync"})
+
+    # Logging API (never blocks on the server when asynchronous)
+
+    def attach(self, run_id: str) -> str:
+        """Handle of an existing MLflow run."""
+        self._run_ids[run_id] = run_id
+        return run_id
+
+    def start_run(
+        self,
+        run_name: Optional[str] = None,
+        parent: Optional[str] = None,
+        experiment_name: str = MLFLOW_EXPERIMENT_NAME,
+        tags: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """
+        Start a run, nested under the run handle `parent` if given.
+
+        Returns:
+            str: Handle of the new run, usable right away
+        """
+        handle = uuid.uuid4().hex
+        self._submit({
+            "op": "create", "run": handle, "run_name": run_name, "parent": parent,
+            "experiment": experiment_name, "tags": tags or {},
+            "time": int(time.time() * 1000),
+        })
+        return handle
+
+    def log_params(self, run: str, params: Dict[str, Any]) -> None:
+        """Log parameters of a run handle."""
+        self._submit({
+            "op": "log", "run": run,
+            "params": {k: str(v) for k, v in params.items()},
+        })
+
+    def log_metrics(self, run: str, metrics: Dict[str, float], step: int = 0) -> None:
+        """Log metrics of a run handle."""
+        now = int(time.time() * 1000)
+        self._submit({
+            "op": "log", "run": run,
+            "metrics": [[k, float(v), now, step] for k, v in metrics.items()],
+        })
+
+    def end_run(self, run: str, status: str = "FINISHED") -> None:
+        """Mark a run handle as ended, after its pending params and metrics."""
+        self._submit({"op": "end", "run": run, "status": status,
+                      "time": int(time.time() * 1000)})
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything logged so far is sent or spooled."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 30) -> None:
+        """Flush, stop the thread and try to send the spooled operations."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # Still waiting on the server: leave it, keep the rest locally
+                logger.warning("MLflow logging still busy; spooling what is left")
+                items = []
+                while not self._queue.empty():
+                    items += self._next_ops()
+                self._spool([item for item in items if isinstance(item, dict)])
+                self._thread = None
+                return
+        self._thread = None
+        self.offline = False
+        self._process([{"op": "sync"}])
+
+    # Background processing
+
+    def _submit(self, op: Dict[str, Any]) -> None:
+        if self._thread is None:
+            self._process([op])
+        else:
+            self._queue.put(op)
+
+    def _next_ops(self) -> List:
+        """Queued items up to the next flush/stop marker (included)."""
+        items = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items
+            items.append(item)
+            if not isinstance(item, dict):
+                return items
+
+    def _worker(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            if isinstance(items[0], dict):
+                items += self._next_ops()
+            self._process([item for item in items if isinstance(item, dict)])
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is None for item in items):
+                return
+
+    def _process(self, ops: List[Dict[str, Any]]) -> None:
+        """Send `ops` in order, or spool them from the first transient failure on."""
+        with self._lock:
+            if self.offline and time.monotonic() >= self._retry_at:
+                # Try again, sending the spooled operations first
+                self.offline = False
+                ops = [{"op": "sync"}] + ops
+            ops = _batched(ops)
+            for i, op in enumerate(ops):
+                if self.offline:
+                    self._spool(ops[i:])
+                    return
+                self._try_send(op, f"spooling to {self.spool_file}")
+
+    def _try_send(self, op: Dict[str, Any], offline_note: str) -> None:
+        """Send one operation; go offline on a transient error, drop it otherwise."""
+        try:
+            self._send(op)
+            return
+        except Exception as e:
+            if not is_transient(e):
+                logger.error(f"MLflow rejected a '{op['op']}' operation ({e}); dropping it")
+                return
+            logger.warning(f"MLflow unreachable ({e}); {offline_note}")
+        self.offline = True
+        self._retry_at = time.monotonic() + self.retry_seconds
+        if op["op"] != "sync":
+            self._spool([op])
+
+    def _send(self, op: Dict[str, Any]) -> None:
+        if op["op"] == "sync":
+            self._sync()
+        elif op["op"] == "create":
+            tags = dict(op["tags"])
+            if op["run_name"]:
+                tags["mlflow.runName"] = op["run_name"]
+            if op["parent"]:
+                tags["mlflow.parentRunId"] = self._run_ids.get(
+                    op["parent"], op.get("parent_run_id")
+                )
+            run = self.client.create_run(
+                self._experiment_id(op["experiment"]),
+                start_time=op["time"],
+                tags=tags,
+                run_name=op["run_name"],
+            )
+            self._run_ids[op["run"]] = run.info.run_id
+        elif op["op"] == "log":
+            run_id = self._run_ids.get(op["run"], op.get("run_id", op["run"]))
+            params = [Param(k, v) for k, v in op.get("params", {}).items()]
+            metrics = [Metric(*m) for m in op.get("metrics", [])]
+            n_requests = max(
+                -(-len(params) // MAX_BATCH_PARAMS),
+                -(-len(metrics) // MAX_BATCH_METRICS),
+            )
+            for i in range(n_requests):
+                self.client.log_batch(
+                    run_id,
+                    metrics=metrics[i * MAX_BATCH_METRICS:(i + 1) * MAX_BATCH_METRICS],
+                    params=params[i * MAX_BATCH_PARAMS:(i + 1) * MAX_BATCH_PARAMS],
+                )
+        elif op["op"] == "end":
+            run_id = self._run_ids.get(op["run"], op.get("run_id", op["run"]))
+            self.client.set_terminated(run_id, op["status"], end_time=op["time"])
+
+    def _experiment_id(self, name: str) -> str:
+        if name not in self._experiments:
+            experiment = self.client.get_experiment_by_name(name)
+            self._experiments[name] = (
+                experiment.experiment_id if experiment is not None
+                else self.client.create_experiment(name)
+            )
+        return self._experiments[name]
+
+    # Local spool
+
+    def _spool(self, ops: List[Dict[str, Any]]) -> None:
+        """Append operations to the spool file, with the run ids known so far."""
+        ops = [op for op in ops if op["op"] != "sync"]
+        if not ops:
+            return
+        self.spool_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.spool_file, "a") as f:
+            for op in ops:
+                if op.get("run") in self._run_ids:
+                    op = {**op, "run_id": self._run_ids[op["run"]]}
+                if op.get("parent") in self._run_ids:
+                    op = {**op, "parent_run_id": self._run_ids[op["parent"]]}
+                f.write(json.dumps(op) + "\n")
+
+    def _sync(self) -> None:
+        """Replay the spool file; operations that fail stay spooled."""
+        if not self.spool_file.exists():
+            return
+        with open(self.spool_file) as f:
+            ops = [json.loads(line) for line in f if line.strip()]
+        self.spool_file.unlink()
+        logger.info(f"Sending {len(ops)} spooled MLflow operations")
+        for op in ops:
+            if "run_id" in op:
+                self._run_ids.setdefault(op["run"], op["run_id"])
+        for i, op in enumerate(ops):
+            if self.offline:
+                self._spool(ops[i:])
+                return
+            self._try_send(op, "keeping the spool")
+
+
+def _batched(ops: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Operations with the params/metrics logged to each run merged into one.
+
+    A run's merged log is sent before the run is ended, otherwise after
+    all other operations (so after the run is created).
+    """
+    batched, logs = [], {}
+    for op in ops:
+        if op["op"] != "log":
+            if op["op"] == "end" and op["run"] in logs:
+                batched.append(logs.pop(op["run"]))
+            batched.append(op)
+            continue
+        merged = logs.setdefault(
+            op["run"], {"op": "log", "run": op["run"], "params": {}, "metrics": []}
+        )
+        if "run_id" in op:
+            merged["run_id"] = op["run_id"]
+        merged["params"].update(op.get("params", {}))
+        merged["metrics"].extend(op.get("metrics", []))
+    return batched + list(logs.values())
+
+
+_mlflow_logger: Optional[AsyncMlflowLogger] = None
+
+
+def get_mlflow_logger() -> AsyncMlflowLogger:
+    """Process-wide AsyncMlflowLogger, flushed and closed at exit."""
+    global _mlflow_logger
+    if _mlflow_logger is None:
+        _mlflow_logger = AsyncMlflowLogger()
+        atexit.register(_mlflow_logger.close)
+    return _mlflow_logger
@@ -0,0 +1,190 @@
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from codes.metrics.error_metrics import regression_metrics, series_metric_inputs
+from codes.metrics.hierarchy import build_wrmsse_evaluator
+from codes.models.train import train_lightgbm_model
+from codes.tuning.parallel_trials import threads_per_trial
+from codes.config import SHARD_KEY, SHARD_WORKERS, USE_WRMSSE
+
+logger = logging.getLogger(__name__)
+
+# Artifact directory of the model bundle in the MLflow run
+BUNDLE_DIR = "sharded_model"
+MANIFEST_FILE = "shards.json"
+
+
+def shard_rows(X: pd.DataFrame, key: str = SHARD_KEY) -> Dict[str, np.ndarray]:
+    """
+    Row positions of every shard (value of the `key` column) of a frame.
+
+    Args:
+        X (pd.DataFrame): Frame holding the `key` column
+        key (str): Column to shard by
+
+    Returns:
+        Dict[str, np.ndarray]: Sorted row positions, by shard value
+    """
+    if key not in X.columns:
+        raise ValueError(f"Unknown shard key '{key}'")
+    groups = X.groupby(key, observed=True, sort=True).indices
+    return {str(value): rows for value, rows in groups.items()}
+
+
+class ShardedModel:
+    """
+    One LightGBM model per shard, routing every row to the model of its shard.
+
+    Rows of shards without a model are predicted as NaN.
+
+    Args:
+        key (str): Column the rows are sharded by (a feature column)
+        models (Dict[str, lgb.Booster]): Model of every shard value
+    """
+
+    def __init__(self, key: str, models: Dict[str, lgb.Booster]):
+        self.key = key
+        self.models = models
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        """Predictions of the shard models, in the row order of `X`."""
+        predictions = np.full(len(X), np.nan)
+        for value, rows in shard_rows(X, self.key).items():
+            if value in self.models:
+                predictions[rows] = self.models[value].predict(X.iloc[rows])
+        missing = np.isnan(predictions).sum()
+        if missing:
+            logger.warning(f"{missing} rows have no shard model; predicted as NaN")
+        return predictions
+
+    def save(self, directory: Path) -> None:
+        """Write every model as a text file, with a manifest of the shards."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        files = {}
+        for i, (value, model) in enumerate(sorted(self.models.items())):
+            files[value] = f"shard_{i}.txt"
+            model.save_model(str(directory / files[value]))
+        with open(directory / MANIFEST_FILE, "w") as f:
+            json.dump({"key": self.key, "shards": files}, f, indent=2)
+
+    @classmethod
+    def load(cls, directory: Path) -> "ShardedModel":
+        """Model bundle written by `save`."""
+        directory = Path(directory)
+        with open(directory / MANIFEST_FILE) as f:
+            manifest = json.load(f)
+        models = {
+            value: lgb.Booster(model_file=str(directory / name))
+            for value, name in manifest["shards"].items()
+        }
+        return cls(manifest["key"], models)
+
+
+def _train_shard(
+    value: str,
+    X_train: pd.DataFrame,
+    y_train: pd.Series,
+    X_valid: pd.DataFrame,
+    y_valid: pd.Series,
+    params: Dict,
+    cache_dir: Optional[Path] = None,
+) -> Tuple[str, lgb.Booster, Dict[str, float], np.ndarray]:
+    """Train the model of one shard (in a worker process)."""
+    model, metrics, predictions = train_lightgbm_model(
+        X_train, y_train, X_valid, y_valid, params, cache_dir=cache_dir
+    )
+    logger.info(f"Trained shard {value} on {len(X_train)} rows")
+    return value, model, metrics, predictions
+
+
+def train_sharded_models(
+    X_train: pd.DataFrame,
+    y_train: pd.Series,
+    X_valid: pd.DataFrame,
+    y_valid: pd.Series,
+    params: Dict,
+    key: str = SHARD_KEY,
+    max_workers: Optional[int] = SHARD_WORKERS,
+    cache_dir: Optional[Path] = None,
+) -> Tuple[ShardedModel, Dict[str, float], np.ndarray]:
+    """
+    Train one model per shard of the training rows in worker processes.
+
+    Each worker trains one shard with an equal share of the cores as
+    LightGBM `num_threads` and is replaced afterwards, so its memory is
+    released. The tuned 'best_iteration' is not reused: every shard stops
+    early on its own validation rows. The metrics of the reassembled
+    validation predictions are computed as for a global model, and the
+    metrics of every shard are added as '<metric>/<shard>'.
+
+    Args:
+        X_train, y_train: training data, with the `key` column
+        X_valid, y_valid: validation data
+        params (Dict): LightGBM parameters (e.g. from run_hyperopt)
+        key (str): Column to shard by
+        max_workers (Optional[int]): Number of worker processes (CPU count if None)
+        cache_dir (Optional[Path]): Directory of the binned Datasets of the shards
+
+    Returns:
+        Tuple: the ShardedModel, its metrics and the validation predictions
+        (in the row order of X_valid)
+    """
+    train_rows = shard_rows(X_train, key)
+    valid_rows = shard_rows(X_valid, key)
+    n_workers = min(max_workers or len(train_rows), len(train_rows))
+    shard_params = {
+        **{k: v for k, v in params.items() if k != "best_iteration"},
+        "num_threads": threads_per_trial(n_workers),
+    }
+    logger.info(
+        f"Training {len(train_rows)} shards by '{key}', {n_workers} at a time"
+    )
+
+    models, metrics = {}, {}
+    predictions = np.full(len(X_valid), np.nan)
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=1,
+    ) as executor:
+        futures = [
+            executor.submit(
+                _train_shard,
+                value,
+                X_train.iloc[rows],
+                y_train.iloc[rows],
+                X_valid.iloc[valid_rows.get(value, [])],
+                y_valid.iloc[valid_rows.get(value, [])],
+                shard_params,
+                cache_dir,
+            )
+            for value, rows in train_rows.items()
+        ]
+        for future in futures:
+            value, model, shard_metrics, shard_predictions = future.result()
+            models[value] = model
+            predictions[valid_rows.get(value, [])] = shard_predictions
+            metrics.update({f"{k}/{value}": v for k, v in shard_metrics.items()})
+
+    metrics.update(
+        regression_metrics(
+            y_valid.to_numpy(),
+            predictions,
+            series_metric_inputs(X_train, y_train, X_valid),
+        )
+    )
+    evaluator = (
+        build_wrmsse_evaluator(X_train, y_train, X_valid, y_valid) if USE_WRMSSE else None
+    )
+    if evaluator is not None:
+        metrics["WRMSSE"] = evaluator(predictions)
+    return ShardedModel(key, models), metrics, predictions
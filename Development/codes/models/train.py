@@ -1,9 +1,15 @@
 import lightgbm as lgb
 import pandas as pd
-from sklearn.metrics import root_mean_squared_error
-from typing import Dict, Tuple
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 
-from codes.metrics.lgb_metrics import smape, mase, mase_lgb_metric
+from codes.metrics.error_metrics import regression_metrics, series_metric_inputs
+from codes.metrics.hierarchy import WRMSSEEvaluator, build_wrmsse_evaluator
+from codes.metrics.lgb_metrics import validation_feval
+from codes.models.dataset_cache import get_datasets
+from codes.models.matrix import as_matrix
+from codes.profiling import profile_stage
+from codes.config import EARLY_STOPPING_ROUNDS, USE_DATASET_CACHE, USE_WRMSSE
 
 
 def train_lightgbm_model(
@@ -13,13 +19,29 @@ def train_lightgbm_model(
     y_valid: pd.Series,
     params: Dict,
     num_boost_round: int = 500,
+    early_stopping_rounds: Optional[int] = EARLY_STOPPING_ROUNDS,
+    evaluator: Optional[WRMSSEEvaluator] = None,
+    cache_dir: Optional[Path] = None,
+    init_model: Optional[lgb.Booster] = None,
 ) -> Tuple[lgb.Booster, Dict[str, float]]:
     """
     Train a LightGBM model and return evaluation metrics and the model.
 
+    If `params` holds the 'best_iteration' found while tuning, exactly that
+    many rounds are trained; otherwise up to `num_boost_round` rounds with
+    early stopping on the validation LOSS_METRIC. When the frames carry the
+    store/item ids, MASE is computed per series and RMSSE is added, and
+    with USE_WRMSSE (or a given `evaluator`) the hierarchical WRMSSE too.
+    The binned Datasets are cached in `cache_dir` (see get_datasets).
+
+    With `init_model`, boosting continues from that model: its predictions
+    are the initial scores of the new rounds, and the returned model holds
+    its trees followed by the new ones. The Datasets are then built fresh,
+    as the initial scores need the raw matrices.
+
     Returns:
         model: trained lgb.Booster
-        metrics: Dict with RMSE, sMAPE, MASE
+        metrics: Dict with RMSE, sMAPE, MASE (and RMSSE, WRMSSE)
     """
     model_params = {
         "objective": "regression",
@@ -28,25 +50,42 @@ def train_lightgbm_model(
         **{
             k: int(v) if k in ["num_leaves", "min_data_in_leaf"] else v
             for k, v in params.items()
+            if k != "best_iteration"
         },
     }
 
-    train_data = lgb.Dataset(X_train, label=y_train)
-    valid_data = lgb.Dataset(X_valid, label=y_valid)
+    callbacks = []
+    if params.get("best_iteration"):
+        num_boost_round = int(params["best_iteration"])
+    elif early_stopping_rounds:
+        callbacks.append(lgb.early_stopping(early_stopping_rounds, verbose=False))
 
-    model = lgb.train(
-        model_params,
-        train_data,
-        valid_sets=[valid_data],
-        feval=mase_lgb_metric,
-        num_boost_round=num_boost_round,
+    series = series_metric_inputs(X_train, y_train, X_valid)
+    if evaluator is None and USE_WRMSSE:
+        evaluator = build_wrmsse_evaluator(X_train, y_train, X_valid, y_valid)
+    train_data, valid_data = get_datasets(
+        X_train, y_train, X_valid, y_valid, model_params, cache_dir,
+        use_cache=USE_DATASET_CACHE and init_model is None,
     )
 
-    y_pred = model.predict(X_valid)
+    with profile_stage("train"):
+        model = lgb.train(
+            model_params,
+            train_data,
+            valid_sets=[valid_data],
+            feval=validation_feval(series, evaluator),
+            num_boost_round=num_boost_round,
+            callbacks=callbacks,
+            init_model=init_model,
+        )
+
+    with profile_stage("predict") as stage:
+        y_pred = stage.result = model.predict(as_matrix(X_valid))
     metrics = {
-        "rmse": root_mean_squared_error(y_valid, y_pred),
-        "sMAPE": smape(y_valid.values, y_pred),
-        "MASE": mase(y_valid.values, y_pred),
+        **regression_metrics(y_valid.to_numpy(), y_pred, series),
+        "num_boost_round": model.best_iteration or model.current_iteration(),
     }
+    if evaluator is not None:
+        metrics["WRMSSE"] = evaluator(y_pred)
 
     return model, metrics, y_pred
@@ -0,0 +1,137 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from codes.data_handling.data_loader import (
+    build_data_cache,
+    load_sales_ids,
+    load_sales_data,
+    load_calendar_data,
+    load_sell_prices,
+)
+from codes.data_handling.feature_store import write_partition, save_window_state
+from codes.feature_engineering import build_features, window_history_days
+from codes.config import (
+    RAW_DATA_DIR,
+    USE_DATA_CACHE,
+    START_DATE_TRAIN,
+    PARTITION_KEY,
+    FEATURE_STORE_DIR,
+    MAX_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def partition_values(
+    partition_key: str = PARTITION_KEY, raw_data_dir: Path = RAW_DATA_DIR
+) -> List[str]:
+    """
+    Distinct values of the partition key in the sales data.
+
+    Args:
+        partition_key (str): Id column to partition by (e.g. 'store_id').
+        raw_data_dir (Path): Path to the raw data directory.
+
+    Returns:
+        List[str]: Sorted partition values.
+    """
+    ids = load_sales_ids(raw_data_dir)
+    if partition_key not in ids.columns:
+        raise ValueError(f"Unknown partition key '{partition_key}'")
+    return sorted(ids[partition_key].dropna().unique().tolist())
+
+
+def prepare_partition(
+    value: str,
+    partition_key: str = PARTITION_KEY,
+    output_dir: Path = FEATURE_STORE_DIR,
+    raw_data_dir: Path = RAW_DATA_DIR,
+    start_date_train: int = START_DATE_TRAIN,
+    schema: Optional[Dict[str, List[str]]] = None,
+) -> int:
+    """
+    Run the load -> melt -> merge -> feature pipeline for one partition.
+
+    Every series belongs to exactly one partition, so the lag and rolling
+    features are the same as when the whole dataset is processed at once.
+
+    Args:
+        value (str): Partition value to process (e.g. 'CA_1').
+        partition_key (str): Id column to partition by.
+        output_dir (Path): Feature store the partition is written to.
+        raw_data_dir (Path): Path to the raw data directory.
+        start_date_train (int): First day (d_*) to keep for training.
+        schema (Optional[Dict[str, List[str]]]): Categories of the id columns,
+            shared by all partitions so their codes agree.
+
+    Returns:
+        int: Number of feature rows written.
+    """
+    filters = [(partition_key, "==", value)]
+    sales = load_sales_data(raw_data_dir, start_date_train, filters=filters)
+    calendar = load_calendar_data(raw_data_dir)
+    price_filters = filters if partition_key in ("store_id", "item_id") else None
+    prices = load_sell_prices(raw_data_dir, filters=price_filters)
+
+    df = build_features(sales, calendar, prices, schema)
+
+    write_partition(df, output_dir)
+    save_window_state(sales, window_history_days(), output_dir, name=str(value))
+    logger.info(f"Wrote partition {partition_key}={value} with {len(df)} rows")
+    return len(df)
+
+
+def prepare_partitions(
+    partition_key: str = PARTITION_KEY,
+    output_dir: Path = FEATURE_STORE_DIR,
+    max_workers: Optional[int] = MAX_WORKERS,
+    raw_data_dir: Path = RAW_DATA_DIR,
+    start_date_train: int = START_DATE_TRAIN,
+    schema: Optional[Dict[str, List[str]]] = None,
+) -> List[str]:
+    """
+    Build the features of every partition in a pool of worker processes.
+
+    At most `max_workers` partitions are held in memory at any time, and each
+    worker process is replaced after one partition so its memory is released.
+
+    Args:
+        partition_key (str): Id column to partition by.
+        output_dir (Path): Feature store the partitions are written to.
+        max_workers (Optional[int]): Number of worker processes (CPU count if None).
+        raw_data_dir (Path): Path to the raw data directory.
+        start_date_train (int): First day (d_*) to keep for training.
+        schema (Optional[Dict[str, List[str]]]): Categories of the id columns.
+
+    Returns:
+        List[str]: Processed partition values.
+    """
+    if USE_DATA_CACHE:
+        # Build the cache once, before the workers read it concurrently
+        build_data_cache(raw_data_dir)
+    values = partition_values(partition_key, raw_data_dir)
+    logger.info(f"Preparing {len(values)} partitions by '{partition_key}'")
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=1,
+    ) as executor:
+        futures = [
+            executor.submit(
+                prepare_partition,
+                value,
+                partition_key,
+                output_dir,
+                raw_data_dir,
+                start_date_train,
+                schema,
+            )
+            for value in values
+        ]
+        for future in futures:
+            future.result()
+    return values
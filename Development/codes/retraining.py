@@ -0,0 +1,190 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from codes.data_handling.category_schema import apply_category_schema, load_category_schema
+from codes.data_handling.data_splitter import day_slices, sort_by_day
+from codes.data_handling.feature_store import read_feature_store, read_manifest
+from codes.models.matrix import build_matrix, register_matrix
+from codes.config import (
+    CATEGORICAL_FEATURES,
+    DRIFT_DB_CONFIG,
+    DRIFT_METRICS,
+    DRIFT_TABLE,
+    DRIFT_THRESHOLD,
+    DRIFT_WINDOW_DAYS,
+    FEATURE_STORE_DIR,
+    NUMERICAL_FEATURES,
+    PRODUCTION_MODEL_FILE,
+    RETRAIN_VALID_DAYS,
+    TARGET,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def save_production_model(
+    model_uri: str,
+    params: Dict[str, Any],
+    train_end: int,
+    run_id: Optional[str] = None,
+    path: Path = PRODUCTION_MODEL_FILE,
+) -> Dict[str, Any]:
+    """
+    Record the model later incremental retrains continue from.
+
+    Args:
+        model_uri (str): MLflow URI of the LightGBM model
+        params (Dict[str, Any]): Tuned parameters it was trained with
+        train_end (int): First day the model was not trained on
+        run_id (Optional[str]): MLflow run of the model
+        path (Path): State file
+
+    Returns:
+        Dict[str, Any]: The state written to `path`
+    """
+    state = {
+        "model_uri": model_uri,
+        "run_id": run_id,
+        "params": {k: v for k, v in params.items() if k != "best_iteration"},
+        "train_end": int(train_end),
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(state, f, indent=2)
+    logger.info(f"Production model {model_uri} trained up to day {train_end}")
+    return state
+
+
+def load_production_model(path: Path = PRODUCTION_MODEL_FILE) -> Optional[Dict[str, Any]]:
+    """State saved by save_production_model, or None if no model was recorded."""
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_drift_metrics(
+    since_day: Optional[int] = None,
+    metrics: List[str] = DRIFT_METRICS,
+    window_days: int = DRIFT_WINDOW_DAYS,
+    db_config: Dict[str, Any] = DRIFT_DB_CONFIG,
+    table: str = DRIFT_TABLE,
+) -> pd.DataFrame:
+    """
+    Drift scores of the most recent days written by the monitoring flow.
+
+    Args:
+        since_day (Optional[int]): First day to consider, e.g. the first
+            day the current model was not trained on (all days if None)
+        metrics (List[str]): Columns of the monitoring table to read
+        window_days (int): Number of most recent days
+        db_config (Dict[str, Any]): Connection settings of the Postgres database
+        table (str): Monitoring table
+
+    Returns:
+        pd.DataFrame: 'day_idx' and the `metrics` columns, oldest day first
+    """
+    # Only needed by the retraining flow
+    import psycopg
+    from psycopg import sql
+
+    query = sql.SQL(
+        "SELECT day_idx, {} FROM {} WHERE day_idx >= %s ORDER BY day_idx DESC LIMIT %s"
+    ).format(sql.SQL(", ").join(map(sql.Identifier, metrics)), sql.Identifier(table))
+    with psycopg.connect(**db_config) as conn:
+        rows = conn.execute(query, (since_day or 0, window_days)).fetchall()
+    return pd.DataFrame(rows, columns=["day_idx"] + list(metrics)).iloc[::-1]
+
+
+def drift_detected(
+    drift: pd.DataFrame,
+    threshold: float = DRIFT_THRESHOLD,
+    metrics: List[str] = DRIFT_METRICS,
+) -> bool:
+    """
+    Whether a drift score exceeds `threshold` on one of the given days.
+
+    For the per-day batches of the monitoring flow, Evidently scores the
+    drift of a column as its normed Wasserstein distance to the reference
+    data, so higher scores mean more drift.
+
+    Args:
+        drift (pd.DataFrame): Drift scores per day (see read_drift_metrics)
+        threshold (float): Largest score that does not call for a retrain
+        metrics (List[str]): Columns compared to the threshold
+
+    Returns:
+        bool: True if the model should be retrained
+    """
+    if drift.empty:
+        logger.warning("No drift metrics recorded; not retraining")
+        return False
+    worst = drift[metrics].max()
+    logger.info(f"Largest drift scores of days {drift['day_idx'].tolist()}: {worst.to_dict()}")
+    return bool((worst > threshold).any())
+
+
+def count_new_days(train_end: int, feature_store: Path = FEATURE_STORE_DIR) -> int:
+    """Number of days in the feature store from `train_end` on."""
+    manifest = read_manifest(feature_store)
+    if manifest is None:
+        raise FileNotFoundError(f"No feature store in {feature_store}")
+    return max(0, manifest["last_day"] + 1 - train_end)
+
+
+def new_days_split(
+    train_end: int,
+    feature_store: Path = FEATURE_STORE_DIR,
+    valid_days: int = RETRAIN_VALID_DAYS,
+    schema: Optional[Dict[str, List[str]]] = None,
+) -> Tuple[pd.DataFrame, pd.Series, pd.DataFrame, pd.Series, int]:
+    """
+    Train/validation split of the days stored since a model was trained.
+
+    Only the days from `train_end` are read; the newest `valid_days` of
+    them are held out. As in split_data, both frames are row slices of one
+    float32 matrix.
+
+    Args:
+        train_end (int): First day the current model was not trained on
+        feature_store (Path): Feature store written by prepare_data
+        valid_days (int): Number of newest days held out
+        schema (Optional[Dict[str, List[str]]]): Categories of the id
+            columns (the saved category schema if None)
+
+    Returns:
+        Tuple: X_train, y_train, X_valid, y_valid and the first validation
+        day (the first day the retrained model is not trained on)
+    """
+    end = train_end + count_new_days(train_end, feature_store)
+    valid_start = end - valid_days
+    if valid_start <= train_end:
+        raise ValueError(
+            f"{end - train_end} new days since day {train_end}; "
+            f"more than {valid_days} are needed"
+        )
+
+    features = CATEGORICAL_FEATURES + NUMERICAL_FEATURES
+    df = read_feature_store(
+        feature_store, columns=features + [TARGET, "d_idx"], start_day=train_end
+    )
+    df = sort_by_day(df)
+    df = apply_category_schema(df, schema or load_category_schema())
+
+    train_rows, valid_rows = day_slices(df["d_idx"].to_numpy(), [train_end, valid_start, end])
+    X_train, y_train = df[features].iloc[train_rows], df[TARGET].iloc[train_rows]
+    X_valid, y_valid = df[features].iloc[valid_rows], df[TARGET].iloc[valid_rows]
+
+    matrix = build_matrix(df, features)
+    register_matrix(X_train, matrix[train_rows])
+    register_matrix(X_valid, matrix[valid_rows])
+
+    logger.info(
+        f"New days [{train_end}, {valid_start}) for training, "
+        f"[{valid_start}, {end}) for validation"
+    )
+    return X_train, y_train, X_valid, y_valid, valid_start
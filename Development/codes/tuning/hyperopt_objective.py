@@ -1,49 +1,128 @@
 import lightgbm as lgb
-from sklearn.metrics import root_mean_squared_error
-from typing import Dict, Any
+import numpy as np
+from hyperopt.pyll import stochastic
+from typing import Dict, Any, Optional
 
-from codes.metrics.error_metrics import smape, mase
-from codes.metrics.lgb_metrics import mase_lgb_metric
+from codes.metrics.error_metrics import regression_metrics, series_metric_inputs
+from codes.metrics.lgb_metrics import validation_feval
+from codes.models.dataset_cache import get_datasets
+from codes.models.matrix import as_matrix
+from codes.config import EARLY_STOPPING_ROUNDS, LOSS_METRIC
 
 
-def objective(
-    params: Dict[str, Any], X_train, y_train, X_valid, y_valid
-) -> Dict[str, Any]:
-    """
-    Objective function for Hyperopt tuning using MASE as loss.
-    """
-    # Cast hyperparams
+def model_params_from(params: Dict[str, Any]) -> Dict[str, Any]:
+    """LightGBM parameters of a hyperopt sample (integer params cast)."""
+    params = dict(params)
     params["num_leaves"] = int(params["num_leaves"])
     params["min_data_in_leaf"] = int(params["min_data_in_leaf"])
 
-    model_params = {
+    return {
         "objective": "regression",
         "metric": "None",
         "verbose": -1,
         **params,
     }
 
-    train_data = lgb.Dataset(X_train, label=y_train)
-    valid_data = lgb.Dataset(X_valid, label=y_valid)
+
+def sample_params(
+    space: Dict[str, Any], rng: Optional[np.random.Generator] = None
+) -> Dict[str, Any]:
+    """LightGBM parameters of a random point of the search space."""
+    rng = rng or np.random.default_rng(0)
+    return model_params_from(stochastic.sample(space, rng=rng))
+
+
+def evaluate_params(
+    params: Dict[str, Any],
+    train_data: lgb.Dataset,
+    valid_data: lgb.Dataset,
+    X_valid,
+    y_valid: np.ndarray,
+    num_threads: Optional[int] = None,
+    num_boost_round: int = 200,
+    early_stopping_rounds: Optional[int] = EARLY_STOPPING_ROUNDS,
+    series: Optional[Dict[str, np.ndarray]] = None,
+    evaluator=None,
+) -> Dict[str, Any]:
+    """
+    Train on constructed Datasets and score the validation predictions.
+
+    With early stopping, training ends once the validation MASE has not
+    improved for `early_stopping_rounds` rounds, and the predictions use the
+    best iteration. With `series`, MASE (the loss) and RMSSE are computed
+    per series against each series' own naive forecast. With `evaluator`,
+    WRMSSE is added, and is the loss if LOSS_METRIC is 'WRMSSE'.
+
+    Args:
+        params (Dict[str, Any]): Hyperopt sample
+        train_data, valid_data: Train and validation Datasets
+        X_valid: Validation features (DataFrame or array) to predict on
+        y_valid (np.ndarray): Validation target
+        num_threads (Optional[int]): LightGBM threads (all cores if None)
+        num_boost_round (int): Maximum number of boosting rounds
+        early_stopping_rounds (Optional[int]): Patience in rounds (off if None)
+        series (Optional[Dict[str, np.ndarray]]): Validation series codes and
+            training scales (see series_metric_inputs); flat MASE if None
+        evaluator (Optional[WRMSSEEvaluator]): WRMSSE of the validation rows
+
+    Returns:
+        Dict[str, Any]: loss, status, metrics, best_iteration and the LightGBM params
+    """
+    model_params = model_params_from(params)
+    if num_threads is not None:
+        model_params["num_threads"] = num_threads
+
+    callbacks = []
+    if early_stopping_rounds:
+        callbacks.append(lgb.early_stopping(early_stopping_rounds, verbose=False))
 
     model = lgb.train(
         model_params,
         train_data,
-        num_boost_round=200,
+        num_boost_round=num_boost_round,
         valid_sets=[valid_data],
-        feval=mase_lgb_metric,
+        feval=validation_feval(series, evaluator),
+        callbacks=callbacks,
     )
+    best_iteration = model.best_iteration or model.current_iteration()
 
-    y_pred = model.predict(X_valid)
+    y_pred = model.predict(as_matrix(X_valid), num_iteration=best_iteration)
 
-    # Metrics
-    smape_val = smape(y_valid.values, y_pred)
-    mase_val = mase(y_valid.values, y_pred)
-    rmse = root_mean_squared_error(y_valid, y_pred)
+    metrics = regression_metrics(y_valid, y_pred, series)
+    if evaluator is not None:
+        metrics["WRMSSE"] = evaluator(y_pred)
 
     return {
-        "loss": mase_val,
+        "loss": metrics.get(LOSS_METRIC, metrics["MASE"]),
         "status": "ok",
-        "metrics": {"rmse": rmse, "sMAPE": smape_val, "MASE": mase_val},
+        "metrics": {**metrics, "best_iteration": best_iteration},
+        "best_iteration": best_iteration,
         "params": model_params,
     }
+
+
+def objective(
+    params: Dict[str, Any],
+    X_train,
+    y_train,
+    X_valid,
+    y_valid,
+    series: Optional[Dict[str, np.ndarray]] = None,
+    evaluator=None,
+) -> Dict[str, Any]:
+    """
+    Objective function for Hyperopt tuning using MASE (or WRMSSE) as loss.
+
+    `series` can be precomputed once with series_metric_inputs and shared
+    by all trials; it is derived from the frames when not given. The WRMSSE
+    `evaluator` (see build_wrmsse_evaluator) is only used when given.
+    """
+    if series is None:
+        series = series_metric_inputs(X_train, y_train, X_valid)
+    train_data, valid_data = get_datasets(
+        X_train, y_train, X_valid, y_valid, model_params_from(params)
+    )
+    return evaluate_params(
+        params, train_data, valid_data, X_valid, np.asarray(y_valid),
+        series=series, evaluator=evaluator,
+    )
@@ -0,0 +1,220 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from hyperopt import (
+    JOB_STATE_DONE,
+    JOB_STATE_ERROR,
+    STATUS_OK,
+    Trials,
+    space_eval,
+    tpe,
+)
+from hyperopt.base import Domain
+
+from codes.models.dataset_cache import (
+    get_datasets,
+    dataset_key,
+    dataset_files,
+    load_cached_datasets,
+)
+from codes.models.matrix import as_matrix
+from codes.profiling import profile_stage
+from codes.tuning.hyperopt_objective import evaluate_params, sample_params
+from codes.tuning.trial_store import config_key, evaluated_configs, save_trials
+
+logger = logging.getLogger(__name__)
+
+# Per-process state of the trial workers, set once by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def threads_per_trial(n_jobs: int, n_cores: Optional[int] = None) -> int:
+    """LightGBM threads per trial when `n_jobs` trials share the cores."""
+    n_cores = n_cores or os.cpu_count() or 1
+    return max(1, n_cores // n_jobs)
+
+
+def _array_path(key: str, name: str, cache_dir: Path) -> Path:
+    return cache_dir / f"{key}_{name}.npy"
+
+
+def _share_validation_data(
+    key: str,
+    X_valid: pd.DataFrame,
+    y_valid,
+    cache_dir: Path,
+    series: Optional[Dict[str, np.ndarray]] = None,
+) -> None:
+    """Save the validation arrays next to the Datasets, for memory-mapping."""
+    if not _array_path(key, "X_valid", cache_dir).exists():
+        np.save(_array_path(key, "X_valid", cache_dir), as_matrix(X_valid))
+    if not _array_path(key, "y_valid", cache_dir).exists():
+        y = np.asarray(y_valid, dtype=np.float32)
+        np.save(_array_path(key, "y_valid", cache_dir), y)
+    for name, values in (series or {}).items():
+        np.save(_array_path(key, f"series_{name}", cache_dir), values)
+
+
+def _init_worker(
+    key: str,
+    params: Dict[str, Any],
+    cache_dir: Path,
+    series: Tuple[str, ...] = (),
+    evaluator=None,
+) -> None:
+    """Load the binned Datasets and map the validation matrix, once per worker."""
+    _worker["datasets"] = load_cached_datasets(key, params, cache_dir)
+    _worker["X_valid"] = np.load(_array_path(key, "X_valid", cache_dir), mmap_mode="r")
+    _worker["y_valid"] = np.load(_array_path(key, "y_valid", cache_dir), mmap_mode="r")
+    _worker["series"] = {
+        name: np.load(_array_path(key, f"series_{name}", cache_dir), mmap_mode="r")
+        for name in series
+    } or None
+    _worker["evaluator"] = evaluator
+
+
+def _run_trial(params: Dict[str, Any], num_threads: int) -> Dict[str, Any]:
+    train_data, valid_data = _worker["datasets"]
+    with profile_stage("hyperopt_trial"):
+        return evaluate_params(
+            params,
+            train_data,
+            valid_data,
+            _worker["X_valid"],
+            _worker["y_valid"],
+            num_threads=num_threads,
+            series=_worker["series"],
+            evaluator=_worker["evaluator"],
+        )
+
+
+def _finish(doc: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """Mark a trial document as done with `result`."""
+    doc["result"] = result
+    doc["state"] = JOB_STATE_DONE
+    doc["refresh_time"] = time.time()
+
+
+def run_parallel_trials(
+    space: Dict[str, Any],
+    X_train,
+    y_train,
+    X_valid,
+    y_valid,
+    max_evals: int,
+    n_jobs: int,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    cache_dir: Optional[Path] = None,
+    seed: Optional[int] = None,
+    series: Optional[Dict[str, np.ndarray]] = None,
+    evaluator=None,
+    trials: Optional[Trials] = None,
+    trials_path: Optional[Path] = None,
+) -> Trials:
+    """
+    TPE search with up to `n_jobs` trials running at once in worker processes.
+
+    Hyperopt is driven ask/tell style: new points are suggested from the
+    finished trials whenever a worker is free. The workers load the binned
+    Datasets from their binary files and memory-map the validation matrix,
+    so the training data is neither pickled nor copied per trial, and each
+    trial gets an equal share of the cores as LightGBM `num_threads`.
+
+    Args:
+        space (Dict[str, Any]): Hyperopt search space
+        X_train, y_train: training data
+        X_valid, y_valid: validation data
+        max_evals (int): Number of new trials
+        n_jobs (int): Number of concurrent trials
+        on_result (Optional[Callable]): Called in this process with the
+            result of every finished trial (e.g. to log it to MLflow)
+        cache_dir (Optional[Path]): Directory of the binary Dataset files
+        seed (Optional[int]): Seed of the TPE suggestions
+        series (Optional[Dict[str, np.ndarray]]): Validation series codes and
+            training scales for per-series MASE (see series_metric_inputs)
+        evaluator (Optional[WRMSSEEvaluator]): WRMSSE of the validation rows,
+            sent once to every worker
+        trials (Optional[Trials]): Earlier trials to warm-start TPE from;
+            configurations among them are not evaluated again
+        trials_path (Optional[Path]): File the trials are saved to after
+            every finished trial (see trial_store)
+
+    Returns:
+        Trials: The completed trials
+    """
+    # Only used by TPE to read the space; trials are run by the workers
+    domain = Domain(lambda params: params, space)
+    trials = trials if trials is not None else Trials()
+    evaluated = evaluated_configs(trials, space)
+    rstate = np.random.default_rng(seed)
+
+    # Binning parameters are not part of the search space, so the Datasets
+    # binned for any sample serve every trial
+    sample = sample_params(space)
+    get_datasets(X_train, y_train, X_valid, y_valid, sample, cache_dir, use_cache=True)
+    key = dataset_key(X_train, y_train, X_valid, y_valid, sample)
+    cache_dir = dataset_files(key, cache_dir)["train"].parent
+    _share_validation_data(key, X_valid, y_valid, cache_dir, series)
+
+    num_threads = threads_per_trial(n_jobs)
+    logger.info(
+        f"Running {max_evals} trials, {n_jobs} at a time with {num_threads} threads each"
+    )
+
+    with ProcessPoolExecutor(
+        max_workers=n_jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(key, sample, cache_dir, tuple(series or ()), evaluator),
+    ) as executor:
+        running, submitted = {}, 0
+        while submitted < max_evals or running:
+            n_new = min(n_jobs - len(running), max_evals - submitted)
+            if n_new > 0:
+                new_ids = trials.new_trial_ids(n_new)
+                trials.refresh()
+                docs = tpe.suggest(new_ids, domain, trials, rstate.integers(2**31 - 1))
+                trials.insert_trial_docs(docs)
+                trials.refresh()
+                for doc in docs:
+                    vals = {k: v[0] for k, v in doc["misc"]["vals"].items() if v}
+                    params = space_eval(space, vals)
+                    config = config_key(params)
+                    if config in evaluated:
+                        # Already scored, in this sweep or a stored one
+                        logger.info(f"Trial {doc['tid']} repeats an evaluated configuration")
+                        _finish(doc, evaluated[config])
+                    else:
+                        future = executor.submit(_run_trial, params, num_threads)
+                        running[future] = (doc, config)
+                submitted += len(docs)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                doc, config = running.pop(future)
+                try:
+                    result = future.result()
+                    _finish(doc, {
+                        "loss": result["loss"],
+                        "status": STATUS_OK,
+                        "best_iteration": result["best_iteration"],
+                    })
+                    evaluated[config] = doc["result"]
+                    if on_result is not None:
+                        on_result(result)
+                except Exception as e:
+                    logger.error(f"Trial {doc['tid']} failed: {e}")
+                    doc["state"] = JOB_STATE_ERROR
+                    doc["refresh_time"] = time.time()
+            trials.refresh()
+            if trials_path is not None:
+                save_trials(trials, trials_path)
+
+    return trials
@@ -1,58 +1,221 @@
 from hyperopt import hp, fmin, tpe, Trials, STATUS_OK
-import mlflow
+import logging
 from prefect import task
-from typing import Any
+from typing import Any, Callable, Dict
 
 from codes.tuning.hyperopt_objective import objective
-from codes.config import MLFLOW_TRACKING_URI, MLFLOW_EXPERIMENT_NAME, NUM_TRIALS
+from codes.tuning.hyperopt_objective import sample_params
+from codes.tuning.parallel_trials import run_parallel_trials
+from codes.tuning.successive_halving import successive_halving
+from codes.tuning.subsampling import proxy_rank_correlation, subsample_split
+from codes.tuning.trial_store import (
+    config_key,
+    evaluated_configs,
+    load_trials,
+    saving_hook,
+    sweep_key,
+    trials_file,
+)
+from codes.models.dataset_cache import get_datasets
+from codes.models.mlflow_logging import get_mlflow_logger
+from codes.metrics.error_metrics import series_metric_inputs
+from codes.metrics.hierarchy import build_wrmsse_evaluator
+from codes.metrics.lgb_metrics import validation_feval
+from codes.profiling import profile_stage
+from codes.config import (
+    NUM_TRIALS,
+    TRIAL_JOBS,
+    SUCCESSIVE_HALVING,
+    USE_WRMSSE,
+    PROXY_TUNING,
+    PROXY_FRACTION,
+    USE_TRIAL_STORE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+SEARCH_SPACE = {
+    "learning_rate": hp.uniform("learning_rate", 0.001, 0.2),
+    "num_leaves": hp.quniform("num_leaves", 31, 256, 1),
+    "min_data_in_leaf": hp.quniform("min_data_in_leaf", 20, 100, 1),
+    "feature_fraction": hp.uniform("feature_fraction", 0.6, 1.0),
+    "bagging_fraction": hp.uniform("bagging_fraction", 0.6, 1.0),
+    "lambda_l1": hp.uniform("lambda_l1", 0.0, 5.0),
+    "lambda_l2": hp.uniform("lambda_l2", 0.0, 5.0),
+}
+
+
+def _metric_inputs(X_train, y_train, X_valid, y_valid):
+    """Per-series MASE scales and WRMSSE evaluator of a split, shared by all trials."""
+    series = series_metric_inputs(X_train, y_train, X_valid)
+    evaluator = (
+        build_wrmsse_evaluator(X_train, y_train, X_valid, y_valid)
+        if USE_WRMSSE else None
+    )
+    return series, evaluator
+
+
+def _search(
+    X_train, y_train, X_valid, y_valid, max_evals: int, n_jobs: int,
+    halving: bool, on_result: Callable[[Dict[str, Any]], None],
+    log_params: Callable[[Dict[str, Any]], None],
+) -> Dict[str, Any]:
+    """Runs the configured search on a split; returns the best params and iteration."""
+    series, evaluator = _metric_inputs(X_train, y_train, X_valid, y_valid)
+
+    if halving:
+        log_params({"search_algorithm": "successive_halving"})
+        train_data, valid_data = get_datasets(
+            X_train, y_train, X_valid, y_valid,
+            sample_params(SEARCH_SPACE),
+        )
+        best = successive_halving(
+            SEARCH_SPACE, train_data, valid_data, on_result=on_result,
+            make_feval=lambda: validation_feval(series, evaluator),
+        )[0]
+        return {
+            **{k: v for k, v in best["params"].items() if k in SEARCH_SPACE},
+            "best_iteration": best["best_iteration"],
+        }
+
+    # Trial history of earlier sweeps on the same data and search space
+    trials_path = (
+        trials_file(sweep_key(X_train, y_train, X_valid, y_valid, SEARCH_SPACE))
+        if USE_TRIAL_STORE else None
+    )
+    trials = load_trials(trials_path) if trials_path else Trials()
+    evaluated = evaluated_configs(trials, SEARCH_SPACE)
+
+    def mlflow_wrapped(params):
+        config = config_key(params)
+        if config in evaluated:
+            logger.info("Configuration already evaluated; reusing its result")
+            return evaluated[config]
+
+        with profile_stage("hyperopt_trial"):
+            results = objective(
+                params, X_train, y_train, X_valid, y_valid,
+                series=series, evaluator=evaluator,
+            )
+        on_result(results)
+        evaluated[config] = {
+            "loss": results["loss"],
+            "status": STATUS_OK,
+            "best_iteration": results["best_iteration"],
+        }
+        return evaluated[config]
+
+    log_params({
+        "search_algorithm": "TPE",
+        "n_jobs": n_jobs,
+        "warm_start_trials": len(trials.trials),
+    })
+    if n_jobs > 1:
+        trials = run_parallel_trials(
+            SEARCH_SPACE, X_train, y_train, X_valid, y_valid,
+            max_evals=max_evals, n_jobs=n_jobs, on_result=on_result,
+            series=series, evaluator=evaluator,
+            trials=trials, trials_path=trials_path,
+        )
+        best = trials.argmin
+    else:
+        # max_evals counts the stored trials too; saved (atomically) after every trial
+        best = fmin(
+            fn=mlflow_wrapped,
+            space=SEARCH_SPACE,
+            algo=tpe.suggest,
+            max_evals=len(trials.trials) + max_evals,
+            trials=trials,
+            early_stop_fn=saving_hook(trials_path) if trials_path else None,
+        )
+
+    return {**best, "best_iteration": trials.best_trial["result"]["best_iteration"]}
 
 
 @task(name="Run_hyperopt", log_prints=True)
 def run_hyperopt(
-    X_train, y_train, X_valid, y_valid, max_evals: int = NUM_TRIALS
+    X_train, y_train, X_valid, y_valid, max_evals: int = NUM_TRIALS,
+    n_jobs: int = TRIAL_JOBS, halving: bool = SUCCESSIVE_HALVING,
+    proxy: bool = PROXY_TUNING,
 ) -> Any:
     """
     Run hyperparameter optimization with Hyperopt and log results in MLflow.
 
+    With USE_TRIAL_STORE, TPE sweeps are saved after every trial under a
+    key of the data and search space (see trial_store): a later sweep on
+    the same key resumes from the stored trials, runs `max_evals` new ones,
+    and reuses the result of any configuration evaluated before.
+
+    In proxy mode the search runs on a stratified sample of the series
+    (see subsampling); a few configurations are then re-scored on all the
+    series and the rank correlation of proxy and full losses is logged as
+    'proxy_rank_correlation'. The best iteration of the proxy is not
+    returned, so the final fit early-stops on the full data instead.
+
     Args:
         X_train, y_train: training data
         X_valid, y_valid: validation data
-        max_evals (int): number of trials
+        max_evals (int): number of new trials
+        n_jobs (int): number of trials run concurrently in worker processes
+        halving (bool): use successive halving over random candidates
+            instead of TPE
+        proxy (bool): tune on a sample of PROXY_FRACTION of the series
 
     Returns:
-        dict: best parameters
+        dict: best parameters, with the 'best_iteration' of the best trial
+        (outside proxy mode)
     """
-    search_space = {
-        "learning_rate": hp.uniform("learning_rate", 0.001, 0.2),
-        "num_leaves": hp.quniform("num_leaves", 31, 256, 1),
-        "min_data_in_leaf": hp.quniform("min_data_in_leaf", 20, 100, 1),
-        "feature_fraction": hp.uniform("feature_fraction", 0.6, 1.0),
-        "bagging_fraction": hp.uniform("bagging_fraction", 0.6, 1.0),
-        "lambda_l1": hp.uniform("lambda_l1", 0.0, 5.0),
-        "lambda_l2": hp.uniform("lambda_l2", 0.0, 5.0),
-    }
+    # Runs are logged in batches from a background thread (see mlflow_logging)
+    tracker = get_mlflow_logger()
+    sweep = tracker.start_run(run_name="hyperopt_sweep")
+    results = []
 
-    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
-    mlflow.set_experiment(MLFLOW_EXPERIMENT_NAME)
+    def log_trial(result):
+        results.append(result)
+        trial = tracker.start_run(parent=sweep)
+        tracker.log_params(trial, result["params"])
+        tracker.log_metrics(trial, result["metrics"])
+        tracker.end_run(trial)
 
-    trials = Trials()
+    def log_sweep_params(params):
+        tracker.log_params(sweep, params)
 
-    def mlflow_wrapped(params):
-        results = objective(params, X_train, y_train, X_valid, y_valid)
-        with mlflow.start_run(nested=True):
-            mlflow.log_params(results["params"])
-            for k, v in results["metrics"].items():
-                mlflow.log_metric(k, v)
-        return {"loss": results["loss"], "status": STATUS_OK}
-
-    with mlflow.start_run(run_name="hyperopt_sweep"):
-        mlflow.log_param("search_algorithm", "TPE")
-        best = fmin(
-            fn=mlflow_wrapped,
-            space=search_space,
-            algo=tpe.suggest,
-            max_evals=max_evals,
-            trials=trials,
+    status = "FAILED"
+    try:
+        if not proxy:
+            best = _search(
+                X_train, y_train, X_valid, y_valid, max_evals, n_jobs, halving,
+                log_trial, log_sweep_params,
+            )
+            status = "FINISHED"
+            return best
+
+        log_sweep_params({"proxy_fraction": PROXY_FRACTION})
+        best = _search(
+            *subsample_split(X_train, y_train, X_valid, y_valid),
+            max_evals, n_jobs, halving, log_trial, log_sweep_params,
+        )
+
+        series, evaluator = _metric_inputs(X_train, y_train, X_valid, y_valid)
+
+        def full_loss(params):
+            params = {k: v for k, v in params.items() if k in SEARCH_SPACE}
+            with profile_stage("proxy_check"):
+                return objective(
+                    params, X_train, y_train, X_valid, y_valid,
+                    series=series, evaluator=evaluator,
+                )["loss"]
+
+        correlation, pairs = proxy_rank_correlation(results, full_loss)
+        logger.info(
+            f"Proxy/full rank correlation {correlation:.3f} "
+            f"over (proxy, full) losses {pairs}"
         )
+        tracker.log_metrics(sweep, {"proxy_rank_correlation": correlation})
+        status = "FINISHED"
+    finally:
+        tracker.end_run(sweep, status)
 
+    best.pop("best_iteration", None)
     return best
@@ -0,0 +1,156 @@
+import logging
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.stats import spearmanr
+
+from codes.metrics.error_metrics import series_codes
+from codes.config import PROXY_CHECKS, PROXY_FRACTION, PROXY_SEED, PROXY_VOLUME_BINS
+
+logger = logging.getLogger(__name__)
+
+# Series strata; departments are nested in categories, so store x dept
+# also stratifies by category
+STRATA: Tuple[str, ...] = ("store_id", "dept_id")
+
+
+def stratified_series_sample(
+    X: pd.DataFrame,
+    y,
+    fraction: float = PROXY_FRACTION,
+    strata: Sequence[str] = STRATA,
+    volume_bins: int = PROXY_VOLUME_BINS,
+    seed: int = PROXY_SEED,
+) -> np.ndarray:
+    """
+    Reproducible stratified sample of the series of a long-format frame.
+
+    Series are grouped by their `strata` ids and by sales-volume quantile
+    (total of `y` over their rows), and `fraction` of every group (at least
+    one series) is drawn at random.
+
+    Args:
+        X (pd.DataFrame): Rows with categorical store/item ids and `strata`
+        y: Target of every row
+        fraction (float): Share of the series to keep
+        strata (Sequence[str]): Id columns to stratify by
+        volume_bins (int): Number of sales-volume quantile bins
+        seed (int): Seed of the draw
+
+    Returns:
+        np.ndarray: Sorted series codes (see series_codes) of the sample
+    """
+    codes, _ = series_codes(X)
+    series, first_row, inverse = np.unique(
+        codes, return_index=True, return_inverse=True
+    )
+    volume = np.bincount(inverse, weights=np.asarray(y, dtype=np.float64))
+    edges = np.quantile(volume, np.linspace(0, 1, volume_bins + 1)[1:-1])
+    keys = [X[col].cat.codes.to_numpy()[first_row] for col in strata]
+    keys.append(np.searchsorted(edges, volume, side="right"))
+    stratum = np.unique(np.column_stack(keys), axis=0, return_inverse=True)[1]
+    stratum = stratum.ravel()
+
+    # Random order within each stratum, keep the first ceil(fraction * size)
+    draw = np.random.default_rng(seed).random(len(series))
+    order = np.lexsort((draw, stratum))
+    sizes = np.bincount(stratum)
+    starts = np.cumsum(sizes) - sizes
+    ranks = np.arange(len(order)) - starts[stratum[order]]
+    keep = ranks < np.ceil(fraction * sizes[stratum[order]])
+
+    logger.info(
+        f"Sampled {keep.sum()} of {len(series)} series from {len(sizes)} strata"
+    )
+    return np.sort(series[order[keep]])
+
+
+def subsample_split(
+    X_train: pd.DataFrame,
+    y_train,
+    X_valid: pd.DataFrame,
+    y_valid,
+    fraction: float = PROXY_FRACTION,
+    seed: int = PROXY_SEED,
+) -> Tuple[pd.DataFrame, pd.Series, pd.DataFrame, pd.Series]:
+    """
+    Rows of the train/validation split that belong to a stratified series sample.
+
+    The sample is drawn on the training rows; the row order (and with it
+    the day order within every series) is kept.
+
+    Args:
+        X_train, y_train: training data
+        X_valid, y_valid: validation data
+        fraction (float): Share of the series to keep
+        seed (int): Seed of the draw
+
+    Returns:
+        Tuple: X_train, y_train, X_valid, y_valid of the sampled series
+    """
+    if series_codes(X_train) is None or any(c not in X_train for c in STRATA):
+        logger.warning("No series ids to stratify by; tuning on all the data")
+        return X_train, y_train, X_valid, y_valid
+
+    selected = stratified_series_sample(X_train, y_train, fraction, seed=seed)
+    train_rows = np.flatnonzero(np.isin(series_codes(X_train)[0], selected))
+    valid_rows = np.flatnonzero(np.isin(series_codes(X_valid)[0], selected))
+    return (
+        X_train.iloc[train_rows],
+        y_train.iloc[train_rows],
+        X_valid.iloc[valid_rows],
+        y_valid.iloc[valid_rows],
+    )
+
+
+def comparable_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Results whose losses were measured at the same training budget.
+
+    TPE trials all early-stop on the same rounds and are returned as they
+    are. Successive-halving results carry their 'rung_budget': candidates
+    dropped at an early rung were scored after fewer rounds, so only the
+    deepest rung with at least two results (the last rung otherwise) is
+    kept.
+    """
+    by_budget: Dict[Any, List[Dict[str, Any]]] = {}
+    for result in results:
+        by_budget.setdefault(result.get("rung_budget"), []).append(result)
+    if len(by_budget) <= 1:
+        return results
+    budgets = sorted(by_budget, reverse=True)
+    return next((by_budget[b] for b in budgets if len(by_budget[b]) >= 2), by_budget[budgets[0]])
+
+
+def proxy_rank_correlation(
+    results: List[Dict[str, Any]],
+    full_loss: Callable[[Dict[str, Any]], float],
+    n_check: int = PROXY_CHECKS,
+) -> Tuple[float, List[Tuple[float, float]]]:
+    """
+    Spearman correlation between proxy losses and full-data losses.
+
+    `n_check` configurations spread evenly over the proxy ranking (best and
+    worst included) are re-scored on the full data. Only results scored at
+    the same budget are ranked (see comparable_results).
+
+    Args:
+        results (List[Dict[str, Any]]): Trial results of the proxy search,
+            with 'loss' and 'params'
+        full_loss (Callable): Loss of a configuration on the full data
+        n_check (int): Number of configurations to re-score
+
+    Returns:
+        Tuple[float, List[Tuple[float, float]]]: The correlation (NaN with
+        fewer than two configurations) and the (proxy, full) loss pairs
+    """
+    ranked = sorted(comparable_results(results), key=lambda r: r["loss"])
+    picks = np.unique(np.linspace(0, len(ranked) - 1, min(n_check, len(ranked))).round())
+    pairs = [
+        (ranked[i]["loss"], full_loss(ranked[i]["params"])) for i in picks.astype(int)
+    ]
+    if len(pairs) < 2:
+        return np.nan, pairs
+    proxy, full = zip(*pairs)
+    return float(spearmanr(proxy, full).statistic), pairs
@@ -0,0 +1,153 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+import lightgbm as lgb
+import numpy as np
+
+from codes.metrics.lgb_metrics import validation_feval
+from codes.tuning.hyperopt_objective import sample_params
+from codes.config import (
+    EARLY_STOPPING_ROUNDS,
+    LOSS_METRIC,
+    SH_CANDIDATES,
+    SH_MIN_ROUNDS,
+    SH_MAX_ROUNDS,
+    SH_REDUCTION_FACTOR,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def rung_budgets(min_rounds: int, max_rounds: int, reduction_factor: int) -> List[int]:
+    """
+    Cumulative boosting rounds reached at each rung, e.g. [20, 60, 180, 500].
+
+    Args:
+        min_rounds (int): Rounds of the first rung
+        max_rounds (int): Rounds of the last rung
+        reduction_factor (int): Growth of the budget from one rung to the next
+
+    Returns:
+        List[int]: Increasing round budgets, ending at `max_rounds`
+    """
+    budgets = [min(min_rounds, max_rounds)]
+    while budgets[-1] < max_rounds:
+        budgets.append(min(budgets[-1] * reduction_factor, max_rounds))
+    return budgets
+
+
+def _advance(
+    candidate: Dict[str, Any],
+    rounds: int,
+    early_stopping_rounds: Optional[int],
+) -> None:
+    """Continue boosting a candidate up to `rounds` rounds, tracking its best loss."""
+    booster = candidate["booster"]
+    while not candidate["stopped"] and booster.current_iteration() < rounds:
+        booster.update()
+        score = booster.eval_valid(candidate["feval"])[0][2]
+        if score < candidate["loss"]:
+            candidate["loss"] = score
+            candidate["best_iteration"] = booster.current_iteration()
+        elif (
+            early_stopping_rounds
+            and booster.current_iteration() - candidate["best_iteration"]
+            >= early_stopping_rounds
+        ):
+            candidate["stopped"] = True
+
+
+def _result(candidate: Dict[str, Any], rung_budget: int) -> Dict[str, Any]:
+    return {
+        "loss": candidate["loss"],
+        "status": "ok",
+        "metrics": {
+            LOSS_METRIC: candidate["loss"],
+            "best_iteration": candidate["best_iteration"],
+            "rounds": candidate["booster"].current_iteration(),
+        },
+        "best_iteration": candidate["best_iteration"],
+        "params": candidate["params"],
+        # Losses are only comparable between results of the same budget
+        "rung_budget": rung_budget,
+    }
+
+
+def successive_halving(
+    space: Dict[str, Any],
+    train_data: lgb.Dataset,
+    valid_data: lgb.Dataset,
+    n_candidates: int = SH_CANDIDATES,
+    min_rounds: int = SH_MIN_ROUNDS,
+    max_rounds: int = SH_MAX_ROUNDS,
+    reduction_factor: int = SH_REDUCTION_FACTOR,
+    early_stopping_rounds: Optional[int] = EARLY_STOPPING_ROUNDS,
+    make_feval: Optional[Callable[[], Callable]] = None,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+    seed: Optional[int] = None,
+    series: Optional[Dict[str, np.ndarray]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Successive halving over random candidates of the search space.
+
+    All candidates are trained for `min_rounds` rounds; the best
+    1/`reduction_factor` by validation LOSS_METRIC continue to the next rung, with
+    `reduction_factor` times more rounds, until `max_rounds`. Boosters keep
+    training where they stopped instead of restarting, and a candidate also
+    stops early when its loss has not improved for `early_stopping_rounds`.
+
+    Args:
+        space (Dict[str, Any]): Hyperopt search space to sample from
+        train_data, valid_data: Constructed train and validation Datasets
+        n_candidates (int): Number of sampled configurations
+        min_rounds (int): Rounds of the first rung
+        max_rounds (int): Rounds of the last rung
+        reduction_factor (int): Fraction of candidates dropped at each rung
+        early_stopping_rounds (Optional[int]): Patience in rounds (off if None)
+        make_feval (Optional[Callable[[], Callable]]): Builds the LightGBM
+            metric to minimise, once per candidate, as the every-k metric
+            keeps state per validation Dataset (validation_feval(series) if None)
+        on_result (Optional[Callable]): Called with each candidate's result
+            when it is dropped or finishes
+        seed (Optional[int]): Seed of the candidate sampling
+        series (Optional[Dict[str, np.ndarray]]): Validation series codes and
+            training scales, for per-series MASE in the default feval
+
+    Returns:
+        List[Dict[str, Any]]: Results of all candidates, best first
+    """
+    make_feval = make_feval or (lambda: validation_feval(series))
+    rng = np.random.default_rng(seed)
+    alive = []
+    for _ in range(n_candidates):
+        params = sample_params(space, rng)
+        booster = lgb.Booster(params, train_data)
+        booster.add_valid(valid_data, "valid")
+        alive.append(
+            {"params": params, "booster": booster, "feval": make_feval(),
+             "loss": np.inf, "best_iteration": 0, "stopped": False}
+        )
+
+    results = []
+    budgets = rung_budgets(min_rounds, max_rounds, reduction_factor)
+    for rung, rounds in enumerate(budgets):
+        for candidate in alive:
+            _advance(candidate, rounds, early_stopping_rounds)
+        alive.sort(key=lambda c: c["loss"])
+
+        last = rung == len(budgets) - 1
+        n_keep = len(alive) if last else max(1, len(alive) // reduction_factor)
+        logger.info(
+            f"Rung {rung}: {len(alive)} candidates at {rounds} rounds, "
+            f"best {LOSS_METRIC} {alive[0]['loss']:.4f}, keeping {n_keep}"
+        )
+        finished = alive if last else alive[n_keep:]
+        for candidate in finished:
+            results.append(_result(candidate, rounds))
+            if on_result is not None:
+                on_result(results[-1])
+            # Free the booster's training state
+            candidate["booster"] = None
+        alive = alive[:n_keep] if not last else []
+
+    return sorted(results, key=lambda r: r["loss"])
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from hyperopt import (
+    JOB_STATE_DONE,
+    JOB_STATE_ERROR,
+    STATUS_OK,
+    Trials,
+    pyll,
+    space_eval,
+)
+
+from codes.models.dataset_cache import frame_fingerprint
+from codes.config import (
+    EARLY_STOPPING_ROUNDS,
+    EVAL_EVERY,
+    LOSS_METRIC,
+    TRIAL_STORE_DIR,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def sweep_key(X_train, y_train, X_valid, y_valid, space: Dict[str, Any]) -> str:
+    """
+    Key of a sweep: data, search space and the settings the loss depends on.
+
+    Args:
+        X_train, y_train: training data
+        X_valid, y_valid: validation data
+        space (Dict[str, Any]): Hyperopt search space
+
+    Returns:
+        str: Short hex digest
+    """
+    return hashlib.sha256(
+        json.dumps(
+            [
+                frame_fingerprint(X_train, y_train),
+                frame_fingerprint(X_valid, y_valid),
+                str(pyll.as_apply(space)),
+                {
+                    "loss": LOSS_METRIC,
+                    "early_stopping_rounds": EARLY_STOPPING_ROUNDS,
+                    "eval_every": EVAL_EVERY,
+                },
+            ]
+        ).encode()
+    ).hexdigest()[:16]
+
+
+def trials_file(key: str, store_dir: Optional[Path] = None) -> Path:
+    """Path of the pickled Trials of a sweep key (its directory is created)."""
+    store_dir = store_dir or TRIAL_STORE_DIR
+    store_dir.mkdir(parents=True, exist_ok=True)
+    return store_dir / f"{key}.pkl"
+
+
+def load_trials(path: Path) -> Trials:
+    """
+    Trials saved at `path`, or empty Trials if there are none.
+
+    Trials that were still running when the sweep stopped are marked as
+    failed, so TPE ignores them and their ids are not reused.
+
+    Args:
+        path (Path): Trials file (see trials_file)
+
+    Returns:
+        Trials: The stored trial history
+    """
+    if not path.exists():
+        return Trials()
+    try:
+        with open(path, "rb") as f:
+            trials = pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Could not read the trials in {path} ({e}); starting afresh")
+        return Trials()
+
+    for doc in trials.trials:
+        if doc["state"] != JOB_STATE_DONE:
+            doc["state"] = JOB_STATE_ERROR
+    trials.refresh()
+    logger.info(f"Warm-starting from {len(trials.trials)} stored trials in {path}")
+    return trials
+
+
+def save_trials(trials: Trials, path: Path) -> None:
+    """Pickle `trials` to `path`, replacing the previous file atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump(trials, f)
+    os.replace(tmp_path, path)
+
+
+def saving_hook(path: Path) -> Callable[..., Tuple[bool, List]]:
+    """
+    fmin `early_stop_fn` that saves the trials after every trial.
+
+    The trials are written with save_trials, so a sweep killed while
+    saving keeps the previous file instead of a truncated one. The hook
+    never stops the sweep.
+    """
+
+    def hook(trials: Trials, *args) -> Tuple[bool, List]:
+        save_trials(trials, path)
+        return False, list(args)
+
+    return hook
+
+
+def config_key(params: Dict[str, Any]) -> str:
+    """Canonical text of a configuration, to recognise re-suggested points."""
+    return json.dumps(
+        {
+            k: round(float(v), 10) if isinstance(v, (int, float)) else str(v)
+            for k, v in params.items()
+        },
+        sort_keys=True,
+    )
+
+
+def evaluated_configs(trials: Trials, space: Dict[str, Any]) -> Dict[str, Dict]:
+    """
+    Results of the successful trials, by configuration (see config_key).
+
+    Args:
+        trials (Trials): Trial history
+        space (Dict[str, Any]): Search space the trials were drawn from
+
+    Returns:
+        Dict[str, Dict]: Trial result documents by configuration
+    """
+    evaluated = {}
+    for doc in trials.trials:
+        if doc["state"] == JOB_STATE_DONE and doc["result"].get("status") == STATUS_OK:
+            vals = {k: v[0] for k, v in doc["misc"]["vals"].items() if v}
+            evaluated[config_key(space_eval(space, vals))] = doc["result"]
+    return evaluated
@@ -1,31 +1,72 @@
 
 from prefect import flow, task
+from pathlib import Path
+import argparse
 from typing import Tuple
 import pandas as pd
 import logging
 
 from codes.data_handling.data_downloader import download_m5_data
 from codes.data_handling.data_uploader import save_and_upload_to_s3
+from codes.data_handling.data_splitter import sort_by_day, day_slices
+from codes.data_handling.category_schema import (
+    build_category_schema,
+    save_category_schema,
+    load_category_schema,
+    apply_category_schema
+)
 from codes.data_handling.data_loader import (
+    load_sales_ids,
     load_sales_data,
     load_calendar_data,
     load_sell_prices
 )
-from codes.feature_engineering import (
-    melt_sales_data,
-    add_lag_features,
-    add_rolling_features,
-    add_date_features
+from codes.data_handling.feature_store import (
+    raw_data_fingerprint,
+    clear_feature_store,
+    write_partition,
+    write_manifest,
+    read_manifest,
+    read_feature_store,
+    save_window_state
+)
+from codes.feature_engineering import build_features, window_history_days
+from codes.incremental import can_refresh, refresh_feature_store
+from codes.backtesting import run_backtest
+from codes.models.matrix import build_matrix, register_matrix
+from codes.partitioning import prepare_partitions
+from codes.profiling import (
+    profiled,
+    profile_stage,
+    write_profile_report,
+    log_profile_to_mlflow
+)
+from codes.best_model import train_model, retrain_model
+from codes.retraining import (
+    read_drift_metrics,
+    drift_detected,
+    load_production_model,
+    count_new_days
 )
-from codes.best_model import train_model
 from codes.tuning.param_tunning import run_hyperopt
 from codes.config import (
     RAW_DATA_DIR,
-    PROCESSED_DATA_DIR,
+    CATEGORY_SCHEMA_FILE,
+    FEATURE_STORE_DIR,
+    REUSE_FEATURE_STORE,
+    INCREMENTAL_FEATURES,
     START_DATE_TRAIN,
     END_DATE_TRAIN,
     END_DATE_VAL,
-    NUM_TRIALS
+    NUM_TRIALS,
+    PARTITIONED,
+    DISTRIBUTED_TRAINING,
+    DIST_MACHINES,
+    BACKTESTING,
+    RETRAIN_VALID_DAYS,
+    CATEGORICAL_FEATURES,
+    NUMERICAL_FEATURES,
+    TARGET
 )
 
 
@@ -35,6 +76,7 @@ logger = logging.getLogger(__name__)
 
 
 @task(name="Download_data", log_prints=True)
+@profiled("downloading_data")
 def downloading_data() -> None:
     """Download M5 data set from the Kaggle"""
     logger.info("Downloading M5 data")
@@ -42,60 +84,104 @@ def downloading_data() -> None:
 
 
 @task(name="Prepare_data", log_prints=True)
-def prepare_data() -> pd.DataFrame:
-    """Loads raw M5 data and applies feature engineering."""
-    logger.info("Loading raw data...")
-    sales = load_sales_data()
-    calendar = load_calendar_data()
-    prices = load_sell_prices()
+@profiled("prepare_data")
+def prepare_data() -> Path:
+    """Loads raw M5 data, applies feature engineering and fills the feature store."""
+    fingerprint = raw_data_fingerprint()
+    manifest = read_manifest()
+    if (
+        REUSE_FEATURE_STORE
+        and manifest
+        and manifest["fingerprint"] == fingerprint
+        and CATEGORY_SCHEMA_FILE.exists()
+    ):
+        logger.info(f"Reusing features stored in {FEATURE_STORE_DIR}")
+        return FEATURE_STORE_DIR
+
+    if INCREMENTAL_FEATURES and can_refresh() and CATEGORY_SCHEMA_FILE.exists():
+        logger.info("Appending the new days to the feature store...")
+        if refresh_feature_store(fingerprint=fingerprint) > 0:
+            return FEATURE_STORE_DIR
 
-    logger.info("Transforming and merging...")
-    sales = melt_sales_data(sales)
-    sales = sales.merge(calendar, on="d", how="left")
-    sales = sales.merge(prices, on=["store_id", "item_id", "wm_yr_wk"], how="left")
+    clear_feature_store()
+    schema = build_category_schema(load_sales_ids())
+    save_category_schema(schema)
+    if PARTITIONED:
+        logger.info("Preparing partitions in a process pool...")
+        prepare_partitions(schema=schema)
+    else:
+        logger.info("Loading raw data...")
+        with profile_stage("load") as stage:
+            sales = load_sales_data()
+            calendar = load_calendar_data()
+            prices = load_sell_prices()
+            stage.result = (sales, calendar, prices)
 
-    logger.info("Applying feature engineering...")
-    sales = add_lag_features(sales)
-    sales = add_rolling_features(sales)
-    sales = add_date_features(sales)
+        logger.info("Transforming, merging and applying feature engineering...")
+        save_window_state(sales, window_history_days())
+        sales = build_features(sales, calendar, prices, schema)
+        write_partition(sales)
 
-    logger.info(f"Saving to {PROCESSED_DATA_DIR / 'processed_data.csv'}")
-    sales.to_csv(PROCESSED_DATA_DIR / 'processed_data.csv', index=False)
-    return sales
+    write_manifest(fingerprint=fingerprint)
+    logger.info(f"Features saved to {FEATURE_STORE_DIR}")
+    return FEATURE_STORE_DIR
 
 
 @task(name="Split_data", log_prints=True)
-def split_data(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series, pd.DataFrame, pd.Series]:
+@profiled("split_data")
+def split_data(feature_store: Path) -> Tuple[pd.DataFrame, pd.Series, pd.DataFrame, pd.Series]:
     """Splits data into train/validation/test sets for modeling."""
-    categorical_columns = ['item_id', 'dept_id', 'cat_id', 'store_id', 'state_id']
-    features = categorical_columns + [
-        'sell_price', 'lag_7', 'lag_28',
-        'rolling_mean_7', 'rolling_mean_28',
-        'weekday', 'week', 'month', 'year'
-    ]
+    features = CATEGORICAL_FEATURES + NUMERICAL_FEATURES
+    target = TARGET
+    # Column order lets every output be a positional slice of one frame
+    columns = features + ['d', target, 'd_idx']
+    n_features = len(features)
 
-    for col in categorical_columns:
-        df[col] = df[col].astype('category')
+    df = read_feature_store(
+        feature_store, columns=columns, start_day=START_DATE_TRAIN
+    )
+    df = sort_by_day(df)
+    # Same categories (and codes) as at feature time and in deployment
+    df = apply_category_schema(df, load_category_schema())
 
-    target = 'sales'
+    train_rows, valid_rows, test_rows = day_slices(
+        df['d_idx'].to_numpy(), [START_DATE_TRAIN, END_DATE_TRAIN, END_DATE_VAL, None]
+    )
+    train, valid, test = df.iloc[train_rows], df.iloc[valid_rows], df.iloc[test_rows]
 
-    train_mask = df['d'].isin([f'd_{i}' for i in range(START_DATE_TRAIN, END_DATE_TRAIN)])
-    valid_mask = df['d'].isin([f'd_{i}' for i in range(END_DATE_TRAIN, END_DATE_VAL)])
-    test_mask = df['d'].isin([f'd_{i}' for i in range(END_DATE_VAL, df.shape[0])])
+    X_train = train.iloc[:, :n_features]
+    y_train = train[target]
+    X_valid = valid.iloc[:, :n_features]
+    y_valid = valid[target]
 
-    X_train = df[train_mask][features]
-    y_train = df[train_mask][target]
-    X_valid = df[valid_mask][features]
-    y_valid = df[valid_mask][target]
+    # One float32 matrix of the train + validation rows; LightGBM reads
+    # row-slice views of it, the frames stay for the id-based metrics
+    matrix = build_matrix(df.iloc[:valid_rows.stop], features)
+    register_matrix(X_train, matrix[train_rows])
+    register_matrix(X_valid, matrix[valid_rows])
 
-    save_and_upload_to_s3(df_reference=df[valid_mask][features + ['d', target]], 
-                          df_test=df[test_mask][features + ['d', target]])
+    save_and_upload_to_s3(df_reference=valid.iloc[:, :n_features + 2],
+                          df_test=test.iloc[:, :n_features + 2],
+                          extra_files=[CATEGORY_SCHEMA_FILE])
     
     logger.info(f"Train/Validation/Test splits created with shapes: "
                 f"{X_train.shape}, {X_valid.shape}")
 
     return X_train, y_train, X_valid, y_valid
 
+@task(name="Backtest", log_prints=True)
+@profiled("backtest")
+def backtest(feature_store: Path, params: dict) -> dict:
+    """Scores the tuned parameters on rolling-origin folds of the feature store."""
+    _, aggregate = run_backtest(feature_store, params)
+    return aggregate
+
+@task(name="Check_drift", log_prints=True)
+@profiled("check_drift")
+def check_drift(train_end: int) -> bool:
+    """Whether the drift metrics of the days since `train_end` call for a retrain."""
+    return drift_detected(read_drift_metrics(since_day=train_end))
+
 @flow(name="m5_pipeline", log_prints=True)
 def m5_pipeline():
     
@@ -108,28 +194,106 @@ def m5_pipeline():
     """
     logger.info("Starting M5 Forecasting Pipeline")
 
+    try:
+        return _run_pipeline()
+    finally:
+        write_profile_report()
+        log_profile_to_mlflow()
+
+
+def _run_pipeline():
+    """Runs the pipeline tasks; split out so the profile is saved on failure."""
     downloading_data()
 
-    df = prepare_data()
+    feature_store = prepare_data()
 
-    X_train, y_train, X_valid, y_valid = split_data(df)
+    X_train, y_train, X_valid, y_valid = split_data(feature_store)
 
     logger.info("Running Hyperparameter Search")
     best_params = run_hyperopt(
         X_train, y_train, X_valid, y_valid, max_evals=NUM_TRIALS
     )
 
-    logger.info("Training Final Model")
+    if BACKTESTING:
+        logger.info("Backtesting the tuned parameters")
+        backtest(feature_store, best_params)
+
+    if DISTRIBUTED_TRAINING:
+        logger.info(f"Training Final Model on machines {DIST_MACHINES}")
+    else:
+        logger.info("Training Final Model")
     model = train_model(
-        X_train, y_train, X_valid, y_valid, best_params
+        X_train, y_train, X_valid, y_valid, best_params,
+        distributed=DISTRIBUTED_TRAINING
     )
 
     logger.info("Pipeline completed successfully.")
     return model
 
 
+@flow(name="m5_retrain", log_prints=True)
+def m5_retrain(force: bool = False):
+    """
+    Incremental retraining of the production model:
+    - Drift check on the monitoring metrics (skipped with `force`)
+    - Data prep (only the new days when the feature store is incremental)
+    - Continued boosting on the new days with the tuned parameters
+
+    Without a recorded production model, the full pipeline runs instead.
+    """
+    logger.info("Starting M5 Incremental Retraining")
+
+    try:
+        return _run_retrain(force)
+    finally:
+        write_profile_report(name="retrain")
+        log_profile_to_mlflow(run_name="retrain_profile")
+
+
+def _run_retrain(force: bool):
+    """Runs the retraining tasks; split out so the profile is saved on failure."""
+    state = load_production_model()
+    if state is None:
+        logger.info("No production model recorded; running the full pipeline")
+        return _run_pipeline()
+
+    if not force and not check_drift(state["train_end"]):
+        logger.info("Drift below the threshold; retraining skipped")
+        return None
+
+    downloading_data()
+
+    feature_store = prepare_data()
+
+    new_days = count_new_days(state["train_end"], feature_store)
+    if new_days <= RETRAIN_VALID_DAYS:
+        logger.info(
+            f"Only {new_days} new days since day {state['train_end']}; "
+            f"more than {RETRAIN_VALID_DAYS} are needed, retraining skipped"
+        )
+        return None
+
+    logger.info(f"Continuing {state['model_uri']} from day {state['train_end']}")
+    model = retrain_model(feature_store, state)
+
+    logger.info("Retraining completed successfully.")
+    return model
+
+
 if __name__ == "__main__":
-    m5_pipeline()
+    parser = argparse.ArgumentParser(description="M5 training pipeline")
+    parser.add_argument(
+        "--retrain", action="store_true",
+        help="continue the production model on the new days if the data drifted"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="retrain without checking the drift"
+    )
+    args = parser.parse_args()
+    if args.retrain:
+        m5_retrain(force=args.force)
+    else:
+        m5_pipeline()
 
 
 
@@ -0,0 +1,128 @@
+# tests/conftest.py
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import codes.models.dataset_cache
+import codes.profiling
+import codes.tuning.trial_store
+from codes.data_handling.category_schema import build_category_schema
+from codes.data_handling.data_loader import (
+    load_calendar_data,
+    load_sales_data,
+    load_sell_prices,
+)
+from codes.data_handling.feature_store import write_manifest, write_partition
+from codes.data_handling.synthetic import generate_m5_data
+from codes.feature_engineering import build_features
+
+
+def create_raw_data(path: Path, n_days: int):
+    days = [f"d_{i}" for i in range(1, n_days + 1)]
+    sales = pd.DataFrame(
+        {
+            "id": ["A_CA_1", "B_CA_1", "A_TX_1"],
+            "item_id": ["A", "B", "A"],
+            "dept_id": ["D", "D", "D"],
+            "cat_id": ["C", "C", "C"],
+            "store_id": ["CA_1", "CA_1", "TX_1"],
+            "state_id": ["CA", "CA", "TX"],
+        }
+    )
+    for i, day in enumerate(days):
+        sales[day] = [i % 3, i % 5, i % 7]
+    sales.to_csv(path / "sales_train_validation.csv", index=False)
+
+    dates = pd.date_range("2011-01-29", periods=n_days)
+    weeks = 11101 + pd.RangeIndex(n_days) // 7
+    pd.DataFrame(
+        {"date": dates.strftime("%Y-%m-%d"), "wm_yr_wk": weeks, "d": days}
+    ).to_csv(path / "calendar.csv", index=False)
+
+    prices = [
+        (store, item, week, 1.0 + len(item) * 0.5)
+        for store, item in [("CA_1", "A"), ("CA_1", "B"), ("TX_1", "A")]
+        for week in sorted(set(weeks))
+    ]
+    pd.DataFrame(
+        prices, columns=["store_id", "item_id", "wm_yr_wk", "sell_price"]
+    ).to_csv(path / "sell_prices.csv", index=False)
+
+
+@pytest.fixture
+def raw_data_dir(tmp_path):
+    """Raw M5-shaped files for three series over 80 days."""
+    create_raw_data(tmp_path, n_days=80)
+    return tmp_path
+
+
+@pytest.fixture
+def make_data():
+    """
+    Factory of small train/validation splits with a categorical store column.
+
+    Call it with the number of rows `n` (the last third is held out for
+    validation) and a random `seed`.
+    """
+
+    def make(n: int = 300, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        X = pd.DataFrame(
+            {
+                "store_id": pd.Categorical(rng.choice(["CA_1", "TX_1", "WI_1"], n)),
+                "lag_7": rng.normal(size=n).astype("float32"),
+                "lag_28": rng.normal(size=n),
+            }
+        )
+        y = pd.Series(rng.poisson(3, n).astype("float32"))
+        split = n * 2 // 3
+        return X[:split], y[:split], X[split:].copy(), y[split:]
+
+    return make
+
+
+@pytest.fixture
+def synthetic_feature_store(tmp_path):
+    """Feature store of 20 synthetic series over 150 days, and its category schema."""
+    raw = generate_m5_data(tmp_path / "raw", n_series=20, n_days=150)
+    sales = load_sales_data(raw, start_date_train=1, use_cache=False)
+    schema = build_category_schema(sales)
+    features = build_features(
+        sales,
+        load_calendar_data(raw, use_cache=False),
+        load_sell_prices(raw, use_cache=False),
+        schema,
+    )
+    store = tmp_path / "feature_store"
+    write_partition(features, store)
+    write_manifest(store)
+    return store, schema
+
+
+@pytest.fixture(autouse=True)
+def profiling_dir(tmp_path, monkeypatch):
+    """Keep the live stage log of profiled code out of the data directory."""
+    monkeypatch.setattr(codes.profiling, "PROFILING_DIR", tmp_path / "profiling")
+    codes.profiling.reset_profile()
+    return tmp_path / "profiling"
+
+
+@pytest.fixture(autouse=True)
+def dataset_cache_dir(tmp_path, monkeypatch):
+    """Write binned LightGBM Datasets to a temporary directory."""
+    monkeypatch.setattr(
+        codes.models.dataset_cache, "DATASET_CACHE_DIR", tmp_path / "lgb_datasets"
+    )
+    codes.models.dataset_cache.clear_dataset_cache()
+    return tmp_path / "lgb_datasets"
+
+
+@pytest.fixture(autouse=True)
+def trial_store_dir(tmp_path, monkeypatch):
+    """Persist hyperopt trials to a temporary directory."""
+    monkeypatch.setattr(
+        codes.tuning.trial_store, "TRIAL_STORE_DIR", tmp_path / "hyperopt_trials"
+    )
+    return tmp_path / "hyperopt_trials"
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import codes.backtesting
+from codes.backtesting import aggregate_metrics, fold_bounds, run_backtest
+from codes.config import END_DATE_TRAIN
+
+
+class FakeTracker:
+    """Records the runs and metrics logged through get_mlflow_logger()."""
+
+    def __init__(self):
+        self.runs, self.metrics = {}, {}
+
+    def start_run(self, run_name=None, parent=None):
+        self.runs[run_name] = parent
+        return run_name
+
+    def log_params(self, run, params):
+        pass
+
+    def log_metrics(self, run, metrics, step=0):
+        self.metrics.setdefault(run, {}).update(metrics)
+
+    def end_run(self, run, status="FINISHED"):
+        pass
+
+
+def test_fold_bounds():
+    assert fold_bounds(3, 28, 14, None, 1500, 1800) == [
+        (1500, 1744, 1772), (1500, 1758, 1786), (1500, 1772, 1800)
+    ]
+    assert fold_bounds(2, 28, 28, 100, 1500, 1800)[0] == (1644, 1744, 1772)
+    with pytest.raises(ValueError):
+        fold_bounds(3, 28, 28, None, 1750, 1800)
+    # Validated before the tuning window [END_DATE_TRAIN, END_DATE_VAL)
+    assert fold_bounds()[-1][2] == END_DATE_TRAIN
+
+
+def test_aggregate_metrics():
+    aggregate = aggregate_metrics([{"MASE": 1.0}, {"MASE": 3.0}])
+    assert aggregate == {"MASE_mean": 2.0, "MASE_std": 1.0}
+
+
+def test_run_backtest(tmp_path, monkeypatch, synthetic_feature_store):
+    store, schema = synthetic_feature_store
+    tracker = FakeTracker()
+    monkeypatch.setattr(codes.backtesting, "get_mlflow_logger", lambda: tracker)
+
+    params = {"learning_rate": 0.1, "num_leaves": 8, "min_data_in_leaf": 5}
+    folds = fold_bounds(3, 14, 14, None, 30, 151)
+    fold_metrics, aggregate = run_backtest(
+        store, params, folds, n_jobs=2, data_dir=tmp_path / "backtest", schema=schema
+    )
+
+    assert len(fold_metrics) == 3
+    assert all(np.isfinite(m["MASE"]) for m in fold_metrics)
+    assert aggregate["MASE_mean"] == pytest.approx(np.mean([m["MASE"] for m in fold_metrics]))
+    assert tracker.runs == {"backtest": None, **{f"fold_{k}": "backtest" for k in range(3)}}
+    assert tracker.metrics["backtest"] == aggregate
@@ -0,0 +1,39 @@
+import pandas as pd
+
+from codes.data_handling.category_schema import (
+    build_category_schema,
+    save_category_schema,
+    load_category_schema,
+    apply_category_schema,
+)
+
+
+def test_build_category_schema_keeps_existing_codes(tmp_path):
+    ids = pd.DataFrame({"store_id": ["TX_1", "CA_1", "TX_1"]})
+    schema = build_category_schema(ids, columns=["store_id"])
+    assert schema == {"store_id": ["CA_1", "TX_1"]}
+
+    more = pd.DataFrame({"store_id": ["WI_1", "AA_1", "CA_1"]})
+    extended = build_category_schema(more, columns=["store_id"], base=schema)
+    assert extended == {"store_id": ["CA_1", "TX_1", "AA_1", "WI_1"]}
+
+    path = save_category_schema(extended, tmp_path / "schema.json")
+    assert load_category_schema(path) == extended
+    assert load_category_schema(tmp_path / "missing.json") is None
+
+
+def test_apply_category_schema():
+    schema = {"store_id": ["TX_1", "CA_1"], "item_id": ["B", "A"]}
+    df = pd.DataFrame(
+        {
+            "store_id": ["CA_1", "XX_9", "TX_1"],
+            "item_id": pd.Categorical(["A", "B", "A"]),
+            "sales": [1, 2, 3],
+        }
+    )
+    df = apply_category_schema(df, schema)
+
+    assert df["store_id"].cat.categories.tolist() == ["TX_1", "CA_1"]
+    assert df["store_id"].cat.codes.tolist() == [1, -1, 0]
+    assert df["item_id"].cat.codes.tolist() == [1, 0, 1]
+    assert df["sales"].tolist() == [1, 2, 3]
@@ -50,3 +50,32 @@ def test_missing_file():
         tmp_path = Path(tmpdir)
         with pytest.raises(FileNotFoundError):
             load_calendar_data(raw_data_dir=tmp_path)
+
+
+def test_load_sales_data_builds_and_reuses_cache():
+    with TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        dummy_data = "id,item_id,store_id,d_1,d_2,d_3\nFOO,FOO_1,CA_1,1,2,3"
+        create_dummy_csv(tmp_path / "sales_train_validation.csv", dummy_data)
+
+        df = load_sales_data(raw_data_dir=tmp_path, start_date_train=2, use_cache=True)
+        assert (tmp_path / "sales_train_validation.parquet").exists()
+        assert str(df["d_2"].dtype) == "int16"
+        assert str(df["item_id"].dtype) == "category"
+
+        # Later loads are served from the cache with column projection
+        (tmp_path / "sales_train_validation.csv").unlink()
+        df = load_sales_data(raw_data_dir=tmp_path, start_date_train=3, use_cache=True)
+        assert list(df.columns) == ["id", "item_id", "store_id", "d_3"]
+        assert df.loc[0, "d_3"] == 3
+
+
+def test_load_sell_prices_without_cache():
+    with TemporaryDirectory() as tmpdir:
+        tmp_path = Path(tmpdir)
+        dummy_data = "store_id,item_id,wm_yr_wk,sell_price\nCA_1,FOO_1,11101,1.5"
+        create_dummy_csv(tmp_path / "sell_prices.csv", dummy_data)
+
+        df = load_sell_prices(raw_data_dir=tmp_path, use_cache=False)
+        assert not (tmp_path / "sell_prices.parquet").exists()
+        assert str(df["sell_price"].dtype) == "float32"
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from codes.data_handling.data_splitter import sort_by_day, day_slices, split_by_day
+
+
+def test_sort_by_day_is_stable():
+    df = pd.DataFrame({"d_idx": [2, 1, 2, 1], "id": ["A", "A", "B", "B"]})
+    sorted_df = sort_by_day(df)
+    assert sorted_df["d_idx"].tolist() == [1, 1, 2, 2]
+    assert sorted_df["id"].tolist() == ["A", "B", "A", "B"]
+    assert sort_by_day(sorted_df) is sorted_df
+
+
+def test_day_slices_open_ended():
+    days = np.array([1, 1, 2, 3, 3, 5])
+    slices = day_slices(days, [2, 3, None])
+    assert [(s.start, s.stop) for s in slices] == [(2, 3), (3, 6)]
+
+
+def test_split_by_day():
+    df = pd.DataFrame({"d_idx": np.repeat(np.arange(10, 20), 2), "sales": range(20)})
+    train, valid, test = split_by_day(df, [12, 15, 18, None])
+    assert sorted(set(train["d_idx"])) == [12, 13, 14]
+    assert sorted(set(valid["d_idx"])) == [15, 16, 17]
+    assert sorted(set(test["d_idx"])) == [18, 19]
@@ -0,0 +1,89 @@
+import os
+
+import lightgbm as lgb
+import numpy as np
+
+from codes.models.dataset_cache import (
+    get_datasets,
+    dataset_params,
+    frame_fingerprint,
+    clear_dataset_cache,
+    dataset_key,
+    evict_datasets,
+)
+
+
+def train(train_set, valid_set, **params):
+    params = {"objective": "regression", "verbose": -1, **params}
+    return lgb.train(params, train_set, num_boost_round=5, valid_sets=[valid_set])
+
+
+def test_datasets_are_shared_across_trials(dataset_cache_dir, make_data):
+    X_train, y_train, X_valid, y_valid = make_data()
+
+    first = get_datasets(X_train, y_train, X_valid, y_valid, {"min_data_in_leaf": 20})
+    second = get_datasets(X_train, y_train, X_valid, y_valid, {"min_data_in_leaf": 5})
+    assert first[0] is second[0] and first[1] is second[1]
+    assert len(list(dataset_cache_dir.glob("*.bin"))) == 2
+
+    # Trial parameters that do not affect binning can change between fits
+    train(*first, min_data_in_leaf=20, num_leaves=7)
+    train(*second, min_data_in_leaf=5, num_leaves=15)
+
+    rebinned = get_datasets(X_train, y_train, X_valid, y_valid, {"max_bin": 15})
+    assert rebinned[0] is not first[0]
+    assert len(list(dataset_cache_dir.glob("*.bin"))) == 4
+
+
+def test_binary_files_reproduce_the_model(make_data):
+    X_train, y_train, X_valid, y_valid = make_data()
+    fresh = train(*get_datasets(X_train, y_train, X_valid, y_valid, {}))
+
+    clear_dataset_cache()
+    loaded_sets = get_datasets(X_train, y_train, X_valid, y_valid, {})
+    assert loaded_sets[0].pandas_categorical == [["CA_1", "TX_1", "WI_1"]]
+    loaded = train(*loaded_sets)
+
+    np.testing.assert_allclose(loaded.predict(X_valid), fresh.predict(X_valid))
+
+
+def test_fingerprint_and_binning_params(make_data):
+    X_train, y_train, _, _ = make_data()
+    assert frame_fingerprint(X_train, y_train) == frame_fingerprint(
+        X_train.copy(), y_train.copy()
+    )
+    assert frame_fingerprint(X_train, y_train) != frame_fingerprint(X_train, y_train + 1)
+
+    assert dataset_params({"num_leaves": 31, "max_bin": 63}) == {
+        "feature_pre_filter": False,
+        "verbose": -1,
+        "max_bin": 63,
+    }
+    assert dataset_params({"feature_pre_filter": True, "min_data_in_leaf": 20.0})[
+        "min_data_in_leaf"
+    ] == 20
+
+
+def test_least_recently_used_keys_are_evicted(dataset_cache_dir, make_data):
+    X_train, y_train, X_valid, y_valid = make_data()
+
+    keys = []
+    for use, max_bin in enumerate((15, 31, 63)):
+        get_datasets(X_train, y_train, X_valid, y_valid, {"max_bin": max_bin})
+        key = dataset_key(X_train, y_train, X_valid, y_valid, {"max_bin": max_bin})
+        # Arrays the parallel trials share are evicted with their key
+        np.save(dataset_cache_dir / f"{key}_y_valid.npy", y_valid.to_numpy())
+        for path in dataset_cache_dir.glob(f"{key}*"):
+            os.utime(path, (use, use))
+        keys.append(key)
+
+    # Loading the oldest key marks it as used
+    clear_dataset_cache()
+    get_datasets(X_train, y_train, X_valid, y_valid, {"max_bin": 15})
+
+    assert evict_datasets(max_keys=2) == [keys[1]]
+    assert not list(dataset_cache_dir.glob(f"{keys[1]}*"))
+    assert len(list(dataset_cache_dir.iterdir())) == 2 * 4
+
+    clear_dataset_cache(remove_files=True)
+    assert not list(dataset_cache_dir.iterdir())
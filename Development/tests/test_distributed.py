@@ -0,0 +1,49 @@
+import json
+import socket
+
+import numpy as np
+import pytest
+
+from codes.models.distributed import partition_days, train_distributed
+from codes.retraining import new_days_split
+
+
+def free_ports(n: int):
+    sockets = [socket.socket() for _ in range(n)]
+    for s in sockets:
+        s.bind(("127.0.0.1", 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def test_partition_days_cover_the_date_range():
+    days = partition_days(10, 40, 4)
+    assert sorted(sum(days, [])) == list(range(10, 40))
+    assert [(min(d), max(d)) for d in days] == [(10, 38), (11, 39), (12, 36), (13, 37)]
+
+
+def test_train_distributed_on_localhost(tmp_path, synthetic_feature_store):
+    store, schema = synthetic_feature_store
+    X_train, y_train, X_valid, y_valid, _ = new_days_split(40, store, 14, schema)
+    machines = [f"127.0.0.1:{port}" for port in free_ports(2)]
+    model, metrics, predictions = train_distributed(
+        X_train, y_train, X_valid, y_valid,
+        {"num_leaves": 8, "learning_rate": 0.2, "best_iteration": 15},
+        machines=machines, data_dir=tmp_path / "job", time_out=1,
+        feature_store=store, train_days=(40, 137),
+    )
+
+    # Only the job settings are written; the workers read the store
+    assert sorted(p.name for p in (tmp_path / "job").iterdir()) == ["job.json", "model.txt"]
+    with open(tmp_path / "job" / "job.json") as f:
+        assert 20 * sum(len(days) for days in json.load(f)["days"]) == len(X_train)
+    assert metrics["num_boost_round"] == 15
+    assert metrics["rmse"] < y_valid.std()
+    np.testing.assert_allclose(model.predict(X_valid), predictions)
+
+
+def test_train_distributed_rejects_feature_parallel(tmp_path, make_data):
+    with pytest.raises(ValueError):
+        train_distributed(*make_data(), {}, tree_learner="feature", data_dir=tmp_path)
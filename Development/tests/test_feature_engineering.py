@@ -1,9 +1,15 @@
+import numpy as np
 import pandas as pd
 from codes.feature_engineering import (
     melt_sales_data,
     add_lag_features,
     add_rolling_features,
+    add_window_features,
+    compute_window_features,
+    merge_calendar,
+    merge_prices,
     add_date_features,
+    add_calendar_features,
 )
 
 
@@ -25,6 +31,24 @@ def test_melt_sales_data():
     assert melted.shape[0] == 2
 
 
+def test_melt_sales_data_matches_pandas_melt():
+    id_columns = ["id", "item_id", "dept_id", "cat_id", "store_id", "state_id"]
+    wide = pd.DataFrame({col: [f"{col}_b", f"{col}_a", f"{col}_b"] for col in id_columns})
+    wide["id"] = ["x", "y", "z"]
+    for i in range(5, 9):
+        wide[f"d_{i}"] = np.arange(3, dtype="int16") + i
+
+    melted = melt_sales_data(wide, schema={"store_id": ["store_id_b", "store_id_a"]})
+    expected = wide.melt(id_vars=id_columns, var_name="d", value_name="sales")
+
+    assert melted["store_id"].cat.categories.tolist() == ["store_id_b", "store_id_a"]
+    assert melted["item_id"].cat.categories.tolist() == ["item_id_a", "item_id_b"]
+    assert melted["d_idx"].dtype == np.int16 and melted["sales"].dtype == np.int16
+    for col in id_columns + ["d", "sales"]:
+        assert melted[col].astype(expected[col].dtype).tolist() == expected[col].tolist()
+    assert melted["d_idx"].tolist() == [int(d[2:]) for d in expected["d"]]
+
+
 def test_add_lag_features():
     df = pd.DataFrame({"id": ["A"] * 5, "sales": [10, 20, 30, 40, 50]})
     lagged = add_lag_features(df.copy(), lags=[2])
@@ -44,3 +68,75 @@ def test_add_date_features():
     df = add_date_features(df)
     assert "weekday" in df.columns
     assert df.loc[0, "weekday"] == 2  # Jan 1, 2020 was Wednesday
+
+
+def test_compute_window_features():
+    sales = np.arange(10, dtype=np.float32).reshape(1, 10)
+    features = compute_window_features(sales, lags=[2], windows=[3], base_lag=2)
+    assert np.isnan(features["lag_2"][0, 1])
+    assert features["lag_2"][0, 2] == 0
+    # rolling mean of lag_2 over 3 days: first valid at day 4 -> mean(0, 1, 2)
+    assert np.isnan(features["rolling_mean_3"][0, 3])
+    assert features["rolling_mean_3"][0, 4] == 1
+
+
+def test_add_window_features_matches_groupby():
+    rng = np.random.default_rng(0)
+    wide = pd.DataFrame(rng.poisson(2, (4, 60)), columns=[f"d_{i}" for i in range(60)])
+    for col in ["id", "item_id", "dept_id", "cat_id", "store_id", "state_id"]:
+        wide[col] = [f"{col}_{i}" for i in range(4)]
+    df = melt_sales_data(wide)
+
+    expected = add_rolling_features(add_lag_features(df.copy()))
+    for frame in [df, df.sort_values("id", kind="stable")]:
+        result = add_window_features(frame.copy()).loc[expected.index]
+        for col in ["lag_7", "lag_28", "rolling_mean_7", "rolling_mean_28"]:
+            np.testing.assert_allclose(result[col], expected[col], rtol=1e-6)
+
+
+def test_merge_calendar_by_day_index():
+    df = pd.DataFrame({"d": ["d_3", "d_1", "d_3", "d_9"]})
+    calendar = pd.DataFrame(
+        {"d": ["d_1", "d_2", "d_3"], "wm_yr_wk": [11101, 11101, 11102]}
+    )
+    merged = merge_calendar(df, calendar)
+    assert merged["d_idx"].tolist() == [3, 1, 3, 9]
+    assert merged["wm_yr_wk"].tolist()[:3] == [11102, 11101, 11102]
+    assert pd.isna(merged.loc[3, "wm_yr_wk"])  # day missing from the calendar
+
+
+def test_merge_prices_matches_merge():
+    df = pd.DataFrame(
+        {
+            "store_id": ["CA_1", "CA_1", "TX_1", "TX_1"],
+            "item_id": ["A", "B", "A", "C"],
+            "wm_yr_wk": [11101, 11102, 11101, 11101],
+        }
+    )
+    prices = pd.DataFrame(
+        {
+            "store_id": ["CA_1", "CA_1", "TX_1"],
+            "item_id": ["A", "B", "A"],
+            "wm_yr_wk": [11101, 11101, 11101],
+            "sell_price": [1.5, 2.0, 3.0],
+        }
+    )
+    expected = df.merge(prices, on=["store_id", "item_id", "wm_yr_wk"], how="left")
+    for max_dense_size in [1_000, 1]:
+        merged = merge_prices(df.copy(), prices, max_dense_size=max_dense_size)
+        np.testing.assert_allclose(merged["sell_price"], expected["sell_price"])
+
+
+def test_add_calendar_features_are_compact():
+    calendar = pd.DataFrame(
+        {"d": ["d_1", "d_2"], "date": ["2011-01-29", "2011-01-30"], "snap_CA": [0, 1]}
+    )
+    calendar = add_calendar_features(calendar)
+    assert calendar["weekday"].tolist() == [5, 6]
+    assert calendar["year"].dtype == np.int16
+    assert calendar["week"].dtype == np.int8
+    assert calendar["snap_CA"].dtype == np.int8
+
+    merged = merge_calendar(pd.DataFrame({"d": ["d_2", "d_1"]}), calendar)
+    assert merged["weekday"].tolist() == [6, 5]
+    assert merged["month"].dtype == np.int8
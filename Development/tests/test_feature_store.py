@@ -0,0 +1,77 @@
+from tempfile import TemporaryDirectory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from codes.data_handling.feature_store import (
+    raw_data_fingerprint,
+    write_feature_store,
+    read_feature_store,
+    read_manifest,
+)
+
+
+def make_features(n_days: int = 10) -> pd.DataFrame:
+    stores = ["CA_1", "TX_1"]
+    return pd.DataFrame(
+        {
+            "store_id": pd.Categorical(np.tile(stores, n_days)),
+            "d_idx": np.repeat(np.arange(1, n_days + 1), len(stores)).astype("int16"),
+            "sales": np.arange(n_days * len(stores), dtype="int16"),
+            "lag_7": np.linspace(0, 1, n_days * len(stores), dtype="float32"),
+        }
+    )
+
+
+def test_write_feature_store_manifest():
+    with TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / "store"
+        manifest = write_feature_store(
+            make_features(), root, fingerprint="abc", day_bucket_size=4
+        )
+        assert manifest == read_manifest(root)
+        assert manifest["fingerprint"] == "abc"
+        assert manifest["num_rows"] == 20
+        assert (manifest["first_day"], manifest["last_day"]) == (1, 10)
+        assert manifest["stores"] == ["CA_1", "TX_1"]
+        assert (root / "day_bucket=4" / "store_id=CA_1").is_dir()
+
+
+def test_read_feature_store_day_range_and_columns():
+    with TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir) / "store"
+        write_feature_store(make_features(), root, day_bucket_size=4)
+
+        df = read_feature_store(
+            root, columns=["d_idx", "sales"], start_day=3, end_day=6, stores=["TX_1"]
+        )
+        assert list(df.columns) == ["d_idx", "sales"]
+        assert sorted(df["d_idx"].tolist()) == [3, 4, 5]
+        assert sorted(df["sales"].tolist()) == [5, 7, 9]
+
+
+def test_read_feature_store_without_manifest():
+    with TemporaryDirectory() as tmpdir:
+        with pytest.raises(FileNotFoundError):
+            read_feature_store(Path(tmpdir))
+
+
+def test_raw_data_fingerprint_covers_whole_files(tmp_path):
+    raw, cache = tmp_path / "raw", tmp_path / "_raw_digests.json"
+    raw.mkdir()
+    for name in ["sales_train_validation.csv", "calendar.csv", "sell_prices.csv"]:
+        (raw / name).write_bytes(b"x" * (3 << 20))
+    before = raw_data_fingerprint(raw, 1, cache)
+
+    # Same content downloaded again: same fingerprint
+    (raw / "calendar.csv").write_bytes(b"x" * (3 << 20))
+    assert raw_data_fingerprint(raw, 1, cache) == before
+
+    # Same-size edit in the middle of a file
+    prices = bytearray((raw / "sell_prices.csv").read_bytes())
+    prices[len(prices) // 2] = ord("y")
+    (raw / "sell_prices.csv").write_bytes(bytes(prices))
+    assert raw_data_fingerprint(raw, 1, cache) != before
+    assert cache.exists()
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+from codes.metrics.hierarchy import (
+    LEVELS,
+    WEIGHT_DAYS,
+    build_wrmsse_evaluator,
+    level_name,
+    summing_matrix,
+)
+
+
+def _hierarchy_frame(n_days, rng):
+    """Day-major long frame of 2 states x 2 stores x 2 cats x 2 depts x 2 items."""
+    ids = []
+    for store in range(4):
+        for item in range(8):
+            ids.append({
+                "state_id": f"ST{store // 2}",
+                "store_id": f"S{store}",
+                "cat_id": f"C{item // 4}",
+                "dept_id": f"D{item // 2}",
+                "item_id": f"I{item}",
+            })
+    ids = pd.DataFrame(ids)
+    frame = pd.concat([ids] * n_days, ignore_index=True).astype("category")
+    frame["sell_price"] = rng.uniform(1, 5, len(frame))
+    frame["day"] = np.repeat(np.arange(n_days), len(ids))
+    return frame, rng.poisson(1.5, len(frame)).astype(float)
+
+
+def _brute_force_wrmsse(train, y_train, valid, y_valid, y_pred):
+    train = train.assign(y=y_train, total=0)
+    valid = valid.assign(y=y_valid, p=y_pred, total=0)
+    train["dollars"] = train["y"] * train["sell_price"]
+    recent = train[train["day"] > train["day"].max() - WEIGHT_DAYS]
+    score = 0.0
+    for level in LEVELS:
+        keys = list(level) or ["total"]
+        history = train.groupby(keys + ["day"], observed=True)["y"].sum()
+        actual = valid.groupby(keys + ["day"], observed=True)[["y", "p"]].sum()
+        dollars = recent.groupby(keys, observed=True)["dollars"].sum()
+        for key in dollars.index:
+            h = history.loc[key].to_numpy()
+            h = h[np.argmax(h > 0):]
+            scale = np.mean(np.diff(h) ** 2)
+            if scale == 0:
+                continue
+            a = actual.loc[key]
+            rmsse = np.sqrt(np.mean((a["y"] - a["p"]) ** 2) / scale)
+            score += dollars.loc[key] / dollars.sum() * rmsse / len(LEVELS)
+    return score
+
+
+def test_summing_matrix_counts_series_of_every_level():
+    rng = np.random.default_rng(0)
+    frame, _ = _hierarchy_frame(1, rng)
+    S, level_of = summing_matrix(frame)
+
+    # 1 + 2 + 4 + 2 + 4 + 4 + 8 + 8 + 16 + 8 + 16 + 32
+    assert S.shape == (105, 32)
+    assert np.bincount(level_of).tolist() == [1, 2, 4, 2, 4, 4, 8, 8, 16, 8, 16, 32]
+    # Every bottom series appears once per level
+    assert (np.asarray(S.sum(axis=0)) == len(LEVELS)).all()
+    assert level_name(LEVELS[0]) == "total" and level_name(LEVELS[-1]) == "store_id/item_id"
+
+
+def test_wrmsse_matches_brute_force():
+    rng = np.random.default_rng(1)
+    train, y_train = _hierarchy_frame(60, rng)
+    valid, y_valid = _hierarchy_frame(7, rng)
+    y_valid[:32] = 0  # zero sales do not break the scales
+    y_pred = y_valid + rng.normal(0, 1, len(y_valid))
+    features = ["state_id", "store_id", "cat_id", "dept_id", "item_id", "sell_price"]
+
+    evaluator = build_wrmsse_evaluator(
+        train[features], y_train, valid[features], y_valid
+    )
+    assert evaluator(y_valid) == 0.0
+    assert np.isclose(
+        evaluator(y_pred),
+        _brute_force_wrmsse(train, y_train, valid, y_valid, y_pred),
+    )
+    levels = evaluator.level_scores(y_pred)
+    assert np.isclose(sum(levels.values()) / len(LEVELS), evaluator(y_pred))
+    assert evaluator.feval(y_pred, None) == ("WRMSSE", evaluator(y_pred), False)
+
+
+def test_wrmsse_evaluator_needs_ids():
+    X = pd.DataFrame({"f0": np.arange(10.0)})
+    assert build_wrmsse_evaluator(X, np.ones(10), X, np.ones(10)) is None
@@ -0,0 +1,44 @@
+import pandas as pd
+
+from codes.data_handling.data_loader import (
+    load_sales_data,
+    load_calendar_data,
+    load_sell_prices,
+)
+from codes.data_handling.feature_store import (
+    write_feature_store,
+    read_feature_store,
+    save_window_state,
+)
+from codes.feature_engineering import build_features, window_history_days
+from codes.data_handling.category_schema import load_category_schema
+from codes.incremental import can_refresh, refresh_feature_store
+
+
+def test_refresh_feature_store_matches_full_build(raw_data_dir):
+    root = raw_data_dir / "feature_store"
+    full_sales = load_sales_data(raw_data_dir, start_date_train=1)
+    calendar = load_calendar_data(raw_data_dir)
+    prices = load_sell_prices(raw_data_dir)
+    expected = build_features(full_sales, calendar, prices)
+
+    # Build the store on the first 70 days, then receive 10 new days
+    sales = full_sales.drop(columns=[f"d_{i}" for i in range(71, 81)])
+    write_feature_store(build_features(sales, calendar, prices), root)
+    save_window_state(sales, window_history_days(), root)
+    assert can_refresh(root, start_date_train=1)
+
+    schema_path = raw_data_dir / "category_schema.json"
+    assert refresh_feature_store(root, raw_data_dir, schema_path=schema_path) == 10
+    assert refresh_feature_store(root, raw_data_dir, schema_path=schema_path) == 0
+    assert len(load_category_schema(schema_path)["id"]) == 3
+
+    result = read_feature_store(root)
+    assert len(result) == len(expected)
+    keys = ["id", "d_idx"]
+    columns = ["sales", "sell_price", "lag_7", "lag_28", "rolling_mean_28"]
+    pd.testing.assert_frame_equal(
+        result.sort_values(keys)[columns].reset_index(drop=True),
+        expected.sort_values(keys)[columns].reset_index(drop=True),
+        check_dtype=False,
+    )
@@ -0,0 +1,47 @@
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pytest
+
+from codes.models.matrix import (
+    as_matrix,
+    build_matrix,
+    matrix_dataset,
+    register_matrix,
+)
+
+PARAMS = {"objective": "regression", "verbose": -1, "min_data_in_leaf": 5}
+
+
+def test_build_matrix(make_data):
+    _, _, X_valid, _ = make_data()
+    X_valid.loc[X_valid.index[0], "store_id"] = np.nan
+    matrix = build_matrix(X_valid)
+
+    assert matrix.dtype == np.float32 and matrix.flags.c_contiguous
+    assert np.isnan(matrix[0, 0])
+    np.testing.assert_array_equal(matrix[1:, 0], X_valid["store_id"].cat.codes[1:])
+    np.testing.assert_allclose(matrix[:, 2], X_valid["lag_28"], rtol=1e-6)
+
+
+def test_as_matrix_reuses_registered_matrix(make_data):
+    X_train, _, X_valid, _ = make_data()
+    matrix = build_matrix(pd.concat([X_train, X_valid]))
+    register_matrix(X_train, matrix[:200])
+
+    assert np.shares_memory(as_matrix(X_train), matrix)
+    assert as_matrix(X_valid) is as_matrix(X_valid)
+    with pytest.raises(ValueError):
+        register_matrix(X_valid, matrix)
+
+
+def test_matrix_model_predicts_like_dataframe(make_data):
+    X_train, y_train, X_valid, _ = make_data()
+    X_valid.loc[X_valid.index[0], "store_id"] = np.nan
+    on_frame = lgb.train(PARAMS, lgb.Dataset(X_train, label=y_train), 5)
+    on_matrix = lgb.train(PARAMS, matrix_dataset(X_train, y_train, {}), 5)
+
+    expected = on_frame.predict(X_valid)
+    np.testing.assert_allclose(on_matrix.predict(as_matrix(X_valid)), expected)
+    np.testing.assert_allclose(on_matrix.predict(X_valid), expected)
+    np.testing.assert_allclose(on_frame.predict(build_matrix(X_valid)), expected)
@@ -24,3 +24,82 @@ def test_mase_finite_value():
     y_true = np.array([10, 12, 14, 16, 18])
     y_pred = np.array([11, 13, 15, 17, 19])
     assert 0 < mase(y_true, y_pred) < 1.5
+
+
+def test_mase_lgb_metric_matches_mase():
+    import lightgbm as lgb
+    from codes.metrics.lgb_metrics import mase_lgb_metric, make_mase_feval
+
+    rng = np.random.default_rng(0)
+    y = rng.poisson(3, 50).astype("float32")
+    data = lgb.Dataset(rng.normal(size=(50, 2)), label=y).construct()
+    preds = rng.uniform(0, 5, 50)
+
+    assert np.isclose(mase_lgb_metric(preds, data)[1], mase(y, preds))
+
+    feval = make_mase_feval(every_k=2)
+    values = [feval(preds * (i + 1), data)[1] for i in range(4)]
+    assert values[0] == values[1] and values[2] == values[3]
+    assert np.isclose(values[2], mase(y, preds * 3))
+
+
+def _long_format(sales):
+    """Day-major long frame of a (series x days) sales array, with store/item ids."""
+    import pandas as pd
+
+    n_series, n_days = sales.shape
+    stores = pd.Categorical(np.tile([f"S{i % 2}" for i in range(n_series)], n_days))
+    items = pd.Categorical(np.tile([f"I{i // 2}" for i in range(n_series)], n_days))
+    X = pd.DataFrame({"store_id": stores, "item_id": items})
+    return X, sales.T.ravel()
+
+
+def test_series_mase_matches_loop():
+    from codes.metrics.error_metrics import (
+        series_codes, series_scale, series_mase, series_rmsse,
+    )
+
+    rng = np.random.default_rng(0)
+    history = rng.poisson(2, (6, 30)).astype(float)
+    history[0, :5] = 0  # leading zeros are not part of the scale
+    future = rng.poisson(2, (6, 7)).astype(float)
+    preds = future + rng.normal(size=future.shape)
+
+    X_train, y_train = _long_format(history)
+    X_valid, y_valid = _long_format(future)
+    codes, n_series = series_codes(X_train)
+    scale = series_scale(y_train, codes, n_series)
+    scale_sq = series_scale(y_train, codes, n_series, squared=True)
+    valid_codes = series_codes(X_valid)[0]
+
+    expected_mase, expected_rmsse = [], []
+    for h, f, p in zip(history, future, preds):
+        h = h[np.argmax(h > 0):]
+        expected_mase.append(np.mean(np.abs(f - p)) / np.mean(np.abs(np.diff(h))))
+        expected_rmsse.append(
+            np.sqrt(np.mean((f - p) ** 2) / np.mean(np.diff(h) ** 2))
+        )
+
+    assert np.isclose(
+        series_mase(y_valid, preds.T.ravel(), valid_codes, scale),
+        np.mean(expected_mase),
+    )
+    assert np.isclose(
+        series_rmsse(y_valid, preds.T.ravel(), valid_codes, scale_sq),
+        np.mean(expected_rmsse),
+    )
+
+
+def test_series_metrics_skip_series_without_scale():
+    from codes.metrics.error_metrics import regression_metrics, series_metric_inputs
+
+    history = np.ones((4, 10))
+    history[1] = np.arange(10)
+    X_train, y_train = _long_format(history)
+    X_valid, y_valid = _long_format(np.ones((4, 3)))
+
+    series = series_metric_inputs(X_train, y_train, X_valid)
+    metrics = regression_metrics(y_valid, y_valid + 1, series)
+    # Only the non-constant series has a naive-forecast scale
+    assert metrics["MASE"] == 1.0 and metrics["RMSSE"] == 1.0
+    assert series_metric_inputs(X_train.astype(str), y_train, X_valid) is None
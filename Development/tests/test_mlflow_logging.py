@@ -0,0 +1,124 @@
+import threading
+from types import SimpleNamespace
+
+from mlflow.exceptions import MlflowException
+from mlflow.protos.databricks_pb2 import INVALID_PARAMETER_VALUE
+
+from codes.models.mlflow_logging import AsyncMlflowLogger
+
+
+class FakeClient:
+    """Records the MlflowClient calls the logger makes."""
+
+    def __init__(self, fail: bool = False, gate: threading.Event = None, reject=()):
+        self.fail, self.gate, self.reject = fail, gate, set(reject)
+        self.runs, self.batches, self.ended = {}, [], {}
+
+    def _call(self):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise ConnectionError("tracking server down")
+
+    def get_experiment_by_name(self, name):
+        self._call()
+        return SimpleNamespace(experiment_id="1")
+
+    def create_run(self, experiment_id, start_time=None, tags=None, run_name=None):
+        self._call()
+        run_id = f"run{len(self.runs)}"
+        self.runs[run_id] = tags
+        return SimpleNamespace(info=SimpleNamespace(run_id=run_id))
+
+    def log_batch(self, run_id, metrics=(), params=()):
+        self._call()
+        if self.reject & {p.key for p in params}:
+            raise MlflowException("param changed", error_code=INVALID_PARAMETER_VALUE)
+        self.batches.append((run_id, list(metrics), list(params)))
+
+    def set_terminated(self, run_id, status, end_time=None):
+        self._call()
+        self.ended[run_id] = status
+
+
+def _log_sweep(tracker, n_trials=3):
+    sweep = tracker.start_run(run_name="sweep")
+    for i in range(n_trials):
+        trial = tracker.start_run(parent=sweep)
+        tracker.log_params(trial, {"num_leaves": 31 + i, "learning_rate": 0.1})
+        tracker.log_metrics(trial, {"MASE": 1.0 / (i + 1), "rmse": 2.0})
+        tracker.end_run(trial)
+    tracker.log_metrics(sweep, {"best": 0.5})
+    tracker.end_run(sweep)
+
+
+def test_logs_are_batched_in_background(tmp_path):
+    gate = threading.Event()
+    client = FakeClient(gate=gate)
+    tracker = AsyncMlflowLogger(spool_file=tmp_path / "spool.jsonl", client=client)
+
+    _log_sweep(tracker)  # returns while the client is still blocked
+    tracker.log_metrics(tracker.attach("existing"), {"a": 1.0})
+    tracker.log_metrics("existing", {"b": 2.0})
+    gate.set()
+    assert tracker.flush(timeout=5)
+    tracker.close()
+
+    assert len(client.runs) == 4 and set(client.ended.values()) == {"FINISHED"}
+    trial_tags = list(client.runs.values())[1:]
+    assert all(tags["mlflow.parentRunId"] == "run0" for tags in trial_tags)
+    # One request per run: params and metrics of a run are merged
+    assert len(client.batches) == 5
+    existing = [b for b in client.batches if b[0] == "existing"][0]
+    assert [m.key for m in existing[1]] == ["a", "b"]
+    assert not (tmp_path / "spool.jsonl").exists()
+
+
+def test_unreachable_server_spools_and_syncs_later(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    down = FakeClient(fail=True)
+    tracker = AsyncMlflowLogger(spool_file=spool, asynchronous=False, client=down)
+    _log_sweep(tracker, n_trials=2)  # never raises
+    tracker.close()
+    assert spool.exists() and tracker.offline
+
+    up = FakeClient()
+    AsyncMlflowLogger(spool_file=spool, asynchronous=False, client=up)
+    assert not spool.exists()
+    assert len(up.runs) == 3 and len(up.ended) == 3
+    params = {p.key: p.value for _, _, ps in up.batches for p in ps}
+    assert params == {"num_leaves": "32", "learning_rate": "0.1"}
+
+
+def test_rejected_operation_is_dropped(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    client = FakeClient(reject={"bad"})
+    tracker = AsyncMlflowLogger(spool_file=spool, asynchronous=False, client=client)
+    first, second = tracker.start_run(), tracker.start_run()
+    tracker.log_params(first, {"bad": 1})
+    tracker.end_run(first)
+    tracker.log_params(second, {"good": 2})
+    tracker.end_run(second)
+    tracker.close()
+
+    assert not tracker.offline and not spool.exists()
+    assert [[p.key for p in ps] for _, _, ps in client.batches] == [["good"]]
+    assert len(client.ended) == 2
+
+
+def test_goes_online_again_within_the_process(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    client = FakeClient(fail=True)
+    tracker = AsyncMlflowLogger(
+        spool_file=spool, asynchronous=False, client=client, retry_seconds=0
+    )
+    run = tracker.start_run(run_name="offline")
+    assert tracker.offline and spool.exists()
+
+    client.fail = False
+    tracker.log_metrics(run, {"MASE": 1.0})
+    tracker.end_run(run)
+
+    assert not tracker.offline and not spool.exists()
+    assert len(client.runs) == 1 and list(client.ended.values()) == ["FINISHED"]
+    assert [m.key for _, ms, _ in client.batches for m in ms] == ["MASE"]
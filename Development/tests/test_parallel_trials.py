@@ -0,0 +1,30 @@
+import numpy as np
+from hyperopt import hp
+
+from codes.tuning.parallel_trials import (
+    run_parallel_trials,
+    threads_per_trial,
+)
+
+
+def test_run_parallel_trials(dataset_cache_dir, make_data):
+    space = {
+        "learning_rate": hp.uniform("learning_rate", 0.05, 0.2),
+        "num_leaves": hp.quniform("num_leaves", 4, 16, 1),
+        "min_data_in_leaf": hp.quniform("min_data_in_leaf", 5, 20, 1),
+    }
+    results = []
+    trials = run_parallel_trials(
+        space, *make_data(), max_evals=4, n_jobs=2,
+        on_result=results.append, cache_dir=dataset_cache_dir, seed=1,
+    )
+
+    assert len(trials.trials) == 4 and len(results) == 4
+    assert all(np.isfinite(loss) for loss in trials.losses())
+    assert all(r["params"]["num_threads"] == threads_per_trial(2) for r in results)
+    assert set(trials.argmin) == set(space)
+
+
+def test_threads_per_trial():
+    assert threads_per_trial(4, n_cores=32) == 8
+    assert threads_per_trial(8, n_cores=4) == 1
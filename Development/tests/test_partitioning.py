@@ -0,0 +1,41 @@
+import pandas as pd
+
+from codes.data_handling.data_loader import (
+    load_sales_data,
+    load_calendar_data,
+    load_sell_prices,
+)
+from codes.data_handling.feature_store import (
+    clear_feature_store,
+    write_manifest,
+    read_feature_store,
+)
+from codes.feature_engineering import build_features
+from codes.partitioning import prepare_partitions
+
+
+def test_prepare_partitions_matches_single_pass(raw_data_dir):
+    root = raw_data_dir / "feature_store"
+    clear_feature_store(root)
+    values = prepare_partitions(
+        partition_key="store_id",
+        output_dir=root,
+        max_workers=2,
+        raw_data_dir=raw_data_dir,
+        start_date_train=1,
+    )
+    assert values == ["CA_1", "TX_1"]
+    write_manifest(root)
+
+    expected = build_features(
+        load_sales_data(raw_data_dir, start_date_train=1),
+        load_calendar_data(raw_data_dir),
+        load_sell_prices(raw_data_dir),
+    )
+    result = read_feature_store(root)
+    keys = ["id", "d_idx"]
+    columns = ["sales", "sell_price", "lag_7", "rolling_mean_7"]
+    pd.testing.assert_frame_equal(
+        result.sort_values(keys)[columns].reset_index(drop=True),
+        expected.sort_values(keys)[columns].reset_index(drop=True),
+    )
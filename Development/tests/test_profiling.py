@@ -0,0 +1,60 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from codes.profiling import (
+    profile_stage,
+    profiled,
+    get_profile_records,
+    write_profile_report,
+    output_size,
+)
+
+
+def test_profile_stage_records_output(profiling_dir):
+    with profile_stage("build") as stage:
+        stage.result = pd.DataFrame({"a": np.zeros(1000, dtype="float64")})
+
+    (record,) = get_profile_records()
+    assert record["stage"] == "build"
+    assert record["output_rows"] == 1000
+    assert record["output_mb"] > 0
+    assert record["wall_s"] >= 0 and record["peak_rss_mb"] > 0
+
+    with open(profiling_dir / "stages.jsonl") as f:
+        assert json.loads(f.readline())["stage"] == "build"
+
+
+def test_nested_stages_and_decorator():
+    @profiled()
+    def make_array(n):
+        return np.ones(n, dtype="float32")
+
+    with profile_stage("outer"):
+        result = make_array(10)
+
+    assert len(result) == 10
+    inner, outer = get_profile_records()
+    assert (inner["stage"], outer["stage"]) == ("make_array", "outer")
+    assert outer["peak_rss_mb"] >= inner["peak_rss_mb"]
+
+
+def test_disabled_stage_records_nothing():
+    with profile_stage("skipped", enabled=False) as stage:
+        stage.result = np.ones(3)
+    assert get_profile_records() == []
+
+
+def test_write_profile_report(tmp_path):
+    assert write_profile_report(tmp_path) is None
+    with profile_stage("a"):
+        pass
+    path = write_profile_report(tmp_path, name="run")
+    assert path.name.startswith("run_")
+    assert pd.read_csv(path.with_suffix(".csv"))["stage"].tolist() == ["a"]
+
+
+def test_output_size_of_tuple():
+    size = output_size((np.zeros(4, dtype="int8"), pd.Series([1, 2]), "other"))
+    assert size["output_rows"] == 6
@@ -0,0 +1,73 @@
+import pandas as pd
+import pytest
+
+from codes.models.train import train_lightgbm_model
+from codes.retraining import (
+    count_new_days,
+    drift_detected,
+    load_production_model,
+    new_days_split,
+    save_production_model,
+)
+
+PARAMS = {"learning_rate": 0.1, "num_leaves": 8, "min_data_in_leaf": 5}
+
+
+def test_drift_detected():
+    drift = pd.DataFrame({"day_idx": [1, 2], "sales_drift": [0.02, 0.05], "error_drift": [0.01, 0.3]})
+    assert drift_detected(drift, 0.1, ["sales_drift", "error_drift"])
+    assert not drift_detected(drift, 0.1, ["sales_drift"])
+    assert not drift_detected(drift.iloc[:0], 0.1, ["sales_drift"])
+
+
+def test_production_model_state(tmp_path):
+    path = tmp_path / "production_model.json"
+    assert load_production_model(path) is None
+    save_production_model("models:/m-1", {**PARAMS, "best_iteration": 40}, 1700, "run", path)
+    assert load_production_model(path) == {
+        "model_uri": "models:/m-1", "run_id": "run", "params": PARAMS, "train_end": 1700
+    }
+
+
+def test_new_days_split(synthetic_feature_store):
+    store, schema = synthetic_feature_store
+    X_train, y_train, X_valid, y_valid, train_end = new_days_split(80, store, 14, schema)
+
+    assert train_end == 137 and count_new_days(80, store) == 71
+    assert len(X_train) == 20 * 57 and len(X_valid) == 20 * 14
+    assert list(X_train.columns)[0] == "item_id" and len(y_train) == len(X_train)
+    with pytest.raises(ValueError):
+        new_days_split(140, store, 14, schema)
+
+
+def test_continue_training_from_init_model(synthetic_feature_store):
+    store, schema = synthetic_feature_store
+    X_train, y_train, X_valid, y_valid, _ = new_days_split(40, store, 14, schema)
+    base, _, _ = train_lightgbm_model(
+        X_train, y_train, X_valid, y_valid, PARAMS, num_boost_round=10, early_stopping_rounds=None
+    )
+
+    X_new, y_new, X_new_valid, y_new_valid, _ = new_days_split(80, store, 14, schema)
+    model, metrics, predictions = train_lightgbm_model(
+        X_new, y_new, X_new_valid, y_new_valid, PARAMS,
+        num_boost_round=5, early_stopping_rounds=None, init_model=base,
+    )
+
+    assert model.current_iteration() == base.current_iteration() + 5
+    assert metrics["num_boost_round"] == 15
+    assert len(predictions) == len(X_new_valid)
+    assert model.pandas_categorical == base.pandas_categorical
+
+
+def test_retrain_skips_without_enough_new_days(synthetic_feature_store, monkeypatch):
+    import pipeline_training
+
+    store, _ = synthetic_feature_store
+    state = {"model_uri": "models:/m-1", "params": PARAMS, "train_end": 140}
+    monkeypatch.setattr(pipeline_training, "load_production_model", lambda: state)
+    monkeypatch.setattr(pipeline_training, "check_drift", lambda train_end: True)
+    monkeypatch.setattr(pipeline_training, "downloading_data", lambda: None)
+    monkeypatch.setattr(pipeline_training, "prepare_data", lambda: store)
+    monkeypatch.setattr(pipeline_training, "retrain_model", pytest.fail)
+
+    assert pipeline_training._run_retrain(force=False) is None
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from codes.models.sharded import ShardedModel, shard_rows, train_sharded_models
+
+PARAMS = {"learning_rate": 0.1, "num_leaves": 8, "min_data_in_leaf": 5}
+
+
+def make_data(n_days: int = 60, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    stores = ["CA_1", "TX_1", "WI_1"]
+    X = pd.DataFrame(
+        {
+            "store_id": pd.Categorical(np.tile(stores, 2 * n_days), categories=stores),
+            "item_id": pd.Categorical(np.tile(np.repeat(["A", "B"], 3), n_days)),
+            "lag_7": rng.normal(size=6 * n_days),
+        }
+    )
+    y = pd.Series(rng.poisson(3, 6 * n_days).astype("float32"))
+    split = 6 * (n_days - 10)
+    return X[:split], y[:split], X[split:], y[split:]
+
+
+def test_shard_rows():
+    X, _, _, _ = make_data(n_days=12)
+    rows = shard_rows(X)
+
+    assert list(rows) == ["CA_1", "TX_1", "WI_1"]
+    np.testing.assert_array_equal(rows["TX_1"], [1, 4, 7, 10])
+
+
+def test_train_sharded_models(tmp_path, dataset_cache_dir):
+    X_train, y_train, X_valid, y_valid = make_data()
+    model, metrics, predictions = train_sharded_models(
+        X_train, y_train, X_valid, y_valid, PARAMS,
+        max_workers=2, cache_dir=dataset_cache_dir,
+    )
+
+    assert set(model.models) == {"CA_1", "TX_1", "WI_1"}
+    assert np.isfinite(predictions).all()
+    np.testing.assert_allclose(model.predict(X_valid), predictions)
+    assert {"MASE", "RMSSE", "MASE/CA_1", "num_boost_round/WI_1"} <= set(metrics)
+
+    model.save(tmp_path / "bundle")
+    loaded = ShardedModel.load(tmp_path / "bundle")
+    np.testing.assert_allclose(loaded.predict(X_valid), predictions)
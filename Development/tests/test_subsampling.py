@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+from codes.metrics.error_metrics import series_codes
+from codes.tuning.subsampling import (
+    proxy_rank_correlation,
+    stratified_series_sample,
+    subsample_split,
+)
+
+
+def _long_frame(n_days, rng):
+    """Day-major rows of 2 stores x 40 items (4 departments)."""
+    ids = pd.DataFrame(
+        [(f"S{s}", f"D{i % 4}", f"I{i}") for s in range(2) for i in range(40)],
+        columns=["store_id", "dept_id", "item_id"],
+    ).astype("category")
+    X = pd.concat([ids] * n_days, ignore_index=True)
+    for col in ids:
+        X[col] = X[col].astype(ids[col].dtype)
+    volume = np.tile(rng.gamma(1, 3, len(ids)), n_days)
+    return X, pd.Series(rng.poisson(volume).astype(float))
+
+
+def test_stratified_sample_is_reproducible_and_covers_strata():
+    rng = np.random.default_rng(0)
+    X, y = _long_frame(20, rng)
+
+    sample = stratified_series_sample(X, y, fraction=0.25, volume_bins=2, seed=1)
+    assert np.array_equal(
+        sample, stratified_series_sample(X, y, fraction=0.25, volume_bins=2, seed=1)
+    )
+    assert not np.array_equal(
+        sample, stratified_series_sample(X, y, fraction=0.25, volume_bins=2, seed=2)
+    )
+
+    rows = np.isin(series_codes(X)[0], sample)
+    sampled = X[rows].drop_duplicates()
+    # Every store x dept stratum is represented
+    assert len(sampled.groupby(["store_id", "dept_id"], observed=True)) == 8
+    assert 16 <= len(sample) <= 32
+
+
+def test_subsample_split_keeps_whole_series():
+    rng = np.random.default_rng(0)
+    X_train, y_train = _long_frame(20, rng)
+    X_valid, y_valid = _long_frame(5, rng)
+
+    X_t, y_t, X_v, y_v = subsample_split(X_train, y_train, X_valid, y_valid, 0.25)
+    assert len(X_t) == len(y_t) and len(X_v) == len(y_v)
+    train_series = np.unique(series_codes(X_t)[0])
+    assert np.array_equal(train_series, np.unique(series_codes(X_v)[0]))
+    assert len(X_t) == 20 * len(train_series) and len(X_v) == 5 * len(train_series)
+
+    plain = pd.DataFrame({"f0": np.arange(10.0)})
+    target = pd.Series(np.ones(10))
+    assert subsample_split(plain, target, plain, target)[0] is plain
+
+
+def test_proxy_rank_correlation_rescores_spread_configurations():
+    results = [{"loss": float(i), "params": {"x": i}} for i in range(10)]
+    scored = []
+
+    def full_loss(params):
+        scored.append(params["x"])
+        return 2.0 * params["x"]
+
+    correlation, pairs = proxy_rank_correlation(results, full_loss, n_check=4)
+    assert correlation == 1.0
+    assert scored == [0, 3, 6, 9] and pairs[-1] == (9.0, 18.0)
+
+
+def test_proxy_rank_correlation_compares_halving_results_at_one_budget():
+    # Dropped at the 20-round rung (low losses of short training) and
+    # the candidates that reached 60 rounds
+    results = [
+        {"loss": 0.1 * i, "params": {"x": i}, "rung_budget": 20} for i in range(6)
+    ] + [{"loss": 1.0 + i, "params": {"x": 10 + i}, "rung_budget": 60} for i in range(3)]
+    scored = []
+
+    def full_loss(params):
+        scored.append(params["x"])
+        return float(params["x"])
+
+    correlation, _ = proxy_rank_correlation(results, full_loss, n_check=5)
+    assert sorted(scored) == [10, 11, 12] and correlation == 1.0
+
+    # A single candidate at the last rung: the deepest rung with two results
+    scored.clear()
+    proxy_rank_correlation(results[:6] + results[-1:], full_loss, n_check=2)
+    assert all(x < 10 for x in scored)
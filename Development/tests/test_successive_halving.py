@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+from hyperopt import hp
+
+from codes.config import LOSS_METRIC
+from codes.models.dataset_cache import get_datasets
+from codes.tuning.successive_halving import successive_halving, rung_budgets
+
+
+def make_datasets(n: int = 400, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({"x": rng.normal(size=n), "z": rng.normal(size=n)})
+    y = pd.Series(3 + 2 * X["x"] + rng.normal(scale=0.5, size=n))
+    return get_datasets(X[:300], y[:300], X[300:], y[300:], {})
+
+
+def test_rung_budgets():
+    assert rung_budgets(20, 500, 3) == [20, 60, 180, 500]
+    assert rung_budgets(10, 10, 3) == [10]
+
+
+def test_successive_halving_keeps_the_best_candidates():
+    space = {
+        "learning_rate": hp.uniform("learning_rate", 0.01, 0.3),
+        "num_leaves": hp.quniform("num_leaves", 4, 16, 1),
+        "min_data_in_leaf": hp.quniform("min_data_in_leaf", 5, 30, 1),
+    }
+    train_data, valid_data = make_datasets()
+    logged = []
+    results = successive_halving(
+        space, train_data, valid_data, n_candidates=9, min_rounds=5,
+        max_rounds=45, reduction_factor=3, early_stopping_rounds=None,
+        on_result=logged.append, seed=0,
+    )
+
+    assert len(results) == len(logged) == 9
+    rounds = sorted(r["metrics"]["rounds"] for r in results)
+    assert rounds == [5] * 6 + [15, 15] + [45]
+    assert results[0]["metrics"]["rounds"] == 45
+    assert [r["loss"] for r in results] == sorted(r["loss"] for r in results)
+    assert 0 < results[0]["best_iteration"] <= 45
+    assert results[0]["metrics"][LOSS_METRIC] == results[0]["loss"]
+
+
+def test_candidates_do_not_share_every_k_scores():
+    import lightgbm as lgb
+    from codes.metrics.lgb_metrics import make_mase_feval, mase_lgb_metric
+
+    space = {
+        "learning_rate": hp.uniform("learning_rate", 0.01, 0.3),
+        "num_leaves": hp.quniform("num_leaves", 4, 16, 1),
+        "min_data_in_leaf": hp.quniform("min_data_in_leaf", 5, 30, 1),
+    }
+    train_data, valid_data = make_datasets()
+    # 4 rounds with every_k=3: a shared counter would give the second
+    # candidate the first one's last score at its first round
+    results = successive_halving(
+        space, train_data, valid_data, n_candidates=2, min_rounds=4, max_rounds=4,
+        reduction_factor=3, early_stopping_rounds=None, seed=0,
+        make_feval=lambda: make_mase_feval(every_k=3),
+    )
+
+    for result in results:
+        booster = lgb.Booster(result["params"], train_data)
+        booster.add_valid(valid_data, "valid")
+        for _ in range(result["best_iteration"]):
+            booster.update()
+        assert result["loss"] == booster.eval_valid(mase_lgb_metric)[0][2]
@@ -0,0 +1,26 @@
+from codes.data_handling.data_loader import (
+    load_calendar_data,
+    load_sales_data,
+    load_sell_prices,
+)
+from codes.data_handling.synthetic import generate_m5_data
+from codes.feature_engineering import build_features
+
+
+def test_generate_m5_data(tmp_path):
+    generate_m5_data(tmp_path, n_series=25, n_days=60)
+    sales = load_sales_data(tmp_path, start_date_train=1, use_cache=False)
+    calendar = load_calendar_data(tmp_path, use_cache=False)
+    prices = load_sell_prices(tmp_path, use_cache=False)
+
+    assert sales.shape == (30, 6 + 60)
+    assert sales["store_id"].nunique() == 10 and sales["id"].is_unique
+    assert len(calendar) == 60 + 56
+    assert not prices.duplicated(["store_id", "item_id", "wm_yr_wk"]).any()
+
+    df = build_features(sales, calendar, prices)
+    assert len(df) == 30 * 60
+    # Every day from the first sale of a series on has a price
+    first_sale = df[df["sales"] > 0].groupby("id", observed=True)["d_idx"].min()
+    after = df["d_idx"].to_numpy() >= df["id"].map(first_sale).astype(float).to_numpy()
+    assert df.loc[after, "sell_price"].notna().all()
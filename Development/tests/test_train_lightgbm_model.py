@@ -27,3 +27,21 @@ def test_train_lightgbm_model():
     )
     assert "rmse" in metrics and "sMAPE" in metrics
     assert len(preds) == len(X_valid)
+
+
+def test_train_lightgbm_model_uses_best_iteration():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(200, 3)), columns=["a", "b", "c"])
+    y = pd.Series(X["a"] * 2 + rng.normal(size=200))
+    params = {"learning_rate": 0.1, "num_leaves": 7, "min_data_in_leaf": 10}
+
+    model, metrics, _ = train_lightgbm_model(
+        X[:150], y[:150], X[150:], y[150:], {**params, "best_iteration": 12}
+    )
+    assert model.current_iteration() == 12 and metrics["num_boost_round"] == 12
+
+    model, metrics, _ = train_lightgbm_model(
+        X[:150], y[:150], X[150:], y[150:], params, early_stopping_rounds=5
+    )
+    assert metrics["num_boost_round"] == model.best_iteration
+    assert model.current_iteration() < 500
@@ -0,0 +1,100 @@
+import numpy as np
+from hyperopt import Trials, fmin, hp, tpe
+
+from codes.tuning.parallel_trials import run_parallel_trials
+from codes.tuning.trial_store import (
+    config_key,
+    evaluated_configs,
+    load_trials,
+    save_trials,
+    saving_hook,
+    sweep_key,
+    trials_file,
+)
+
+SPACE = {
+    "learning_rate": hp.uniform("learning_rate", 0.05, 0.2),
+    "num_leaves": hp.quniform("num_leaves", 4, 16, 1),
+    "min_data_in_leaf": hp.quniform("min_data_in_leaf", 5, 20, 1),
+}
+
+
+def test_sweep_key_depends_on_data_and_space(make_data):
+    X_train, y_train, X_valid, y_valid = make_data()
+    key = sweep_key(X_train, y_train, X_valid, y_valid, SPACE)
+
+    assert key == sweep_key(X_train.copy(), y_train, X_valid, y_valid, dict(SPACE))
+    assert key != sweep_key(X_train, y_train * 2, X_valid, y_valid, SPACE)
+    narrower = {**SPACE, "num_leaves": hp.quniform("num_leaves", 4, 8, 1)}
+    assert key != sweep_key(X_train, y_train, X_valid, y_valid, narrower)
+
+
+def test_stored_trials_round_trip(trial_store_dir):
+    trials = Trials()
+    fmin(
+        lambda p: (p["learning_rate"] - 0.1) ** 2, SPACE, tpe.suggest,
+        max_evals=5, trials=trials, rstate=np.random.default_rng(0),
+        show_progressbar=False,
+    )
+    trials.trials[-1]["state"] = 1  # still running when the sweep stopped
+    path = trials_file("abc")
+    save_trials(trials, path)
+
+    loaded = load_trials(path)
+    assert path.parent == trial_store_dir
+    # The unfinished trial is dropped from the history, its id is not reused
+    assert len(loaded.trials) == 4 and loaded.new_trial_ids(1) == [5]
+
+    evaluated = evaluated_configs(loaded, SPACE)
+    assert len(evaluated) == 4
+    doc = loaded.trials[0]
+    params = {k: v[0] for k, v in doc["misc"]["vals"].items()}
+    assert evaluated[config_key(params)]["loss"] == doc["result"]["loss"]
+    assert len(load_trials(trials_file("missing")).trials) == 0
+
+
+def test_saving_hook_saves_after_every_trial(trial_store_dir):
+    path = trials_file("sequential")
+    saved = []
+
+    def objective(params):
+        # The file holds the trials finished before this one
+        saved.append(len(load_trials(path).trials))
+        return (params["learning_rate"] - 0.1) ** 2
+
+    trials = Trials()
+    fmin(
+        objective, SPACE, tpe.suggest, max_evals=3, trials=trials,
+        early_stop_fn=saving_hook(path), rstate=np.random.default_rng(0),
+        show_progressbar=False,
+    )
+
+    assert saved == [0, 1, 2]
+    assert len(load_trials(path).trials) == 3
+    assert not path.with_suffix(".tmp").exists()
+
+
+def test_parallel_trials_warm_start(dataset_cache_dir, make_data):
+    # A single configuration: every suggestion repeats the first one
+    space = {
+        "learning_rate": hp.choice("learning_rate", [0.1]),
+        "num_leaves": hp.choice("num_leaves", [8]),
+        "min_data_in_leaf": hp.choice("min_data_in_leaf", [5]),
+    }
+    data = make_data()
+    path = trials_file(sweep_key(*data, space))
+    run_parallel_trials(
+        space, *data, max_evals=2, n_jobs=2,
+        cache_dir=dataset_cache_dir, seed=1, trials_path=path,
+    )
+
+    # A restarted sweep adds new trials to the stored ones without retraining
+    results = []
+    trials = run_parallel_trials(
+        space, *data, max_evals=2, n_jobs=2, on_result=results.append,
+        cache_dir=dataset_cache_dir, seed=1,
+        trials=load_trials(path), trials_path=path,
+    )
+    assert len(trials.trials) == 4 and len(load_trials(path).trials) == 4
+    assert results == []
+    assert len(set(trials.losses())) == 1